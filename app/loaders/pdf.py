@@ -0,0 +1,75 @@
+import platform
+from typing import Iterator
+
+from app.models.document import Document
+
+
+def _configure_tesseract(pytesseract):
+    # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+    if platform.system() == "Windows":
+        pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+    else:
+        pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
+
+
+def iter_ocr_pages(file_path: str, lang: str = "vie") -> Iterator[str]:
+    """OCR từng trang, chỉ giữ ảnh của một trang trong bộ nhớ tại một thời điểm"""
+    import fitz  # PyMuPDF
+    from PIL import Image
+    import pytesseract
+
+    _configure_tesseract(pytesseract)
+
+    doc = fitz.open(file_path)
+    print(f"🔍 Found {doc.page_count} pages in {file_path}")
+    try:
+        for page_index in range(doc.page_count):
+            page = doc.load_page(page_index)
+            pix = page.get_pixmap(dpi=300)  # render với độ phân giải cao
+            mode = "RGBA" if pix.alpha else "RGB"
+            img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
+
+            # OCR
+            yield pytesseract.image_to_string(img, lang=lang)
+    finally:
+        doc.close()
+
+
+def pdf_to_text_ocr_fitz(file_path: str, lang: str = "vie") -> str:
+    """
+    Đọc file PDF scan (image-based) bằng PyMuPDF và Tesseract OCR.
+    Không cần Poppler.
+    """
+    text_result = ""
+    for page_index, text in enumerate(iter_ocr_pages(file_path, lang=lang)):
+        text_result += f"\n=== Page {page_index + 1} ===\n{text}\n"
+
+    return text_result
+
+
+def has_text_layer(file_path: str, max_pages: int = 5) -> bool:
+    # Chỉ đọc vài trang đầu để quyết định, không trích cả file
+    from pdfminer.high_level import extract_text
+
+    text = extract_text(file_path, maxpages=max_pages)
+    return bool(text) and len(text.strip()) > 20
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[Document]:
+    """PDF có text layer -> PyPDFLoader, PDF scan -> OCR; trả về từng trang"""
+    try:
+        if has_text_layer(file_path):
+            print("📄 PDF has text layer — using PyPDFLoader")
+            from langchain_community.document_loaders import PyPDFLoader
+
+            yield from PyPDFLoader(file_path).lazy_load()
+            return
+
+        for page_index, text in enumerate(iter_ocr_pages(file_path, lang="vie")):
+            yield Document(
+                page_content=text,
+                metadata={"source": file_path, "page": page_index},
+            )
+    except Exception as e:
+        print(f"⚠️ OCR fallback failed: {e}")
+        raise ValueError(f"OCR fallback failed: {file_path}")
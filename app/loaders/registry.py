@@ -0,0 +1,86 @@
+# Registry các loader theo phần mở rộng file.
+# Mỗi loader chỉ import thư viện parse (PyMuPDF, pdfminer, unstructured, ...)
+# ở lần dùng đầu tiên, nên worker chỉ phục vụ truy vấn không phải nạp chúng.
+# Loader là generator: trả từng trang / từng chunk ngay khi parse xong.
+import os
+from typing import Callable, Dict, Iterator, List
+
+from app.models.document import Document
+
+Loader = Callable[[str], Iterator[Document]]
+
+_LOADERS: Dict[str, Loader] = {}
+
+
+def register_loader(*extensions: str, chunked: bool = False):
+    """
+    Đăng ký một loader cho một hoặc nhiều phần mở rộng (ví dụ ".xlsx").
+    chunked=True: loader đã tự chia chunk, không cần qua text splitter.
+    """
+
+    def decorator(loader: Loader) -> Loader:
+        loader.chunked = chunked
+        for ext in extensions:
+            _LOADERS[ext.lower()] = loader
+        return loader
+
+    return decorator
+
+
+def get_loader(file_path: str) -> Loader:
+    ext = os.path.splitext(file_path)[1].lower()
+    loader = _LOADERS.get(ext)
+    if loader is None:
+        raise ValueError(f"Unsupported file type: {file_path}")
+    return loader
+
+
+def is_chunked(file_path: str) -> bool:
+    return getattr(get_loader(file_path), "chunked", False)
+
+
+def supported_extensions() -> List[str]:
+    return sorted(_LOADERS)
+
+
+def iter_document(file_path: str) -> Iterator[Document]:
+    return get_loader(file_path)(file_path)
+
+
+def load_document(file_path: str) -> List[Document]:
+    return list(iter_document(file_path))
+
+
+@register_loader(".pdf")
+def _load_pdf(file_path: str) -> Iterator[Document]:
+    from app.loaders.pdf import iter_pdf_pages
+
+    yield from iter_pdf_pages(file_path)
+
+
+@register_loader(".docx")
+def _load_docx(file_path: str) -> Iterator[Document]:
+    from langchain_community.document_loaders import Docx2txtLoader
+
+    yield from Docx2txtLoader(file_path).lazy_load()
+
+
+@register_loader(".xlsx", ".xls", chunked=True)
+def _load_excel(file_path: str) -> Iterator[Document]:
+    from app.loaders.spreadsheet import iter_spreadsheet_chunks
+
+    yield from iter_spreadsheet_chunks(file_path)
+
+
+@register_loader(".html", ".htm")
+def _load_html(file_path: str) -> Iterator[Document]:
+    from langchain_community.document_loaders import UnstructuredHTMLLoader
+
+    yield from UnstructuredHTMLLoader(file_path).lazy_load()
+
+
+@register_loader(".txt")
+def _load_txt(file_path: str) -> Iterator[Document]:
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    yield Document(page_content=text, metadata={"source": file_path})
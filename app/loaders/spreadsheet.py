@@ -0,0 +1,111 @@
+import os
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from app.models.document import Document
+from app.setting.config import get_settings
+
+
+def _format_row(values: Sequence) -> str:
+    return " | ".join("" if value is None else str(value).strip() for value in values)
+
+
+def _is_empty(values: Sequence) -> bool:
+    return all(value is None or str(value).strip() == "" for value in values)
+
+
+def chunk_rows(
+    rows: Iterable[Sequence],
+    source: str,
+    sheet: str,
+    rows_per_chunk: int,
+    max_chunk_chars: int,
+) -> Iterator[Document]:
+    """
+    Gom các dòng thành từng nhóm, mỗi chunk lặp lại dòng tiêu đề để tự mô tả.
+    Chỉ giữ một nhóm dòng trong bộ nhớ tại một thời điểm.
+    Sheet chỉ có dòng tiêu đề vẫn cho ra một chunk (chỉ gồm tiêu đề).
+    """
+    header: Optional[str] = None
+    buffer: List[str] = []
+    buffer_chars = 0
+    row_start = row_end = 0
+    emitted = False
+
+    def flush() -> Document:
+        return Document(
+            page_content="\n".join([header] + buffer),
+            metadata={
+                "source": source,
+                "sheet": sheet,
+                "row_start": row_start,
+                "row_end": row_end,
+            },
+        )
+
+    for row_number, values in enumerate(rows, start=1):
+        if _is_empty(values):
+            continue
+        line = _format_row(values)
+        # Dòng không rỗng đầu tiên của sheet là tiêu đề
+        if header is None:
+            header = line
+            row_start = row_end = row_number
+            continue
+
+        if buffer and (
+            len(buffer) >= rows_per_chunk
+            or buffer_chars + len(line) > max_chunk_chars
+        ):
+            yield flush()
+            emitted = True
+            buffer, buffer_chars = [], 0
+
+        if not buffer:
+            row_start = row_number
+        buffer.append(line)
+        buffer_chars += len(line) + 1
+        row_end = row_number
+
+    if buffer or (header is not None and not emitted):
+        yield flush()
+
+
+def _iter_xlsx_sheets(file_path: str):
+    from openpyxl import load_workbook
+
+    # read_only: openpyxl đọc dòng theo kiểu streaming, không dựng cả workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            yield worksheet.title, worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_xls_sheets(file_path: str):
+    import xlrd
+
+    # on_demand: chỉ nạp từng sheet khi cần
+    workbook = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        for sheet_index in range(workbook.nsheets):
+            sheet = workbook.sheet_by_index(sheet_index)
+            yield sheet.name, (sheet.row_values(i) for i in range(sheet.nrows))
+            workbook.unload_sheet(sheet_index)
+    finally:
+        workbook.release_resources()
+
+
+def iter_spreadsheet_chunks(
+    file_path: str,
+    rows_per_chunk: int = None,
+    max_chunk_chars: int = None,
+) -> Iterator[Document]:
+    settings = get_settings()
+    rows_per_chunk = rows_per_chunk or settings.spreadsheet_rows_per_chunk
+    max_chunk_chars = max_chunk_chars or settings.spreadsheet_max_chunk_chars
+
+    ext = os.path.splitext(file_path)[1].lower()
+    sheets = _iter_xls_sheets(file_path) if ext == ".xls" else _iter_xlsx_sheets(file_path)
+    for sheet_name, rows in sheets:
+        yield from chunk_rows(rows, file_path, sheet_name, rows_per_chunk, max_chunk_chars)
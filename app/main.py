@@ -1,25 +1,84 @@
-from fastapi import FastAPI
-from app.rag.ollama import check_ollama_connection
-from app.rag.qdrantdb import check_qdrant_connection
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from app.rag.ollama_scheduler import OllamaOverloadedError
+from app.rag.qdrantdb import get_qdrant_client
+from app.routers.health import router as health_router
 from app.routers.rag import router as rag_router
 from app.routers.ollama import router as ollama_router
+from app.routers.profiling import router as profiling_router
+from app.service.health import get_health_prober
+from app.service.ollama_service import OllamaService
+from app.service.rag_service import get_rag_service
 from app.setting.config import get_settings
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_task = None
+    if get_settings().ollama_warm_up:
+        # Chạy nền để không chặn quá trình khởi động
+        ollama_service = OllamaService(get_settings(), get_rag_service())
+        warm_up_task = asyncio.create_task(ollama_service.warm_up())
+    # Kiểm tra Ollama / Qdrant / embed định kỳ cho /api/health/*
+    get_health_prober().start()
+    yield
+    await get_health_prober().stop()
+    if warm_up_task and not warm_up_task.done():
+        warm_up_task.cancel()
+    if get_settings().vector_backend == "local":
+        # Ghi xuống đĩa và nhả khoá thư mục của Qdrant nhúng
+        get_qdrant_client().close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def add_compression(app: FastAPI) -> None:
+    """
+    Nén response theo Accept-Encoding. SSE (/chat/stream) không nén để token
+    tới client ngay. Với "br": brotli cho client hỗ trợ, gzip cho client còn lại
+    (gzip ngoài cùng bỏ qua response đã có Content-Encoding).
+    """
+    settings = get_settings()
+    if settings.response_compression == "none":
+        return
+    if settings.response_compression == "br":
+        try:
+            from brotli_asgi import BrotliMiddleware
+            app.add_middleware(
+                BrotliMiddleware,
+                quality=settings.response_brotli_quality,
+                minimum_size=settings.response_compression_min_size,
+                gzip_fallback=False,
+                excluded_handlers=[r"/stream$"],
+            )
+        except ImportError:
+            print("[COMPRESSION] brotli-asgi chưa được cài, chỉ dùng gzip (pip install brotli-asgi)")
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.response_compression_min_size,
+        compresslevel=settings.response_gzip_level,
+    )
+
+
+add_compression(app)
+
+app.include_router(health_router, prefix="/api")
 app.include_router(rag_router, prefix="/api")
 app.include_router(ollama_router, prefix="/api")
+if get_settings().profiling_enabled:
+    # Danh sách / tải file profile chỉ mở khi bật profiling
+    app.include_router(profiling_router, prefix="/api")
+
 
+@app.exception_handler(OllamaOverloadedError)
+async def ollama_overloaded_handler(request: Request, exc: OllamaOverloadedError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "lane": str(exc.lane)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-# API Test Status System
-@app.get("/api/health")
-async def health():
-    ollama_connect = await check_ollama_connection()
-    qdrant_connect = await check_qdrant_connection()
-    get_settings.cache_clear()
-    return {
-        "ollama_connection": ollama_connect,
-        "qdrant_connection": qdrant_connect,
-        "server_status": "Running",
-        "configs": get_settings()
-    }
\ No newline at end of file
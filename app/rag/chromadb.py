@@ -2,7 +2,8 @@ import os
 import shutil
 from uuid import uuid4
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
+from app.rag.embeddings import get_embedding_provider
+from app.rag.embedding_registry import get_collection_embedding
 from app.setting.config import get_settings
 from app.setting.enum import DocsCollection
 
@@ -16,11 +17,8 @@ class ChromaDB:
         self.persist_directory = f"./chromadb"
         os.makedirs(self.persist_directory, exist_ok=True)
 
-        embeddings = OllamaEmbeddings(
-            model="nomic-embed-text",
-            base_url=get_settings().ollama_url,
-            client_kwargs={"timeout": 600},
-        )
+        embedding = get_collection_embedding(str(collection_name))
+        embeddings = get_embedding_provider(embedding["model"], embedding["size"])
 
         self.chromadb = Chroma(
             collection_name=self.collection_name,
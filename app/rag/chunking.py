@@ -0,0 +1,309 @@
+# Chia văn bản thành chunk theo cấu trúc của văn bản quy chế / quy định.
+#
+# - Ranh giới chunk là ranh giới mục: Phần / Chương / Mục / Điều (và heading markdown),
+#   một Điều nằm trên nhiều trang vẫn thuộc một chunk
+# - Mục quá dài được chia theo Khoản ("1. ", "2) "), bảng được giữ nguyên khối
+#   (chia theo dòng, lặp lại dòng tiêu đề); chỉ đoạn vẫn quá dài mới dùng
+#   RecursiveCharacterTextSplitter. Các khoản đầu của mục quá dài lấp phần còn trống
+#   của chunk trước (cùng Chương); mục vừa một chunk thì không bị chia
+# - Các mục liền nhau trong cùng Chương được gộp tới chunk_size (merge_sections), nên
+#   dòng tiêu đề Chương hay Điều ngắn không thành chunk riêng
+# - Đường dẫn tiêu đề rút gọn ("Chương II > Điều 5. Học phí") lưu ở metadata.section
+#   thay vì lặp lại trong nội dung; không overlap giữa các mục
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.models.document import Document
+from app.setting.config import get_settings
+
+STRATEGY_STRUCTURE = "structure"
+STRATEGY_RECURSIVE = "recursive"
+
+# (cấp, pattern) - cấp nhỏ hơn là cấp cha
+HEADING_PATTERNS = [
+    (0, re.compile(r"^(PHẦN|Phần)\s+([IVXLC]+|\d+|THỨ\s+\S+|thứ\s+\S+)\b")),
+    (1, re.compile(r"^(CHƯƠNG|Chương)\s+([IVXLC]+|\d+)\b")),
+    (2, re.compile(r"^(MỤC|Mục)\s+\d+\b")),
+    (3, re.compile(r"^(ĐIỀU|Điều)\s+\d+[a-z]?\s*[.:]")),
+]
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+\S")
+# Khoản: "1. ", "2) ", "1.2. "
+CLAUSE_PATTERN = re.compile(r"^\d+(\.\d+)*[.)]\s+\S")
+# Cấp từ đây trở xuống (Điều, heading markdown sâu) là mục lá: không gộp qua ranh giới cấp cha
+LEAF_LEVEL = 3
+
+MAX_HEADING_CHARS = 150
+HEADING_LABEL_CHARS = 60
+SECTION_CONTEXT_CHARS = 160
+
+RECURSIVE_SEPARATORS = ["\n\n", "\n", ". ", "! ", "? ", "+ ", "- ", " ", ""]
+
+# (dòng, metadata của trang chứa dòng)
+_Line = Tuple[str, dict]
+
+
+@lru_cache()
+def get_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Splitter dùng chung theo (chunk_size, chunk_overlap), không dựng lại mỗi file"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=RECURSIVE_SEPARATORS,
+    )
+
+
+def get_chunk_options(collection_name: str) -> Dict:
+    """Tuỳ chọn chia chunk của collection: mặc định chung, ghi đè bởi chunk_options[collection]"""
+    settings = get_settings()
+    return {
+        "strategy": settings.chunk_strategy,
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "merge_sections": settings.chunk_merge_sections,
+        **(settings.chunk_options.get(collection_name) or {}),
+    }
+
+
+def heading_level(line: str) -> Optional[int]:
+    if len(line) > MAX_HEADING_CHARS:
+        return None
+    for level, pattern in HEADING_PATTERNS:
+        if pattern.match(line):
+            return level
+    match = MARKDOWN_HEADING.match(line)
+    if match:
+        # "#" ngang Chương, "##" ngang Mục, "###" trở xuống là mục lá
+        return min(len(match.group(1)), 6)
+    return None
+
+
+def is_table_row(line: str) -> bool:
+    return line.count("|") >= 2 or "\t" in line
+
+
+def short_label(label: str) -> str:
+    """"Điều 5. Học phí ..." -> "Điều 5" (dùng khi một chunk chứa nhiều mục)"""
+    for _, pattern in HEADING_PATTERNS:
+        match = pattern.match(label)
+        if match:
+            return match.group(0).rstrip(" .:")
+    return label.lstrip("#").strip()
+
+
+def section_context(path: List[Tuple[int, str]]) -> str:
+    """Đường dẫn tiêu đề rút gọn; quá dài thì bỏ bớt các cấp ngoài cùng"""
+    labels = [
+        label if len(label) <= HEADING_LABEL_CHARS else label[:HEADING_LABEL_CHARS].rstrip() + "…"
+        for _, label in path
+    ]
+    while len(labels) > 1 and len(" > ".join(labels)) > SECTION_CONTEXT_CHARS:
+        labels.pop(0)
+    return " > ".join(labels)
+
+
+class StructureAwareSplitter:
+    def __init__(self, chunk_size: int = 2000, chunk_overlap: int = 150, merge_sections: bool = True):
+        self.chunk_size = chunk_size
+        self.merge_sections = merge_sections
+        # Overlap chỉ dùng khi phải cắt một đoạn không có cấu trúc
+        self.fallback = get_text_splitter(chunk_size, chunk_overlap)
+
+    def split_pages(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """Đọc từng trang, trả chunk ngay khi một mục kết thúc (không giữ cả file trong RAM)"""
+        path: List[Tuple[int, str]] = []
+        lines: List[_Line] = []
+        section_path: List[Tuple[int, str]] = []
+        # (đường dẫn tiêu đề của từng mục đã gộp, các dòng)
+        pending: Optional[Tuple[List[List[Tuple[int, str]]], List[_Line]]] = None
+
+        # Dòng tiêu đề Chương / Mục chờ ghép với mục con đầu tiên
+        lead = None
+
+        def close_section(final: bool = False):
+            nonlocal pending, lead
+            if not any(text.strip() for text, _ in lines):
+                return
+            section = ([list(section_path)], list(lines))
+            if lead is not None:
+                section = (lead[0] + section[0], lead[1] + section[1])
+                lead = None
+            elif not final and self._heading_only(section) and self._parent(section_path) == section_path:
+                # Tiêu đề Chương / Mục đứng riêng luôn đi cùng Điều đầu tiên của nó
+                lead = section
+                return
+            if pending is not None and self._can_merge(pending, section):
+                pending = (pending[0] + section[0], pending[1] + section[1])
+                return
+            rest = section[1]
+            if pending is not None and self._size(rest) > self.chunk_size:
+                # Mục dài đằng nào cũng bị chia: các khoản đầu lấp chỗ trống của chunk đang chờ
+                head, rest = self._take_units(rest, self.chunk_size - self._size(pending[1]))
+                if head:
+                    pending = (pending[0] + section[0], pending[1] + head)
+            if pending is not None:
+                yield self._emit(*pending)
+            # Mục dài: chia theo Khoản / bảng; phần cuối còn có thể gộp với mục sau
+            pieces = list(self._pack(rest))
+            for piece in pieces[:-1]:
+                yield self._emit(section[0], piece)
+            pending = (section[0], pieces[-1]) if pieces else None
+
+        for page in pages:
+            metadata = dict(page.metadata or {})
+            for raw_line in page.page_content.splitlines():
+                line = raw_line.strip()
+                level = heading_level(line) if line else None
+                if level is not None:
+                    yield from close_section()
+                    lines.clear()
+                    path = [entry for entry in path if entry[0] < level] + [(level, line)]
+                    section_path = list(path)
+                lines.append((line, metadata))
+        yield from close_section(final=True)
+        if pending is not None:
+            yield self._emit(*pending)
+
+    @staticmethod
+    def _size(lines: List[_Line]) -> int:
+        return sum(len(text) + 1 for text, _ in lines)
+
+    @staticmethod
+    def _parent(path: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        return [entry for entry in path if entry[0] < LEAF_LEVEL]
+
+    def _take_units(self, lines: List[_Line], room: int) -> Tuple[List[_Line], List[_Line]]:
+        """Các khối đầu (tiêu đề + ít nhất một khoản) vừa room ký tự và phần còn lại"""
+        head: List[_Line] = []
+        units = 0
+        for unit in self._units(lines):
+            if self._size(head) + self._size(unit) > room:
+                break
+            head.extend(unit)
+            units += 1
+        if units < 2:
+            return [], lines
+        return head, lines[len(head):]
+
+    @staticmethod
+    def _heading_only(group) -> bool:
+        return len([text for text, _ in group[1] if text]) <= 2 and len(group[0]) == 1
+
+    def _can_merge(self, pending, section) -> bool:
+        if not self.merge_sections:
+            return False
+        # Gộp cả qua ranh giới Chương / Mục nếu vừa chunk_size; section ghi đường dẫn từng Chương
+        return self._size(pending[1]) + self._size(section[1]) <= self.chunk_size
+
+    def _context(self, paths: List[List[Tuple[int, str]]]) -> str:
+        """Mỗi nhóm mục cùng Chương / Mục một đoạn, nối bằng "; " ("Chương I > Điều 9; Chương II > Điều 10")"""
+        groups: List[List[List[Tuple[int, str]]]] = []
+        for path in paths:
+            if groups and self._parent(groups[-1][-1]) == self._parent(path)[: len(self._parent(groups[-1][-1]))]:
+                groups[-1].append(path)
+            else:
+                groups.append([path])
+        return "; ".join(filter(None, (self._group_context(group) for group in groups)))
+
+    @staticmethod
+    def _group_context(paths: List[List[Tuple[int, str]]]) -> str:
+        """Đường dẫn chung của các mục + nhãn ngắn của từng mục ("Chương I > Điều 3, Điều 4")"""
+        common = paths[0]
+        for path in paths[1:]:
+            size = 0
+            while size < min(len(common), len(path)) and common[size] == path[size]:
+                size += 1
+            common = common[:size]
+        leaves = []
+        for path in paths:
+            if len(path) > len(common):
+                label = short_label(path[len(common)][1]) if len(paths) > 1 else path[len(common)][1]
+                if label not in leaves:
+                    leaves.append(label)
+        if len(leaves) == 1 and len(paths) > 1:
+            # Một mục con duy nhất (vd. tiêu đề Chương + Điều đầu tiên): giữ đường dẫn đầy đủ
+            return section_context(max(paths, key=len))
+        if leaves:
+            common = common + [(LEAF_LEVEL, ", ".join(leaves))]
+        return section_context(common)
+
+    def _emit(self, paths, lines: List[_Line]) -> Document:
+        # Metadata (source, page, ...) của trang chứa dòng đầu tiên
+        metadata = dict(next((meta for text, meta in lines if text), lines[0][1]))
+        context = self._context(paths)
+        if context:
+            metadata["section"] = context
+        return Document(page_content=self._join(lines), metadata=metadata)
+
+    def _pack(self, lines: List[_Line]) -> Iterator[List[_Line]]:
+        """Gộp các khối (khoản, bảng, đoạn) thành các phần <= chunk_size"""
+        if self._size(lines) <= self.chunk_size:
+            yield lines
+            return
+        buffer: List[_Line] = []
+        for unit in self._units(lines):
+            if buffer and self._size(buffer) + self._size(unit) > self.chunk_size:
+                yield buffer
+                buffer = []
+            if self._size(unit) <= self.chunk_size:
+                buffer.extend(unit)
+                continue
+            yield from self._split_unit(unit)
+        if buffer:
+            yield buffer
+
+    @staticmethod
+    def _units(lines: List[_Line]) -> Iterator[List[_Line]]:
+        unit: List[_Line] = []
+        in_table = False
+        for line in lines:
+            table_row = is_table_row(line[0])
+            if unit and (CLAUSE_PATTERN.match(line[0]) or table_row != in_table):
+                yield unit
+                unit = []
+            in_table = table_row
+            unit.append(line)
+        if unit:
+            yield unit
+
+    def _split_unit(self, unit: List[_Line]) -> Iterator[List[_Line]]:
+        metadata = unit[0][1]
+        header = unit[0]
+        if is_table_row(header[0]) and len(unit) > 1 and self._size([header]) <= self.chunk_size // 2:
+            # Bảng: chia theo dòng, mỗi phần lặp lại dòng tiêu đề để tự mô tả
+            buffer = [header]
+            for row in unit[1:]:
+                if len(buffer) > 1 and self._size(buffer) + len(row[0]) + 1 > self.chunk_size:
+                    yield buffer
+                    buffer = [(header[0], row[1])]
+                if self._size([header, row]) > self.chunk_size:
+                    # Dòng quá dài: cắt bằng splitter đệ quy thay vì bỏ mất
+                    yield from ([(text, metadata)] for text in self.fallback.split_text(row[0]))
+                    continue
+                buffer.append(row)
+            if len(buffer) > 1:
+                yield buffer
+            return
+        # Đoạn thường, hoặc "bảng" chỉ có một dòng (vd. dòng có tab)
+        for text in self.fallback.split_text(self._join(unit)):
+            yield [(text, metadata)]
+
+    @staticmethod
+    def _join(lines: List[_Line]) -> str:
+        return "\n".join(text for text, _ in lines).strip()
+
+
+def iter_chunks(pages: Iterable[Document], options: Dict) -> Iterator[Document]:
+    """Chia các trang của một file theo options (xem get_chunk_options)"""
+    chunk_size = options.get("chunk_size", 2000)
+    chunk_overlap = options.get("chunk_overlap", 150)
+    if options.get("strategy", STRATEGY_STRUCTURE) == STRATEGY_RECURSIVE:
+        splitter = get_text_splitter(chunk_size, chunk_overlap)
+        for page in pages:
+            yield from splitter.split_documents([page])
+        return
+    yield from StructureAwareSplitter(
+        chunk_size, chunk_overlap, options.get("merge_sections", True)
+    ).split_pages(pages)
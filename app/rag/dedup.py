@@ -0,0 +1,271 @@
+import asyncio
+import re
+import threading
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.service.shared_cache import get_shared_cache
+from app.setting.config import get_settings
+
+# MinHash 64 hàm băm, LSH 16 band x 4 dòng: recall cao với ngưỡng >= 0.5,
+# sau đó kiểm tra lại bằng toàn bộ signature
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+_PRIME = np.uint64(4294967311)  # số nguyên tố > 2^32
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Signature MinHash (uint32[NUM_PERM]) trên các shingle 3 từ của văn bản"""
+    words = re.sub(r"\s+", " ", text.lower()).strip().split(" ")
+    if len(words) >= SHINGLE_SIZE:
+        shingles = {
+            " ".join(words[i:i + SHINGLE_SIZE])
+            for i in range(len(words) - SHINGLE_SIZE + 1)
+        }
+    else:
+        shingles = {" ".join(words)}
+
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # (a * x mod p + b) mod p, tính cho cả NUM_PERM hàm băm cùng lúc
+    permuted = ((_A[:, None] * hashes[None, :]) % _PRIME + _B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def signature_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+class SignatureIndex:
+    """Chỉ mục LSH gọn (256 byte / chunk) trên signature của các chunk đã lưu"""
+
+    def __init__(self):
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: Dict[Tuple[int, bytes], Set[str]] = defaultdict(set)
+        self.loaded = False
+        # Generation của dedup_namespace lúc dựng chỉ mục (None: tắt shared cache)
+        self.generation: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.signatures.clear()
+            self.buckets.clear()
+            self.loaded = False
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS].tobytes()
+
+    def add(self, point_id: str, signature: np.ndarray) -> None:
+        with self.lock:
+            self.signatures[point_id] = signature
+            for key in self._band_keys(signature):
+                self.buckets[key].add(point_id)
+
+    def remove(self, point_id: str) -> None:
+        with self.lock:
+            signature = self.signatures.pop(point_id, None)
+            if signature is None:
+                return
+            for key in self._band_keys(signature):
+                self.buckets[key].discard(point_id)
+
+    def find(self, signature: np.ndarray, threshold: float) -> Optional[Tuple[str, float]]:
+        with self.lock:
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates |= self.buckets.get(key, set())
+            best = None
+            for point_id in candidates:
+                similarity = signature_similarity(signature, self.signatures[point_id])
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (point_id, similarity)
+            return best
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+
+_indexes: Dict[str, SignatureIndex] = {}
+
+
+def get_signature_index(collection_name: str) -> SignatureIndex:
+    index = _indexes.get(collection_name)
+    if index is None:
+        index = _indexes.setdefault(collection_name, SignatureIndex())
+    return index
+
+
+def dedup_namespace(collection_name: str) -> str:
+    """
+    Namespace shared cache báo chỉ mục của collection đã cũ ở các worker khác:
+    tăng generation sau mỗi lần ingest thêm / link chunk và khi xoá dữ liệu
+    """
+    return f"dedup:{collection_name}"
+
+
+async def _dedup_generation(collection_name: str) -> Optional[int]:
+    if not get_settings().shared_cache_enabled:
+        return None
+    return await get_shared_cache().ageneration(dedup_namespace(collection_name))
+
+
+def invalidate_signature_index(collection_name: str) -> None:
+    """Gọi khi xoá dữ liệu của collection; chỉ mục sẽ được dựng lại ở lần ingest sau (mọi worker)"""
+    _indexes.pop(collection_name, None)
+    if get_settings().shared_cache_enabled:
+        get_shared_cache().invalidate(dedup_namespace(collection_name))
+
+
+async def ainvalidate_signature_index(collection_name: str) -> None:
+    """Như invalidate_signature_index(), dùng trong code async"""
+    _indexes.pop(collection_name, None)
+    if get_settings().shared_cache_enabled:
+        await get_shared_cache().ainvalidate(dedup_namespace(collection_name))
+
+
+def get_dedup_threshold(collection_name: str) -> float:
+    settings = get_settings()
+    return float(settings.dedup_thresholds.get(collection_name, settings.dedup_threshold))
+
+
+class NearDuplicateDetector:
+    """
+    Phát hiện chunk gần trùng trước khi embed.
+    - mode "skip": bỏ qua chunk trùng
+    - mode "link": không lưu chunk mới, ghi doc_id vào metadata.linked_doc_ids
+      của chunk đã có (kèm metadata của chunk mới để chuyển quyền sở hữu khi xoá)
+    Chỉ mục được kiểm tra đầu mỗi lần ingest và dựng lại nếu worker khác đã thay đổi
+    collection (generation của dedup_namespace); link đã ghi được gỡ khi rollback.
+    """
+
+    def __init__(self, vectordb, mode: str, threshold: float):
+        self.vectordb = vectordb
+        self.mode = mode
+        self.threshold = threshold
+        self.index = get_signature_index(vectordb.collection_name)
+        self.chunks_total = 0
+        self.duplicates = 0
+        self.added_ids: List[str] = []
+        self.linked_ids: List[str] = []
+        self._added: Set[str] = set()
+        self._checked = False
+
+    def _add(self, point_id: str, signature: np.ndarray) -> None:
+        self.index.add(point_id, signature)
+        self.added_ids.append(point_id)
+        self._added.add(point_id)
+
+    async def _ensure_loaded(self) -> None:
+        if self._checked:
+            return
+        self._checked = True
+        generation = await _dedup_generation(self.vectordb.collection_name)
+        if self.index.loaded and self.index.generation == generation:
+            return
+        # Lần đầu, hoặc worker khác đã ingest / xoá trên collection: dựng lại từ Qdrant
+        self.index.reset()
+        for point_id, signature in await asyncio.to_thread(self.vectordb.scroll_signatures):
+            self.index.add(point_id, np.asarray(signature, dtype=np.uint32))
+        self.index.generation = generation
+        self.index.loaded = True
+
+    async def filter_batch(self, doc_id: str, documents: List, ids: List[str]):
+        """
+        Trả về (documents, ids, signatures) của các chunk không trùng.
+        Các chunk trùng bị bỏ (skip) hoặc được link vào point đã có.
+        """
+        await self._ensure_loaded()
+        self.chunks_total += len(documents)
+
+        signatures = [minhash_signature(doc.page_content) for doc in documents]
+        matches: Dict[int, str] = {}
+        for position, signature in enumerate(signatures):
+            match = self.index.find(signature, self.threshold)
+            if match is not None:
+                matches[position] = match[0]
+            else:
+                # Thêm ngay để bắt cả chunk trùng trong cùng lần upload
+                self._add(ids[position], signature)
+
+        # Point trong chỉ mục có thể đã bị xoá ở worker khác: kiểm tra lại.
+        # Point của chính lần upload này (kể cả batch trước, upsert wait=False có thể
+        # chưa đọc được) luôn coi là còn
+        existing = {}
+        stored_ids = list({pid for pid in matches.values() if pid not in self._added})
+        if stored_ids:
+            points = await asyncio.to_thread(self.vectordb.retrieve_metadata, stored_ids)
+            existing = {str(point.id): point for point in points}
+        for position, point_id in list(matches.items()):
+            if point_id in self._added or point_id in existing:
+                continue
+            self.index.remove(point_id)
+            self._add(ids[position], signatures[position])
+            del matches[position]
+
+        self.duplicates += len(matches)
+        if self.mode == "link":
+            linked = {}
+            for position, point_id in matches.items():
+                if point_id in existing and point_id not in linked:
+                    linked[point_id] = documents[position].metadata
+            for point_id, metadata in linked.items():
+                written = await asyncio.to_thread(
+                    self.vectordb.link_doc_id, existing[point_id], doc_id, metadata
+                )
+                if written:
+                    self.linked_ids.append(point_id)
+
+        kept = [position for position in range(len(documents)) if position not in matches]
+        return (
+            [documents[position] for position in kept],
+            [ids[position] for position in kept],
+            [signatures[position] for position in kept],
+        )
+
+    async def commit(self) -> None:
+        """
+        Gọi sau khi ingest xong (đã flush_writes): báo các worker khác dựng lại chỉ mục.
+        Chỉ mục của worker này đã có các chunk vừa thêm, nên giữ nguyên nếu không
+        có thay đổi nào khác xen vào (generation tăng đúng 1)
+        """
+        if not (self.added_ids or self.linked_ids) or not get_settings().shared_cache_enabled:
+            return
+        namespace = dedup_namespace(self.vectordb.collection_name)
+        await get_shared_cache().ainvalidate(namespace)
+        generation = await get_shared_cache().ageneration(namespace)
+        if self.index.generation is not None and generation == self.index.generation + 1:
+            self.index.generation = generation
+
+    async def rollback(self, doc_id: str) -> None:
+        """Bỏ các signature đã thêm và gỡ doc_id khỏi các link đã ghi khi lần ingest này thất bại"""
+        for point_id in self.added_ids:
+            self.index.remove(point_id)
+        self.added_ids = []
+        self._added = set()
+        if self.linked_ids:
+            linked_ids, self.linked_ids = self.linked_ids, []
+            await asyncio.to_thread(self.vectordb.unlink_points, linked_ids, doc_id)
+
+    def report(self) -> Dict[str, float]:
+        return {
+            "chunks_total": self.chunks_total,
+            "duplicates": self.duplicates,
+            "dedup_mode": self.mode,
+            "dedup_threshold": self.threshold,
+            "dedup_ratio": round(self.duplicates / self.chunks_total, 4) if self.chunks_total else 0.0,
+        }
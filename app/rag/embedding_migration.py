@@ -0,0 +1,186 @@
+# Chuyển collection sang model embedding mới mà không dừng ingest / truy vấn.
+#
+# 1. Đăng ký migration: các QdrantDB tạo sau đó ghi vào cả collection cũ và
+#    collection đích (dual-write), đọc vẫn từ collection cũ
+# 2. Backfill: scroll collection cũ, embed lại page_content trong payload bằng
+#    model mới (ưu tiên ingest trong scheduler), upsert (wait=False) vào collection
+#    đích với cùng id và payload - không cần parse / OCR lại file gốc
+# 3. Đối soát: đồng bộ các point bị xoá / thêm trong lúc backfill
+# 4. Chuyển đọc/ghi sang collection đích và xoá collection cũ
+import asyncio
+from typing import IO, Dict, Optional, Set
+
+from qdrant_client.http.models import PointIdsList, PointStruct, VectorParams
+
+from app.rag.dedup import ainvalidate_signature_index
+from app.rag.embedding_registry import (
+    MIGRATION_FAILED,
+    acquire_backfill_lock,
+    active_migration,
+    backfill_running,
+    complete_migration,
+    get_collection_embedding,
+    start_migration,
+    update_migration,
+)
+from app.rag.embeddings import get_embedding_provider
+from app.rag.qdrantdb import QdrantDB
+from app.setting.config import get_settings
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+class MigrationCancelled(Exception):
+    pass
+
+
+def _still_running(collection_name: str, target: str) -> None:
+    migration = active_migration(get_collection_embedding(collection_name))
+    if migration is None or migration["physical"] != target:
+        raise MigrationCancelled(collection_name)
+
+
+def _scroll_ids(client, collection_name: str) -> Set[str]:
+    ids = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=1024,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.update(str(point.id) for point in points)
+        if offset is None:
+            return ids
+
+
+async def run_migration(
+    collection_name: str, batch_size: Optional[int] = None, lock: Optional[IO] = None
+) -> None:
+    """lock: khoá backfill (acquire_backfill_lock) được nhả khi kết thúc"""
+    batch_size = batch_size or get_settings().embedding_migration_batch_size
+    vectordb = QdrantDB(collection_name=collection_name)
+    client = vectordb.client
+    source = vectordb.collection_name
+    migration = vectordb.migration
+    target = migration["physical"]
+    embeddings = get_embedding_provider(migration["model"], migration["size"])
+
+    async def copy_points(points):
+        if not points:
+            return
+        vectors = await embeddings.aembed(
+            [(point.payload or {}).get("page_content", "") for point in points]
+        )
+        await vectordb.upsert_points(
+            target,
+            [
+                PointStruct(id=point.id, vector=vector.tolist(), payload=point.payload)
+                for point, vector in zip(points, vectors)
+            ],
+            wait=False,
+        )
+
+    try:
+        if not await asyncio.to_thread(client.collection_exists, target):
+            await asyncio.to_thread(
+                client.create_collection,
+                collection_name=target,
+                vectors_config=VectorParams(size=migration["size"], distance=vectordb.distance),
+            )
+        total = (await asyncio.to_thread(client.count, source, exact=True)).count
+        update_migration(collection_name, total=total)
+
+        done = 0
+        offset = None
+        while True:
+            _still_running(collection_name, target)
+            points, offset = await asyncio.to_thread(
+                client.scroll,
+                collection_name=source,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            if points:
+                await copy_points(points)
+                done += len(points)
+                update_migration(collection_name, done=done)
+            if offset is None:
+                break
+
+        # Đối soát: point bị xoá khỏi collection cũ sau khi đã backfill, và point
+        # do các QdrantDB tạo trước khi bắt đầu migration ghi vào (chưa dual-write)
+        _still_running(collection_name, target)
+        await vectordb.flush_writes()
+        source_ids = await asyncio.to_thread(_scroll_ids, client, source)
+        target_ids = await asyncio.to_thread(_scroll_ids, client, target)
+        stale = list(target_ids - source_ids)
+        if stale:
+            await asyncio.to_thread(
+                client.delete,
+                collection_name=target,
+                points_selector=PointIdsList(points=stale),
+            )
+        missing = list(source_ids - target_ids)
+        for start in range(0, len(missing), batch_size):
+            points = await asyncio.to_thread(
+                client.retrieve,
+                collection_name=source,
+                ids=missing[start:start + batch_size],
+                with_payload=True,
+            )
+            await copy_points(points)
+        await vectordb.flush_writes()
+
+        _still_running(collection_name, target)
+        previous = complete_migration(collection_name)
+        await asyncio.to_thread(client.delete_collection, collection_name=previous["physical"])
+        await ainvalidate_signature_index(previous["physical"])
+        print(f"[MIGRATION] {collection_name}: {previous['model']} -> {migration['model']} ({done} points)")
+    except MigrationCancelled:
+        print(f"[MIGRATION] {collection_name}: cancelled")
+    except Exception as e:
+        print(f"[MIGRATION] {collection_name}: failed: {e}")
+        update_migration(collection_name, status=MIGRATION_FAILED, error=str(e))
+    finally:
+        _tasks.pop(collection_name, None)
+        if lock is not None:
+            lock.close()
+
+
+def start_embedding_migration(collection_name: str, model: str, size: int) -> Dict:
+    """
+    Đăng ký migration và chạy backfill nền trong event loop hiện tại.
+    Gọi lại với cùng model khi migration đang dở (vd. sau khi restart) để chạy tiếp.
+    ValueError khi đã có backfill của collection đang chạy (ở worker này hoặc worker khác).
+    """
+    lock = acquire_backfill_lock(collection_name)
+    if lock is None:
+        raise ValueError(f"Collection {collection_name} is already being backfilled")
+    try:
+        migration = active_migration(get_collection_embedding(collection_name))
+        if migration and migration["model"] == model:
+            print(f"[MIGRATION] {collection_name}: resuming backfill to {model}")
+        else:
+            start_migration(collection_name, model, size)
+    except BaseException:
+        lock.close()
+        raise
+    _tasks[collection_name] = asyncio.create_task(run_migration(collection_name, lock=lock))
+    return migration_status(collection_name)
+
+
+def migration_status(collection_name: str) -> Dict:
+    entry = get_collection_embedding(collection_name)
+    return {
+        "collection": collection_name,
+        "model": entry["model"],
+        "size": entry["size"],
+        "physical": entry["physical"],
+        "migration": entry.get("migration"),
+        "running": collection_name in _tasks or backfill_running(collection_name),
+    }
@@ -0,0 +1,201 @@
+# Model embedding của từng collection, lưu ở file JSON (embedding_registry_path)
+# để mọi worker cùng thấy thời điểm chuyển model.
+#
+# {
+#   "rag_collection": {
+#     "model": "nomic-embed-text", "size": 768, "physical": "rag_collection",
+#     "migration": {
+#       "model": "all-minilm", "size": 384, "physical": "rag_collection__all-minilm",
+#       "status": "backfilling", "done": 1200, "total": 5000, "error": null
+#     }
+#   }
+# }
+#
+# - physical: collection Qdrant đang phục vụ đọc/ghi
+# - migration: collection đích đang được backfill; trong lúc này ghi vào cả hai,
+#   đọc vẫn từ physical cho tới khi backfill xong
+#
+# Ghi registry giữ khoá file (fcntl.flock trên <registry>.lock) để các worker
+# không ghi đè thay đổi của nhau. Backfill của mỗi collection giữ khoá riêng
+# (<registry>.<collection>.backfill.lock) suốt thời gian chạy: chỉ một worker
+# backfill, process chết thì hệ điều hành nhả khoá để worker khác chạy tiếp.
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import IO, Dict, Optional
+
+from app.setting.config import get_settings
+
+MIGRATION_BACKFILLING = "backfilling"
+MIGRATION_FAILED = "failed"
+
+_lock = threading.Lock()
+_cache: Dict = {"mtime": None, "state": {}}
+
+
+def _registry_path() -> str:
+    return get_settings().embedding_registry_path
+
+
+def _read_state(force: bool = False) -> Dict:
+    path = _registry_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    # Chỉ đọc lại file khi có worker khác ghi (force: luôn đọc, mtime có thể trùng)
+    if force or _cache["mtime"] != mtime:
+        with open(path, encoding="utf-8") as f:
+            _cache["state"] = json.load(f)
+        _cache["mtime"] = mtime
+    return _cache["state"]
+
+
+def _write_state(state: Dict) -> None:
+    path = _registry_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+    _cache["mtime"] = os.path.getmtime(path)
+    _cache["state"] = state
+
+
+@contextmanager
+def _file_lock():
+    """Khoá registry giữa các process trong lúc đọc - sửa - ghi"""
+    path = f"{_registry_path()}.lock"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def acquire_backfill_lock(collection_name: str) -> Optional[IO]:
+    """
+    Khoá backfill của collection (không chờ); None khi một worker khác (hoặc task
+    khác trong process) đang backfill. Giữ file trả về mở tới khi backfill kết thúc.
+    """
+    path = f"{_registry_path()}.{collection_name}.backfill.lock"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def backfill_running(collection_name: str) -> bool:
+    """Có worker nào đang giữ khoá backfill của collection không"""
+    lock_file = acquire_backfill_lock(collection_name)
+    if lock_file is None:
+        return True
+    lock_file.close()
+    return False
+
+
+def _default_entry(collection_name: str) -> Dict:
+    settings = get_settings()
+    configured = settings.embedding_models.get(collection_name) or {}
+    return {
+        "model": configured.get("model", settings.embedding_model),
+        "size": int(configured.get("size", settings.embedding_size)),
+        "physical": collection_name,
+        "migration": None,
+    }
+
+
+def get_collection_embedding(collection_name: str) -> Dict:
+    """Model, số chiều, collection vật lý và migration (nếu có) của collection"""
+    with _lock:
+        entry = _read_state().get(collection_name)
+    if entry is None:
+        return _default_entry(collection_name)
+    return {**_default_entry(collection_name), **entry}
+
+
+def active_migration(entry: Dict) -> Optional[Dict]:
+    migration = entry.get("migration")
+    if migration and migration.get("status") == MIGRATION_BACKFILLING:
+        return migration
+    return None
+
+
+def physical_name(collection_name: str, model: str) -> str:
+    return f"{collection_name}__{re.sub(r'[^0-9a-zA-Z_-]+', '-', model).strip('-')}"
+
+
+def _update(collection_name: str, fn) -> Dict:
+    with _lock, _file_lock():
+        state = dict(_read_state(force=True))
+        entry = {**_default_entry(collection_name), **state.get(collection_name, {})}
+        entry = fn(entry)
+        state[collection_name] = entry
+        _write_state(state)
+        return entry
+
+
+def start_migration(collection_name: str, model: str, size: int) -> Dict:
+    def apply(entry):
+        if active_migration(entry):
+            raise ValueError(f"Collection {collection_name} is already migrating")
+        if entry["model"] == model:
+            raise ValueError(f"Collection {collection_name} already uses {model}")
+        target = physical_name(collection_name, model)
+        entry["migration"] = {
+            "model": model,
+            "size": size,
+            "physical": target,
+            "status": MIGRATION_BACKFILLING,
+            "done": 0,
+            "total": None,
+            "error": None,
+        }
+        return entry
+
+    return _update(collection_name, apply)
+
+
+def update_migration(collection_name: str, **fields) -> Dict:
+    def apply(entry):
+        if entry.get("migration"):
+            entry["migration"] = {**entry["migration"], **fields}
+        return entry
+
+    return _update(collection_name, apply)
+
+
+def complete_migration(collection_name: str) -> Dict:
+    """Chuyển đọc/ghi sang collection đích; trả về entry trước khi chuyển"""
+    previous = {}
+
+    def apply(entry):
+        previous.update(entry)
+        migration = entry["migration"]
+        return {
+            "model": migration["model"],
+            "size": migration["size"],
+            "physical": migration["physical"],
+            "migration": None,
+        }
+
+    _update(collection_name, apply)
+    return previous
+
+
+def cancel_migration(collection_name: str) -> None:
+    def apply(entry):
+        entry["migration"] = None
+        return entry
+
+    if collection_name in _read_state():
+        _update(collection_name, apply)
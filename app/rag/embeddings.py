@@ -0,0 +1,193 @@
+import asyncio
+import os
+import re
+import zlib
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.rag.ollama_scheduler import OllamaScheduler, get_ollama_scheduler
+from app.setting.config import get_settings
+from app.setting.enum import OllamaLane, RequestPriority
+
+# Số đoạn văn bản embed trong một lần giữ slot, để request interactive
+# có thể chen vào giữa một lần ingest lớn
+INGEST_EMBED_BATCH_SIZE = 32
+
+# Tên model có tiền tố chọn provider, còn lại là model của Ollama:
+#   "nomic-embed-text"                  -> Ollama
+#   "onnx:/models/bge-small/model.onnx" -> ONNX Runtime (CPU, trong process)
+#   "hashing" / "hashing:384"           -> băm đặc trưng, tất định (test / benchmark)
+ONNX_PREFIX = "onnx:"
+HASHING_MODEL = "hashing"
+HASHING_PREFIX = "hashing:"
+
+
+class EmbeddingProvider(Embeddings):
+    """
+    Giao diện chung của các backend embedding.
+    - embed / aembed: trả về np.ndarray float32 (n, dim), dùng ở luồng chính
+    - embed_documents / embed_query / a...: bản list theo chuẩn LangChain,
+      để dùng được với QdrantVectorStore / Chroma
+    """
+
+    model: str
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    async def aembed(
+        self, texts: List[str], priority: RequestPriority = RequestPriority.INGEST
+    ) -> np.ndarray:
+        # Mặc định chạy bản sync trong threadpool để không chặn event loop
+        return await asyncio.to_thread(self.embed, texts)
+
+    async def aembed_one(self, text: str) -> np.ndarray:
+        """Embed câu truy vấn với ưu tiên interactive"""
+        return (await self.aembed([text], RequestPriority.INTERACTIVE))[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return (await self.aembed(texts)).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_one(text)).tolist()
+
+
+class OllamaEmbeddingProvider(EmbeddingProvider):
+    """
+    OllamaEmbeddings đi qua OllamaScheduler.
+    - aembed: theo priority (interactive cho truy vấn, ingest cho tài liệu),
+      chia theo batch nhỏ
+    Bản sync gọi thẳng Ollama (không qua scheduler), chỉ dùng cho các
+    helper cũ của LangChain; luồng chính luôn dùng bản async.
+    """
+
+    def __init__(
+        self,
+        model: str = "nomic-embed-text",
+        base_url: str = None,
+        scheduler: OllamaScheduler = None,
+    ):
+        from langchain_ollama import OllamaEmbeddings
+
+        self.model = model
+        self.inner = OllamaEmbeddings(
+            model=model,
+            base_url=base_url or get_settings().ollama_url,
+            client_kwargs={"timeout": 600},
+        )
+        self.scheduler = scheduler or get_ollama_scheduler()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.inner.embed_documents(texts), dtype=np.float32)
+
+    async def aembed(
+        self, texts: List[str], priority: RequestPriority = RequestPriority.INGEST
+    ) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), INGEST_EMBED_BATCH_SIZE):
+            batch = texts[start:start + INGEST_EMBED_BATCH_SIZE]
+            async with self.scheduler.slot(OllamaLane.EMBED, priority):
+                vectors.extend(await self.inner.aembed_documents(batch))
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class OnnxEmbeddingProvider(EmbeddingProvider):
+    """
+    Chạy model ONNX (sentence-transformers export) trên CPU ngay trong process,
+    bỏ qua lượt HTTP + JSON của Ollama. tokenizer.json nằm cùng thư mục model.
+    Cần cài thêm: pip install onnxruntime tokenizers
+    """
+
+    def __init__(self, model_path: str, max_length: int = None, threads: int = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        settings = get_settings()
+        self.model = f"{ONNX_PREFIX}{model_path}"
+        max_length = max_length or settings.onnx_max_length
+        threads = settings.onnx_threads if threads is None else threads
+
+        self.tokenizer = Tokenizer.from_file(
+            os.path.join(os.path.dirname(model_path), "tokenizer.json")
+        )
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = []
+        for start in range(0, len(texts), INGEST_EMBED_BATCH_SIZE):
+            encodings = self.tokenizer.encode_batch(texts[start:start + INGEST_EMBED_BATCH_SIZE])
+            input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+            # Mean pooling theo attention mask rồi chuẩn hoá L2
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.linalg.norm(pooled, axis=1, keepdims=True) + 1e-12
+            vectors.append(pooled.astype(np.float32))
+        return np.vstack(vectors)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Embedding tất định bằng feature hashing (từ + cặp từ), không cần model.
+    Dùng cho test và benchmark; không phản ánh ngữ nghĩa.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.model = f"{HASHING_PREFIX}{dim}"
+        self.dim = dim
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            hashed = zlib.crc32(feature.encode("utf-8"))
+            vector[hashed % self.dim] += 1.0 if (hashed >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._embed_one(text) for text in texts])
+
+    async def aembed(
+        self, texts: List[str], priority: RequestPriority = RequestPriority.INGEST
+    ) -> np.ndarray:
+        # Đủ nhanh để chạy ngay trong event loop
+        return self.embed(texts)
+
+
+@lru_cache()
+def get_embedding_provider(model: str, size: int = None) -> EmbeddingProvider:
+    """Provider theo tên model (xem tiền tố ở trên); dùng chung trong process"""
+    if model.startswith(ONNX_PREFIX):
+        return OnnxEmbeddingProvider(model[len(ONNX_PREFIX):])
+    if model == HASHING_MODEL:
+        return HashingEmbeddingProvider(size or get_settings().embedding_size)
+    if model.startswith(HASHING_PREFIX):
+        return HashingEmbeddingProvider(int(model[len(HASHING_PREFIX):]))
+    return OllamaEmbeddingProvider(model=model)
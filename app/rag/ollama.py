@@ -1,10 +1,10 @@
 import httpx
 from app.setting.config import get_settings
 
-async def check_ollama_connection() -> bool:
+async def check_ollama_connection(timeout: float = 5.0) -> bool:
     try:
         # print('setting', get_settings())
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=timeout) as client:
             response = await client.get(get_settings().ollama_url)
             if response.status_code == 200:
                 return True
@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Dict, List
+
+from app.setting.config import get_settings
+from app.setting.enum import OllamaLane, RequestPriority
+
+
+class OllamaOverloadedError(Exception):
+    """Hàng đợi của một lane đã đầy, request bị từ chối ngay (429)."""
+
+    def __init__(self, lane: OllamaLane, retry_after: int):
+        self.lane = lane
+        self.retry_after = retry_after
+        super().__init__(f"Ollama '{lane}' queue is full, retry after {retry_after}s")
+
+
+class _LaneState:
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        # heap of (priority, seq, future)
+        self.waiters: List[tuple] = []
+        self.admitted_total = 0
+        self.rejected_total = 0
+
+    def queued(self, priority: RequestPriority = None) -> int:
+        return sum(
+            1
+            for prio, _, fut in self.waiters
+            if not fut.done() and (priority is None or prio == priority)
+        )
+
+
+class OllamaScheduler:
+    """
+    Điều phối mọi lời gọi tới Ollama theo từng lane (embed / generate / meta).
+    Mỗi lane có giới hạn số request chạy đồng thời; request chờ được xếp theo
+    độ ưu tiên (interactive trước ingest). Request interactive bị từ chối khi
+    hàng đợi đầy; request ingest luôn chờ trong hàng đợi (số lượng đã bị chặn bởi
+    batch của pipeline ingest), để một lần upload không bị huỷ giữa chừng vì 429.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[OllamaLane, int],
+        max_queue: int = 32,
+        retry_after: int = 2,
+    ):
+        self.retry_after = retry_after
+        self._lanes = {
+            lane: _LaneState(limit, max_queue) for lane, limit in limits.items()
+        }
+        self._seq = itertools.count()
+
+    def _queue_full(self, state: _LaneState, priority: RequestPriority) -> bool:
+        if priority == RequestPriority.INGEST:
+            return False
+        return state.queued(priority) >= state.max_queue
+
+    def check_admission(self, lane: OllamaLane, priority: RequestPriority) -> None:
+        """Từ chối sớm (trước khi mở stream) nếu lane không thể nhận thêm request."""
+        state = self._lanes[lane]
+        if state.active < state.limit:
+            return
+        if self._queue_full(state, priority):
+            state.rejected_total += 1
+            raise OllamaOverloadedError(lane, self.retry_after)
+
+    async def acquire(self, lane: OllamaLane, priority: RequestPriority) -> None:
+        state = self._lanes[lane]
+        if state.active < state.limit and state.queued() == 0:
+            state.active += 1
+            state.admitted_total += 1
+            return
+
+        if self._queue_full(state, priority):
+            state.rejected_total += 1
+            raise OllamaOverloadedError(lane, self.retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(state.waiters, (int(priority), next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Slot đã được cấp đúng lúc request bị huỷ -> trả lại cho người sau
+            if future.done() and not future.cancelled():
+                self.release(lane)
+            raise
+        state.admitted_total += 1
+
+    def release(self, lane: OllamaLane) -> None:
+        state = self._lanes[lane]
+        state.active -= 1
+        while state.waiters and state.active < state.limit:
+            _, _, future = heapq.heappop(state.waiters)
+            if future.done():
+                continue
+            state.active += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, lane: OllamaLane, priority: RequestPriority = RequestPriority.INTERACTIVE):
+        await self.acquire(lane, priority)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        return {
+            str(lane): {
+                "limit": state.limit,
+                "active": state.active,
+                "queued_interactive": state.queued(RequestPriority.INTERACTIVE),
+                "queued_ingest": state.queued(RequestPriority.INGEST),
+                "max_queue": state.max_queue,
+                "admitted_total": state.admitted_total,
+                "rejected_total": state.rejected_total,
+            }
+            for lane, state in self._lanes.items()
+        }
+
+
+@lru_cache()
+def get_ollama_scheduler() -> OllamaScheduler:
+    settings = get_settings()
+    return OllamaScheduler(
+        limits={
+            OllamaLane.EMBED: settings.ollama_embed_concurrency,
+            OllamaLane.GENERATE: settings.ollama_generate_concurrency,
+            OllamaLane.META: settings.ollama_meta_concurrency,
+        },
+        max_queue=settings.ollama_max_queue,
+        retry_after=settings.ollama_retry_after,
+    )
@@ -1,21 +1,100 @@
 import os
 import getpass
+import asyncio
+import math
+import threading
+from functools import lru_cache
 from typing import List
-from langchain_ollama import OllamaEmbeddings, ChatOllama
+import numpy as np
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import Distance, VectorParams, PointStruct
 from app.models.document import Document
+from app.rag.embeddings import get_embedding_provider
+from app.rag.dedup import invalidate_signature_index
+from app.rag.embedding_registry import active_migration, cancel_migration, get_collection_embedding
+from app.service.shared_cache import ainvalidate_collection, invalidate_collection
 from app.setting.config import get_settings
 from uuid import uuid4
 from app.setting.enum import DocsCollection
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+from qdrant_client.http.models import Filter, FieldCondition, HasIdCondition, MatchValue, PointIdsList
 import httpx
 
+# Trường quản lý link (dedup mode "link"), không thuộc metadata của một tài liệu
+LINK_METADATA_KEYS = ("doc_id", "linked_doc_ids", "linked_metadata")
 
-async def check_qdrant_connection() -> bool:
+
+class _SerializedQdrantClient:
+    """
+    QdrantClient chế độ local (path=...) không an toàn khi gọi từ nhiều thread
+    (asyncio.to_thread, threadpool của FastAPI): tuần tự hoá mọi lời gọi.
+    """
+
+    def __init__(self, client: QdrantClient):
+        self._client = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+
+        return call
+
+
+@lru_cache()
+def get_qdrant_client():
+    """
+    Client dùng chung trong process.
+    - vector_backend = "remote": Qdrant server qua REST (qdrant_url), hoặc gRPC
+      (qdrant_grpc_port, cùng host) cho search / upsert khi qdrant_transport = "grpc"
+    - vector_backend = "local": Qdrant nhúng trong process, lưu ở qdrant_local_path.
+      Mỗi thư mục chỉ mở được bởi một process: chạy uvicorn với 1 worker.
+    """
+    settings = get_settings()
+    if settings.vector_backend == "local":
+        os.makedirs(settings.qdrant_local_path, exist_ok=True)
+        return _SerializedQdrantClient(QdrantClient(path=settings.qdrant_local_path))
+    return _remote_client(settings.qdrant_url)
+
+
+@lru_cache()
+def get_qdrant_probe_client(timeout: float):
+    """
+    Client cho health check: với Qdrant server, mọi request bị giới hạn bởi timeout
+    (giây) của chính client thay vì treo theo timeout mặc định.
+    """
+    settings = get_settings()
+    if settings.vector_backend == "local":
+        return get_qdrant_client()
+    return _remote_client(settings.qdrant_url, timeout=max(1, math.ceil(timeout)))
+
+
+def _remote_client(url: str, api_key: str = None, timeout: int = None) -> QdrantClient:
+    settings = get_settings()
+    return QdrantClient(
+        url=url,
+        api_key=api_key,
+        prefer_grpc=settings.qdrant_transport == "grpc",
+        grpc_port=settings.qdrant_grpc_port,
+        timeout=timeout,
+    )
+
+
+async def check_qdrant_connection(timeout: float = 5.0) -> bool:
+    if get_settings().vector_backend == "local":
+        try:
+            await asyncio.wait_for(asyncio.to_thread(get_qdrant_client().get_collections), timeout)
+            return True
+        except Exception as e:
+            print(f"Lỗi mở Qdrant local: {e}")
+            return False
     try:
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=timeout) as client:
             response = await client.get(get_settings().qdrant_url)
             if response.status_code == 200:
                 return True
@@ -29,33 +108,44 @@ class QdrantDB:
     def __init__(
         self,
         collection_name: DocsCollection = DocsCollection.SEARCH,
-        url: str = get_settings().qdrant_url,
+        url: str = None,
         api_key: str = None,
-        embedding_size: int = 768,  # nomic-embed-text dimension
+        embedding_size: int = None,  # mặc định lấy theo model của collection
         distance: Distance = Distance.COSINE,
         in_memory: bool = False,
     ):
         self.database = "hust"
-        self.collection_name = str(collection_name.value) if hasattr(collection_name, 'value') else str(collection_name)
+        self.logical_name = str(collection_name.value) if hasattr(collection_name, 'value') else str(collection_name)
+        # Model embedding và collection vật lý theo registry (đổi sau khi migrate model)
+        embedding = get_collection_embedding(self.logical_name)
+        self.collection_name = embedding["physical"]
         self.url = url
         self.api_key = api_key
-        self.embedding_size = embedding_size
+        self.embedding_model = embedding["model"]
+        self.embedding_size = embedding_size or embedding["size"]
         self.distance = distance
         
-        embeddings = OllamaEmbeddings(
-            model="nomic-embed-text",
-            base_url=get_settings().ollama_url,
-            client_kwargs={"timeout": 600},
+        self.embeddings = get_embedding_provider(self.embedding_model, self.embedding_size)
+        # Đang migrate model: ghi thêm vào collection đích (dual-write)
+        self.migration = active_migration(embedding)
+        self.migration_embeddings = (
+            get_embedding_provider(self.migration["model"], self.migration["size"])
+            if self.migration else None
         )
 
-        # Khởi tạo Qdrant client
+        # Khởi tạo Qdrant client: mặc định dùng client chung theo vector_backend,
+        # chỉ tạo client riêng khi chỉ định url / api_key hoặc in_memory
+        self.shared_client = not (in_memory or url or api_key)
         if in_memory:
             self.client = QdrantClient(":memory:")
+        elif self.shared_client:
+            self.client = get_qdrant_client()
         else:
-            self.client = QdrantClient(
-                url=self.url,
-                api_key=self.api_key,
-            )
+            self.client = _remote_client(self.url or get_settings().qdrant_url, self.api_key)
+        # Upsert wait=False chưa được xác nhận áp dụng: point cuối cùng theo collection,
+        # dùng làm barrier trong flush_writes()
+        self._pending_writes = {}
+        self._upsert_slots = asyncio.Semaphore(get_settings().qdrant_upsert_parallel)
         
         # Tạo collection nếu chưa tồn tại
         self._create_collection_if_not_exists()
@@ -64,32 +154,38 @@ class QdrantDB:
         self.qdrantdb = QdrantVectorStore(
             client=self.client,
             collection_name=self.collection_name,
-            embedding=embeddings,
+            embedding=self.embeddings,
         )
 
     def _create_collection_if_not_exists(self):
-        """Tạo collection nếu chưa tồn tại"""
+        """Tạo collection nếu chưa tồn tại (cả collection đích khi đang migrate, để dual-write
+        không lỗi trước khi job backfill kịp tạo)"""
+        targets = [(self.collection_name, self.embedding_size)]
+        if self.migration:
+            targets.append((self.migration["physical"], self.migration["size"]))
         try:
             # Kiểm tra xem collection đã tồn tại chưa
-            collections = self.client.get_collections().collections
-            collection_exists = any(col.name == self.collection_name for col in collections)
-            
-            if not collection_exists:
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(
-                        size=self.embedding_size, 
-                        distance=self.distance
-                    ),
-                )
+            collections = {col.name for col in self.client.get_collections().collections}
+
+            for collection_name, size in targets:
+                if collection_name not in collections:
+                    self.client.create_collection(
+                        collection_name=collection_name,
+                        vectors_config=VectorParams(
+                            size=size,
+                            distance=self.distance
+                        ),
+                    )
         except Exception as e:
             print(f"Error creating collection: {e}")
 
-    async def add_documents(self, doc_id, documents, metadatas=None):
-        # uuids = [str(uuid4()) for _ in range(len(documents))]
-        # await self.qdrantdb.aadd_documents(documents=documents, ids=uuids)
-        
-        uuids = [str(uuid4()) for _ in range(len(documents))]
+    async def add_documents(self, doc_id, documents, metadatas=None, ids=None, signatures=None, wait=True):
+        # Embed qua scheduler (ưu tiên ingest) rồi upsert trực tiếp, giữ nguyên
+        # định dạng payload của LangChain (page_content + metadata).
+        # signatures: MinHash của từng chunk, lưu ở payload "minhash" để dựng lại
+        # chỉ mục phát hiện trùng lặp
+        # wait=False: không chờ Qdrant áp dụng (ingest hàng loạt), gọi flush_writes() ở cuối
+        uuids = ids or [str(uuid4()) for _ in range(len(documents))]
         docs_with_ids = []
 
         for doc in documents:
@@ -98,7 +194,92 @@ class QdrantDB:
                 doc.metadata["doc_id"] = doc_id # str(uuid4())
             docs_with_ids.append(doc)
 
-        await self.qdrantdb.aadd_documents(documents=docs_with_ids, ids=uuids)
+        if not docs_with_ids:
+            return []
+
+        vectors = await self.embeddings.aembed(
+            [doc.page_content for doc in docs_with_ids]
+        )
+        points = []
+        for position, (point_id, vector, doc) in enumerate(zip(uuids, vectors, docs_with_ids)):
+            payload = {"page_content": doc.page_content, "metadata": doc.metadata}
+            if signatures is not None:
+                payload["minhash"] = [int(value) for value in signatures[position]]
+            points.append(PointStruct(id=point_id, vector=vector.tolist(), payload=payload))
+        await self.upsert_points(self.collection_name, points, wait=wait)
+        if self.migration:
+            migration_vectors = await self.migration_embeddings.aembed(
+                [doc.page_content for doc in docs_with_ids]
+            )
+            migration_points = [
+                PointStruct(id=point.id, vector=vector.tolist(), payload=point.payload)
+                for point, vector in zip(points, migration_vectors)
+            ]
+            await self.upsert_points(self.migration["physical"], migration_points, wait=wait)
+        return uuids
+
+    async def upsert_points(self, collection_name: str, points: List[PointStruct], wait: bool = True):
+        """
+        Upsert theo batch qdrant_upsert_batch_size, tối đa qdrant_upsert_parallel
+        request song song trên cả instance.
+        wait=False: Qdrant trả về ngay khi đã ghi WAL, chưa chắc đã tìm thấy được;
+        gọi flush_writes() trước khi coi dữ liệu là đã ghi xong.
+        """
+        if not points:
+            return
+        batch_size = get_settings().qdrant_upsert_batch_size
+
+        async def send(batch):
+            async with self._upsert_slots:
+                await asyncio.to_thread(
+                    self.client.upsert, collection_name=collection_name, points=batch, wait=wait
+                )
+
+        await asyncio.gather(*[
+            send(points[start:start + batch_size]) for start in range(0, len(points), batch_size)
+        ])
+        if wait:
+            await ainvalidate_collection(collection_name)
+        else:
+            # Huỷ cache một lần ở flush_writes() thay vì sau mỗi batch
+            self._pending_writes[collection_name] = points[-1].id
+
+    async def flush_writes(self):
+        """
+        Barrier nhất quán cho các upsert wait=False: Qdrant áp dụng thao tác ghi của
+        một shard theo thứ tự WAL, nên một thao tác wait=True gửi sau khi mọi batch
+        đã được nhận chỉ trả về khi các batch đó đã được áp dụng.
+        Barrier là set_payload rỗng lọc theo id (không tạo lại point nếu đã bị xoá).
+        Collection mặc định có 1 shard; nhiều shard cần barrier trên từng shard.
+        """
+        pending, self._pending_writes = self._pending_writes, {}
+        for collection_name, point_id in pending.items():
+            await asyncio.to_thread(
+                self.client.set_payload,
+                collection_name=collection_name,
+                payload={},
+                points=Filter(must=[HasIdCondition(has_id=[point_id])]),
+                wait=True,
+            )
+            # Kết quả truy xuất cache trước hoặc trong lúc các batch được áp dụng
+            await ainvalidate_collection(collection_name)
+
+    def _write_collections(self) -> List[str]:
+        """Các collection vật lý cần ghi: collection hiện tại và collection đích khi migrate"""
+        if self.migration:
+            return [self.collection_name, self.migration["physical"]]
+        return [self.collection_name]
+
+    def _set_payload(self, point_id, payload: dict, key: str = "metadata"):
+        # Chọn point theo filter: collection đích có thể chưa được backfill point này
+        for collection_name in self._write_collections():
+            self.client.set_payload(
+                collection_name=collection_name,
+                payload=payload,
+                points=Filter(must=[HasIdCondition(has_id=[point_id])]),
+                key=key,
+            )
+            invalidate_collection(collection_name)
 
     # Query QdrantDB
     def query(self, query: str, top_k: int):
@@ -107,6 +288,59 @@ class QdrantDB:
         )
         return results
 
+    async def aquery(
+        self,
+        query: str,
+        top_k: int,
+        score_threshold: float = None,
+        payload_fields: List[str] = None,
+    ):
+        """
+        Embed câu truy vấn qua scheduler (ưu tiên interactive) rồi tìm kiếm.
+        - score_threshold: Qdrant bỏ các point dưới ngưỡng, không trả về
+        - payload_fields: chỉ lấy các trường payload cần dùng (vd. "metadata.source")
+        """
+        vector = await self.embeddings.aembed_one(query)
+        results, _ = await self.asearch_by_vector(
+            vector, top_k, score_threshold, payload_fields
+        )
+        return results
+
+    async def asearch_by_vector(
+        self,
+        vector: List[float],
+        top_k: int,
+        score_threshold: float = None,
+        payload_fields: List[str] = None,
+        with_vectors: bool = False,
+    ):
+        """
+        Tìm kiếm bằng vector đã embed sẵn.
+        Trả về (results, vectors); vectors chỉ có khi with_vectors=True,
+        dùng để re-rank cục bộ mà không phải embed lại.
+        """
+        response = await asyncio.to_thread(
+            self.client.query_points,
+            collection_name=self.collection_name,
+            query=np.asarray(vector, dtype=np.float32).tolist(),
+            limit=top_k,
+            score_threshold=score_threshold,
+            with_payload=payload_fields if payload_fields else True,
+            with_vectors=with_vectors,
+        )
+        results = [self._to_document(point) for point in response.points]
+        vectors = [point.vector for point in response.points] if with_vectors else None
+        return results, vectors
+
+    @staticmethod
+    def _to_document(point):
+        payload = point.payload or {}
+        doc = Document(
+            page_content=payload.get("page_content", ""),
+            metadata={**(payload.get("metadata") or {}), "_id": str(point.id)},
+        )
+        return doc, point.score
+
     # Additional search methods
     def similarity_search(self, query: str, top_k: int):
         """Tìm kiếm documents tương tự (chỉ trả về documents)"""
@@ -134,21 +368,17 @@ class QdrantDB:
         try:
             # Xóa collection
             self.client.delete_collection(collection_name=self.collection_name)
+            invalidate_signature_index(self.collection_name)
+            invalidate_collection(self.collection_name)
             
             # Tạo lại collection
             self._create_collection_if_not_exists()
             
             # Khởi tạo lại vector store
-            embeddings = OllamaEmbeddings(
-                model="nomic-embed-text",
-                base_url=get_settings().ollama_url,
-                client_kwargs={"timeout": 600},
-            )
-            
             self.qdrantdb = QdrantVectorStore(
                 client=self.client,
                 collection_name=self.collection_name,
-                embedding=embeddings,
+                embedding=self.embeddings,
             )
             
             return True
@@ -158,7 +388,12 @@ class QdrantDB:
 
     def delete_collection(self):
         try:
-            self.client.delete_collection(collection_name=self.collection_name)
+            for collection_name in self._write_collections():
+                self.client.delete_collection(collection_name=collection_name)
+                invalidate_collection(collection_name)
+            # Huỷ migration đang chạy (nếu có), job backfill sẽ tự dừng
+            cancel_migration(self.logical_name)
+            invalidate_signature_index(self.collection_name)
             return True
         except Exception as e:
             print(f"Error deleting Qdrant collection: {e}")
@@ -167,7 +402,12 @@ class QdrantDB:
     def delete_documents(self, ids: List[str]):
         """Xóa documents theo IDs"""
         try:
-            self.qdrantdb.delete(ids=ids)
+            for collection_name in self._write_collections():
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=PointIdsList(points=ids),
+                )
+                invalidate_collection(collection_name)
             return True
         except Exception as e:
             print(f"Error deleting documents: {e}")
@@ -175,21 +415,121 @@ class QdrantDB:
         
     def delete_documents_by_doc_id(self, doc_id: str):
         try:
+            # Chunk được các tài liệu khác link tới (dedup mode "link"):
+            # chuyển quyền sở hữu cho tài liệu link đầu tiên thay vì xoá
+            self._unlink_doc_id(doc_id)
+
             qfilter = Filter(
                 must=[FieldCondition(key="metadata.doc_id", match=MatchValue(value=doc_id))]
             )
             # self.qdrantdb.delete(filter=qfilter)
 
-            self.qdrantdb.client.delete(
-                collection_name=self.qdrantdb.collection_name,
-                points_selector=qfilter
-            )
+            for collection_name in self._write_collections():
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=qfilter
+                )
+                invalidate_collection(collection_name)
+            invalidate_signature_index(self.collection_name)
 
             return True
         except Exception as e:
             print(f"Error deleting documents by doc_id: {e}")
             return False
 
+    def _scroll(self, scroll_filter=None, with_payload=True):
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=1024,
+                offset=offset,
+                with_payload=with_payload,
+                with_vectors=False,
+            )
+            yield from points
+            if offset is None:
+                break
+
+    def scroll_signatures(self):
+        """(id, minhash) của mọi point đã lưu signature"""
+        return [
+            (str(point.id), point.payload["minhash"])
+            for point in self._scroll(with_payload=["minhash"])
+            if point.payload and point.payload.get("minhash")
+        ]
+
+    def retrieve_metadata(self, ids: List[str]):
+        return self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=["metadata"],
+        )
+
+    def link_doc_id(self, point, doc_id: str, doc_metadata: dict = None):
+        """
+        Ghi doc_id vào metadata.linked_doc_ids của một point đã có.
+        doc_metadata: metadata của chunk trùng (source, page, ...), lưu ở
+        metadata.linked_metadata[doc_id] để dùng khi tài liệu sở hữu bị xoá
+        """
+        metadata = (point.payload or {}).get("metadata") or {}
+        linked = list(metadata.get("linked_doc_ids") or [])
+        if metadata.get("doc_id") == doc_id or doc_id in linked:
+            return False
+        linked.append(doc_id)
+        linked_metadata = dict(metadata.get("linked_metadata") or {})
+        linked_metadata[doc_id] = {
+            key: value for key, value in (doc_metadata or {}).items()
+            if key not in LINK_METADATA_KEYS
+        }
+        self._set_payload(point.id, {"linked_doc_ids": linked, "linked_metadata": linked_metadata})
+        return True
+
+    def _remove_link(self, point, doc_id: str):
+        metadata = (point.payload or {}).get("metadata") or {}
+        if doc_id not in (metadata.get("linked_doc_ids") or []):
+            return
+        linked = [d for d in metadata.get("linked_doc_ids") or [] if d != doc_id]
+        linked_metadata = {
+            d: value for d, value in (metadata.get("linked_metadata") or {}).items() if d != doc_id
+        }
+        self._set_payload(point.id, {"linked_doc_ids": linked, "linked_metadata": linked_metadata})
+
+    def unlink_points(self, ids: List[str], doc_id: str):
+        """Gỡ doc_id khỏi linked_doc_ids của các point (rollback link của một lần ingest lỗi)"""
+        for point in self.retrieve_metadata(ids):
+            self._remove_link(point, doc_id)
+
+    def _unlink_doc_id(self, doc_id: str):
+        match = MatchValue(value=doc_id)
+        # 1. Point do doc_id sở hữu nhưng còn tài liệu khác link tới: chuyển cho tài liệu
+        #    link đầu tiên, thay cả metadata (source, page, ...) bằng metadata của tài liệu đó
+        owned = Filter(must=[FieldCondition(key="metadata.doc_id", match=match)])
+        for point in list(self._scroll(owned, with_payload=["metadata"])):
+            metadata = point.payload["metadata"]
+            linked = list(metadata.get("linked_doc_ids") or [])
+            if not linked:
+                continue
+            owner, rest = linked[0], linked[1:]
+            linked_metadata = dict(metadata.get("linked_metadata") or {})
+            owner_metadata = linked_metadata.pop(owner, None)
+            if owner_metadata is None:
+                # Link tạo trước khi lưu linked_metadata: không biết source của tài liệu
+                # còn lại, xoá point cùng tài liệu sở hữu thay vì trích dẫn sai nguồn
+                continue
+            # Ghi đè cả key "metadata" để không sót trường của tài liệu đã xoá
+            self._set_payload(point.id, {"metadata": {
+                **owner_metadata,
+                "doc_id": owner,
+                "linked_doc_ids": rest,
+                "linked_metadata": linked_metadata,
+            }}, key=None)
+        # 2. Point của tài liệu khác mà doc_id đang link tới
+        linking = Filter(must=[FieldCondition(key="metadata.linked_doc_ids", match=match)])
+        for point in list(self._scroll(linking, with_payload=["metadata"])):
+            self._remove_link(point, doc_id)
+
     def get_collection_info(self):
         """Lấy thông tin về collection"""
         try:
@@ -258,6 +598,8 @@ class QdrantDB:
 
     def close_connection(self):
         """Đóng kết nối"""
+        if self.shared_client:
+            return
         try:
             self.client.close()
         except Exception as e:
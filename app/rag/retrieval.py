@@ -0,0 +1,100 @@
+from typing import Any, List, Tuple
+
+import numpy as np
+
+ScoredDocument = Tuple[Any, float]
+
+
+def estimate_tokens(text: str) -> int:
+    # Ước lượng giống OllamaService.count_tokens (theo số từ)
+    return len(text.split())
+
+
+def select_adaptive_k(
+    results: List[ScoredDocument],
+    min_k: int = 1,
+    score_cliff: float = 0.1,
+    token_budget: int = 1500,
+) -> List[ScoredDocument]:
+    """
+    Chọn số lượng kết quả theo dữ liệu thay vì k cố định.
+    Dừng khi điểm tụt mạnh so với kết quả liền trước (score cliff)
+    hoặc khi tổng số token ngữ cảnh vượt quá token_budget.
+    Kết quả đầu vào phải được sắp xếp giảm dần theo score.
+    """
+    selected: List[ScoredDocument] = []
+    used_tokens = 0
+    previous_score = None
+
+    for doc, score in results:
+        if (
+            previous_score is not None
+            and len(selected) >= min_k
+            and previous_score - score > score_cliff
+        ):
+            break
+        tokens = estimate_tokens(doc.page_content)
+        if selected and used_tokens + tokens > token_budget:
+            break
+        selected.append((doc, score))
+        used_tokens += tokens
+        previous_score = score
+
+    return selected
+
+
+def _is_adjacent(meta_a: dict, meta_b: dict) -> bool:
+    """Hai chunk liền kề của cùng một nguồn (chồng lấn do chunk_overlap)"""
+    if meta_a.get("source") != meta_b.get("source"):
+        return False
+    index_a, index_b = meta_a.get("chunk_index"), meta_b.get("chunk_index")
+    if index_a is not None and index_b is not None:
+        return abs(index_a - index_b) <= 1
+    # Dữ liệu cũ chưa có chunk_index: coi các chunk cùng trang là liền kề
+    return meta_a.get("page") is not None and meta_a.get("page") == meta_b.get("page")
+
+
+def mmr_select(
+    query_vector,
+    results: List[ScoredDocument],
+    vectors,
+    k: int,
+    lambda_mult: float = 0.5,
+    collapse_adjacent: bool = True,
+) -> List[ScoredDocument]:
+    """
+    Max Marginal Relevance tính cục bộ bằng NumPy trên các vector đã lấy về
+    cùng kết quả tìm kiếm (không embed lại, không gọi thêm Qdrant).
+    Chunk liền kề cùng nguồn với một chunk đã chọn bị loại khỏi ứng viên.
+    """
+    if not results or k <= 0:
+        return []
+
+    # Không chuẩn hoá tại chỗ: vector đầu vào có thể là mảng float32 của caller
+    # (vd. vector truy vấn đang được cache)
+    candidates = np.asarray(vectors, dtype=np.float32)
+    candidates = candidates / (np.linalg.norm(candidates, axis=1, keepdims=True) + 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) + 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    available = np.ones(len(results), dtype=bool)
+    max_similarity = np.zeros(len(results), dtype=np.float32)
+    selected: List[int] = []
+
+    while len(selected) < k and available.any():
+        mmr = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        mmr[~available] = -np.inf
+        index = int(np.argmax(mmr))
+        selected.append(index)
+        available[index] = False
+        max_similarity = np.maximum(max_similarity, similarity[index])
+
+        if collapse_adjacent:
+            chosen_meta = results[index][0].metadata
+            for other in np.flatnonzero(available):
+                if _is_adjacent(chosen_meta, results[other][0].metadata):
+                    available[other] = False
+
+    return [results[index] for index in selected]
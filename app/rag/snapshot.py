@@ -0,0 +1,272 @@
+# Export / import snapshot của một collection để chuyển môi trường hoặc khôi phục
+# sau clear_vectordb mà không phải parse, OCR và embed lại từ đầu.
+#
+# Một snapshot là một thư mục:
+#   manifest.json     thông tin collection (số point, số chiều, dtype, distance)
+#   vectors.npy       ma trận vector liền khối float32 hoặc int8, đọc bằng mmap
+#   scales.npy        hệ số giải lượng tử từng vector (chỉ khi dtype = int8)
+#   payload.json.gz   payload lưu theo cột: {"ids": [...], "columns": {key: [...]}}
+#
+#   python -m app.rag.snapshot export --collection rag_collection [--dtype int8]
+#   python -m app.rag.snapshot import --name rag_collection-20240601T120000 [--collection ...]
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from qdrant_client.http.models import Distance, PointStruct
+
+from app.rag.dedup import ainvalidate_signature_index
+from app.rag.embedding_registry import get_collection_embedding
+from app.rag.qdrantdb import QdrantDB
+from app.setting.config import get_settings
+
+SNAPSHOT_FORMAT_VERSION = 1
+SCROLL_LIMIT = 1024
+DTYPES = ("float32", "int8")
+
+
+def _snapshot_root() -> str:
+    return get_settings().snapshot_directory
+
+
+def resolve_snapshot(name: str) -> str:
+    """Đường dẫn tới snapshot; chỉ chấp nhận tên thư mục nằm trong snapshot_directory"""
+    if not name or os.path.basename(name) != name or name in (".", ".."):
+        raise ValueError(f"Invalid snapshot name: {name}")
+    path = os.path.join(_snapshot_root(), name)
+    if not os.path.isfile(os.path.join(path, "manifest.json")):
+        raise FileNotFoundError(f"Snapshot not found: {name}")
+    return path
+
+
+def list_snapshots() -> List[Dict]:
+    root = _snapshot_root()
+    if not os.path.isdir(root):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(root)):
+        manifest_path = os.path.join(root, name, "manifest.json")
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                snapshots.append({"name": name, **json.load(f)})
+    return snapshots
+
+
+def _point_vector(point) -> List[float]:
+    vector = point.vector
+    if isinstance(vector, dict):
+        # Collection dùng named vector: lấy vector đầu tiên
+        vector = next(iter(vector.values()))
+    return vector
+
+
+def _quantize_int8(block: np.ndarray):
+    scales = np.abs(block).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(block / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def export_collection(collection_name: str, dtype: str = "float32", name: Optional[str] = None) -> Dict:
+    """Ghi toàn bộ point của collection ra một snapshot, trả về manifest"""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+
+    vectordb = QdrantDB(collection_name=collection_name)
+    client = vectordb.client
+    collection = vectordb.collection_name
+    info = client.get_collection(collection)
+    vectors_config = info.config.params.vectors
+    if isinstance(vectors_config, dict):
+        vectors_config = next(iter(vectors_config.values()))
+    dim = vectors_config.size
+    count = client.count(collection, exact=True).count
+
+    name = name or f"{collection}-{datetime.now().strftime('%Y%m%dT%H%M%S')}"
+    path = os.path.join(_snapshot_root(), name)
+    os.makedirs(path, exist_ok=False)
+
+    # Ghi thẳng vào file mmap theo từng trang scroll, không giữ cả ma trận trong RAM
+    vectors = np.lib.format.open_memmap(
+        os.path.join(path, "vectors.npy"), mode="w+", dtype=dtype, shape=(count, dim)
+    )
+    scales = np.ones(count, dtype=np.float32)
+    ids: List[str] = []
+    payloads: List[Dict] = []
+
+    offset = None
+    written = 0
+    while written < count:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=SCROLL_LIMIT,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        # Point được thêm trong lúc export sẽ bị bỏ qua
+        points = points[:count - written]
+        if points:
+            block = np.asarray([_point_vector(point) for point in points], dtype=np.float32)
+            end = written + len(points)
+            if dtype == "int8":
+                vectors[written:end], scales[written:end] = _quantize_int8(block)
+            else:
+                vectors[written:end] = block
+
+            ids += [str(point.id) for point in points]
+            payloads += [point.payload or {} for point in points]
+            written = end
+        if offset is None:
+            break
+
+    vectors.flush()
+    del vectors
+    if written < count:
+        # Có point bị xoá trong lúc export: cắt bớt phần chưa ghi
+        full = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        np.save(os.path.join(path, "vectors.tmp.npy"), full[:written])
+        del full
+        os.replace(os.path.join(path, "vectors.tmp.npy"), os.path.join(path, "vectors.npy"))
+        scales = scales[:written]
+    if dtype == "int8":
+        np.save(os.path.join(path, "scales.npy"), scales)
+
+    keys = sorted({key for payload in payloads for key in payload})
+    columns = {key: [payload.get(key) for payload in payloads] for key in keys}
+    with gzip.open(os.path.join(path, "payload.json.gz"), "wt", encoding="utf-8") as f:
+        json.dump({"ids": ids, "columns": columns}, f, ensure_ascii=False)
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "collection": collection,
+        # Tên logical (DocsCollection): import mặc định vào đây, không vào tên vật lý
+        "logical_collection": vectordb.logical_name,
+        "count": written,
+        "dim": dim,
+        "dtype": dtype,
+        "embedding_model": vectordb.embedding_model,
+        "distance": str(vectors_config.distance.value),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"[SNAPSHOT] Exported {written} points of {collection} to {path}")
+    return {"name": name, **manifest}
+
+
+def _load_snapshot(path: str):
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    with gzip.open(os.path.join(path, "payload.json.gz"), "rt", encoding="utf-8") as f:
+        payloads = json.load(f)
+
+    vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+    scales = None
+    if manifest["dtype"] == "int8":
+        scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+    return manifest, payloads, vectors, scales
+
+
+async def import_snapshot(
+    name: str,
+    collection_name: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    parallel: Optional[int] = None,
+) -> Dict:
+    """
+    Upsert snapshot vào collection (mặc định là collection logical gốc) theo các batch
+    song song. Từ chối khi model / số chiều embedding khác với collection đích.
+    """
+    settings = get_settings()
+    batch_size = batch_size or settings.snapshot_batch_size
+    parallel = parallel or settings.snapshot_parallel
+
+    # Đọc manifest / payload và tạo collection là I/O đồng bộ: chạy ngoài event loop
+    path = resolve_snapshot(name)
+    manifest, payloads, vectors, scales = await asyncio.to_thread(_load_snapshot, path)
+
+    # Snapshot cũ chưa có logical_collection: tên gốc chính là tên logical
+    target = str(collection_name or manifest.get("logical_collection") or manifest["collection"])
+    embedding = get_collection_embedding(target)
+    if (embedding["model"], embedding["size"]) != (manifest["embedding_model"], manifest["dim"]):
+        raise ValueError(
+            f"Snapshot {name} uses {manifest['embedding_model']} ({manifest['dim']} dims) "
+            f"but {target} uses {embedding['model']} ({embedding['size']} dims)"
+        )
+
+    vectordb = await asyncio.to_thread(
+        QdrantDB, collection_name=target, distance=Distance(manifest["distance"])
+    )
+    ids = payloads["ids"]
+    columns = payloads["columns"]
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def upsert_batch(start: int, end: int):
+        # Chỉ giải nén batch khi có slot, tránh dựng toàn bộ point trong RAM
+        async with semaphore:
+            block = np.asarray(vectors[start:end], dtype=np.float32)
+            if scales is not None:
+                block *= np.asarray(scales[start:end])[:, None]
+            points = [
+                PointStruct(
+                    id=ids[index],
+                    vector=block[index - start].tolist(),
+                    payload={
+                        key: column[index]
+                        for key, column in columns.items()
+                        if column[index] is not None
+                    },
+                )
+                for index in range(start, end)
+            ]
+            await vectordb.upsert_points(vectordb.collection_name, points, wait=False)
+
+    await asyncio.gather(*[
+        upsert_batch(start, min(start + batch_size, len(ids)))
+        for start in range(0, len(ids), batch_size)
+    ])
+    await vectordb.flush_writes()
+    await ainvalidate_signature_index(vectordb.collection_name)
+
+    print(f"[SNAPSHOT] Imported {len(ids)} points from {name} into {vectordb.collection_name}")
+    return {"name": name, "collection": vectordb.collection_name, "count": len(ids)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import collection snapshot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--collection", required=True)
+    export_parser.add_argument("--dtype", choices=DTYPES, default="float32")
+    export_parser.add_argument("--name")
+
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("--name", required=True)
+    import_parser.add_argument("--collection")
+    import_parser.add_argument("--batch-size", type=int)
+    import_parser.add_argument("--parallel", type=int)
+
+    subparsers.add_parser("list")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        result = export_collection(args.collection, args.dtype, args.name)
+    elif args.command == "import":
+        result = asyncio.run(
+            import_snapshot(args.name, args.collection, args.batch_size, args.parallel)
+        )
+    else:
+        result = list_snapshots()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
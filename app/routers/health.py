@@ -0,0 +1,35 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.service.health import STATUS_DEGRADED, STATUS_READY, get_health_prober
+from app.setting.config import get_settings
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+# Trả lời từ trạng thái do HealthProber cập nhật nền: không đọc lại appsettings.json,
+# không mở kết nối tới Ollama / Qdrant trong request
+@router.get("")
+async def health():
+    state = get_health_prober().readiness()
+    return {
+        "ollama_connection": state.get("ollama_connection", False),
+        "qdrant_connection": state.get("qdrant_connection", False),
+        "server_status": "Running",
+        **state,
+        "configs": get_settings(),
+    }
+
+
+@router.get("/live")
+async def liveness():
+    """Process còn phục vụ request; không phụ thuộc Ollama / Qdrant"""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def readiness():
+    """503 khi chưa có kết quả kiểm tra, kết quả đã cũ hoặc mất kết nối; degraded vẫn 200"""
+    state = get_health_prober().readiness()
+    status_code = 200 if state["status"] in (STATUS_READY, STATUS_DEGRADED) else 503
+    return JSONResponse(status_code=status_code, content=state)
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 import json
 from typing import List, Optional
 
 from app.models.ollama import OllamaRequest
+from app.rag.ollama_scheduler import get_ollama_scheduler
 from app.service.ollama_service import OllamaService, get_ollama_service
+from app.service.profiler import PROFILE_ID_HEADER, profiled_stream, start_profile
 from app.setting.config import settings
+from app.setting.enum import OllamaLane, RequestPriority
 
 router = APIRouter(prefix="/ollama", tags=["ollama"])
 
@@ -14,18 +18,41 @@ router = APIRouter(prefix="/ollama", tags=["ollama"])
 @router.post("/chat/stream")
 async def chat_stream(
     request: OllamaRequest,
+    http_request: Request,
     ollama_service: OllamaService = Depends(get_ollama_service),
 ):
+    # Từ chối sớm (429) trước khi mở stream nếu hàng đợi đã đầy
+    scheduler = get_ollama_scheduler()
+    scheduler.check_admission(OllamaLane.EMBED, RequestPriority.INTERACTIVE)
+    scheduler.check_admission(OllamaLane.GENERATE, RequestPriority.INTERACTIVE)
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "Content-Type": "text/event-stream"
+    }
+    stream = ollama_service.chat_stream(request)
+    profile = start_profile(http_request, "chat_stream")
+    background = None
+    if profile:
+        # File profile được ghi khi stream kết thúc; background task dừng session cả khi
+        # stream không bao giờ được đọc. Trường hợp Starlette bỏ qua background (client
+        # ngắt với ASGI 2.4), sampler dừng session sau profiling_max_seconds
+        stream = profiled_stream(stream, profile)
+        headers[PROFILE_ID_HEADER] = profile.id
+        background = BackgroundTask(profile.stop)
+
     return StreamingResponse(
-        ollama_service.chat_stream(request),
+        stream,
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream"
-        }
+        headers=headers,
+        background=background,
     )
 
 @router.get("/models")
 async def get_models(ollama_service: OllamaService = Depends(get_ollama_service)):
     return await ollama_service.list_models()
+
+@router.get("/metrics")
+async def get_scheduler_metrics():
+    return get_ollama_scheduler().metrics()
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from app.service.profiler import list_profiles, resolve_profile
+
+router = APIRouter(prefix="/profiles", tags=["profiling"])
+
+
+@router.get("")
+async def get_profiles():
+    return list_profiles()
+
+
+@router.get("/{profile_id}")
+async def download_profile(profile_id: str):
+    try:
+        path = resolve_profile(profile_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
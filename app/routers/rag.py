@@ -1,9 +1,12 @@
 import os
-from typing import Annotated
-from fastapi import APIRouter, BackgroundTasks, File, Form, UploadFile
+from typing import Annotated, Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, Query, Request, Response, UploadFile
 from fastapi.params import Depends
+from app.routers.responses import FastJSONResponse, decode_cursor, encode_cursor, query_fingerprint
 from app.service.rag_service import RAGService, get_rag_service
+from app.service.profiler import PROFILE_ID_HEADER, start_profile
 from app.setting.enum import DocsCollection
+from app.transformers.rag_file_transformer import FIELDS_FULL
 
 router = APIRouter(prefix="/rag", tags=["rag"])
 
@@ -11,6 +14,8 @@ router = APIRouter(prefix="/rag", tags=["rag"])
 async def load_document(
     doc_id: Annotated[str, Form()],
     file: Annotated[UploadFile, File()],
+    request: Request,
+    response: Response,
     collection: Annotated[DocsCollection, Form()] = DocsCollection.RAG,
     rag_service: RAGService = Depends(get_rag_service),
 ):
@@ -21,15 +26,19 @@ async def load_document(
     with open(file_path, "wb") as f:
         f.write(await file.read())
 
-    documents = await rag_service.load_and_split_document(
-        doc_id,
-        file_path,
-        collection,
-        {
-            "chunk_size": 2000,
-            "chunk_overlap": 150,
-        },
-    )
+    profile = start_profile(request, "upload")
+    try:
+        # Tuỳ chọn chia chunk theo collection (chunk_options trong appsettings)
+        documents = await rag_service.load_and_split_document(doc_id, file_path, collection)
+    finally:
+        if profile:
+            profile.stop()
+            response.headers[PROFILE_ID_HEADER] = profile.id
+    report = rag_service.last_ingest_report or {}
+    response.headers["X-Ingest-Chunks"] = str(report.get("chunks_total", 0))
+    response.headers["X-Ingest-Indexed"] = str(report.get("indexed", 0))
+    response.headers["X-Dedup-Duplicates"] = str(report.get("duplicates", 0))
+    response.headers["X-Dedup-Ratio"] = str(report.get("dedup_ratio", 0.0))
     return documents
 
 @router.delete("/delete-document-by-doc-id")
@@ -47,19 +56,51 @@ async def delete_documents_by_doc_id(
 async def query_document(
     query: str,
     k: int,
+    request: Request,
     collection: DocsCollection = DocsCollection.RAG,
+    score_threshold: Optional[float] = None,
+    adaptive_k: bool = False,
+    diversity: bool = False,
+    fields: Literal["full", "snippet", "ids"] = FIELDS_FULL,
+    limit: Annotated[Optional[int], Query(ge=1)] = None,
+    cursor: Optional[str] = None,
     rag_service: RAGService = Depends(get_rag_service),
 ):
-    return await rag_service.query_document(collection, query, k)
+    # Cursor gắn với tham số xếp hạng: trang sau phải dùng cùng query / k / collection
+    fingerprint = query_fingerprint(str(collection), query, k, score_threshold, adaptive_k, diversity)
+    try:
+        offset = decode_cursor(cursor, fingerprint)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    profile = start_profile(request, "query")
+    try:
+        result = await rag_service.query_document(
+            collection, query, k, score_threshold, adaptive_k, diversity,
+            fields=fields,
+            offset=offset,
+            limit=limit,
+        )
+    finally:
+        if profile:
+            profile.stop()
+    if isinstance(result, dict):
+        next_offset = result.pop("next_offset")
+        result["next_cursor"] = encode_cursor(next_offset, fingerprint) if next_offset is not None else None
+    response = FastJSONResponse(result)
+    if profile:
+        response.headers[PROFILE_ID_HEADER] = profile.id
+    return response
 
 
 @router.get("/generate-prompt")
 async def query_document(
     query: str,
     collection: DocsCollection = DocsCollection.RAG,
+    diversity: Optional[bool] = None,
     rag_service: RAGService = Depends(get_rag_service),
 ):
-    return await rag_service.generate_prompt(query, collection)
+    return FastJSONResponse(await rag_service.generate_prompt(query, collection, diversity))
 
 
 @router.get("/clear-vectordb")
@@ -69,3 +110,61 @@ async def clear_vectordb(
 ):
     return await rag_service.clear_vectordb(collection)
 
+@router.get("/snapshots")
+async def list_snapshots(
+    rag_service: RAGService = Depends(get_rag_service),
+):
+    return rag_service.list_snapshots()
+
+
+@router.post("/snapshots/export")
+async def export_snapshot(
+    collection: DocsCollection,
+    dtype: Literal["float32", "int8"] = "float32",
+    rag_service: RAGService = Depends(get_rag_service),
+):
+    return await rag_service.export_snapshot(collection, dtype)
+
+
+@router.post("/snapshots/import")
+async def import_snapshot(
+    name: str,
+    collection: Optional[DocsCollection] = None,
+    rag_service: RAGService = Depends(get_rag_service),
+):
+    try:
+        return await rag_service.import_snapshot(name, collection)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/embedding-migration")
+async def start_embedding_migration(
+    collection: DocsCollection,
+    model: str,
+    size: int,
+    rag_service: RAGService = Depends(get_rag_service),
+):
+    try:
+        return rag_service.start_embedding_migration(collection, model, size)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/embedding-migration")
+async def get_embedding_migration(
+    collection: DocsCollection,
+    rag_service: RAGService = Depends(get_rag_service),
+):
+    return rag_service.get_embedding_migration(collection)
+
+@router.get("/metrics")
+async def get_retrieval_metrics(
+    rag_service: RAGService = Depends(get_rag_service),
+):
+    return {
+        "retrieval": rag_service.single_flight.metrics(),
+        "conversation_cache": rag_service.conversation_cache.metrics(),
+        "shared_cache": rag_service.shared_cache.metrics() if rag_service.shared_cache else None,
+    }
@@ -0,0 +1,51 @@
+# Response nhanh cho các endpoint truy xuất:
+# - FastJSONResponse: serialize bằng orjson (hỗ trợ numpy, nhanh hơn nhiều so với
+#   jsonable_encoder + json.dumps); endpoint trả thẳng response để bỏ qua jsonable_encoder
+# - Cursor phân trang trên danh sách kết quả đã xếp hạng: base64url của
+#   {offset, fingerprint tham số truy vấn}, cursor không dùng lại được cho truy vấn khác
+import base64
+import zlib
+from typing import Any, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    # Pydantic model, Settings, ... (các kiểu orjson không tự serialize)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "__dict__"):
+        return vars(value)
+    return str(value)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+def query_fingerprint(*params: Any) -> str:
+    return format(zlib.crc32(repr(params).encode("utf-8")), "08x")
+
+
+def encode_cursor(offset: int, fingerprint: str) -> str:
+    raw = orjson.dumps({"o": offset, "f": fingerprint})
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], fingerprint: str) -> int:
+    """Offset trong cursor; ValueError nếu cursor hỏng hoặc của truy vấn khác"""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = orjson.loads(raw)
+        offset = int(data["o"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if data.get("f") != fingerprint or offset < 0:
+        raise ValueError("Cursor does not match this query")
+    return offset
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from app.setting.config import get_settings
+
+
+@dataclass
+class ConversationContext:
+    """Ứng viên đã truy xuất cho một hội thoại, kèm vector để re-score cục bộ"""
+
+    collection: str
+    topic_vector: np.ndarray
+    candidates: List[Tuple[Any, float]]
+    vectors: np.ndarray
+    expires_at: float
+    generation: Optional[int] = None
+
+
+class ConversationCache:
+    """
+    Cache ứng viên truy xuất theo chat_id, giới hạn số hội thoại (LRU) và
+    hết hạn theo TTL. Câu hỏi tiếp theo trong cùng chủ đề được re-score trên
+    các ứng viên này thay vì gọi lại Qdrant.
+    Ingest / xoá trên collection làm các hội thoại của nó hết hiệu lực: trong worker
+    qua invalidate_collection(), ở worker khác qua generation của shared cache.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, ConversationContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.topic_shifts = 0
+
+    def get(
+        self, chat_id: Hashable, collection: str, generation: Optional[int] = None
+    ) -> Optional[ConversationContext]:
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None or entry.collection != collection:
+                return None
+            if entry.expires_at < time.monotonic() or entry.generation != generation:
+                del self._entries[chat_id]
+                return None
+            self._entries.move_to_end(chat_id)
+            return entry
+
+    def put(
+        self,
+        chat_id: Hashable,
+        collection: str,
+        topic_vector: np.ndarray,
+        candidates: List[Tuple[Any, float]],
+        vectors: np.ndarray,
+        generation: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            self._entries[chat_id] = ConversationContext(
+                collection=collection,
+                topic_vector=topic_vector,
+                candidates=candidates,
+                vectors=vectors,
+                expires_at=time.monotonic() + self.ttl,
+                generation=generation,
+            )
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def drop(self, chat_id: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(chat_id, None)
+
+    def invalidate_collection(self, collection: str) -> None:
+        with self._lock:
+            for chat_id in [key for key, entry in self._entries.items() if entry.collection == collection]:
+                del self._entries[chat_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "conversations": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "topic_shifts": self.topic_shifts,
+        }
+
+
+def rescore(query_vector: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """Cosine giữa câu hỏi và các ứng viên (giống điểm Qdrant với Distance.COSINE)"""
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) + 1e-12)
+    candidates = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+    return candidates @ query
+
+
+@lru_cache()
+def get_conversation_cache() -> ConversationCache:
+    settings = get_settings()
+    return ConversationCache(
+        max_entries=settings.conversation_cache_size,
+        ttl=settings.conversation_cache_ttl,
+    )
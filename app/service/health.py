@@ -0,0 +1,234 @@
+# Trạng thái phụ thuộc (Ollama, Qdrant, embed) do một task nền kiểm tra định kỳ
+# với timeout ngắn; các endpoint health chỉ đọc trạng thái đã cache nên gần như
+# không tốn gì và không bị treo theo phụ thuộc.
+#
+# - live: process và event loop còn phản hồi
+# - ready: lần kiểm tra gần nhất còn mới, Ollama và Qdrant kết nối được
+# - degraded: vẫn ready nhưng embed chậm / lỗi hoặc hàng đợi Ollama gần đầy
+#
+# Nhiều worker uvicorn: chỉ worker giữ khoá file (cạnh file shared cache) chạy kiểm tra
+# và ghi kết quả vào L2; các worker khác đọc kết quả đó và thử giành khoá ở mỗi chu kỳ
+# (worker đang giữ khoá chết thì worker khác thay). Hàng đợi Ollama là của từng
+# process nên mỗi worker tự đánh giá phần đó khi trả lời.
+import asyncio
+import fcntl
+import math
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+from app.rag.embedding_registry import get_collection_embedding
+from app.rag.embeddings import get_embedding_provider
+from app.rag.ollama import check_ollama_connection
+from app.rag.ollama_scheduler import get_ollama_scheduler
+from app.rag.qdrantdb import check_qdrant_connection, get_qdrant_probe_client
+from app.service.shared_cache import MISSING, get_shared_cache
+from app.setting.config import get_settings
+from app.setting.enum import DocsCollection, RequestPriority
+
+STATUS_STARTING = "starting"
+STATUS_READY = "ready"
+STATUS_DEGRADED = "degraded"
+STATUS_UNAVAILABLE = "unavailable"
+
+HEALTH_PROBE_TEXT = "health check"
+HEALTH_NAMESPACE = "health"
+# Hàng đợi của một lane đầy quá tỉ lệ này thì báo degraded
+QUEUE_DEGRADED_RATIO = 0.8
+
+
+class HealthProber:
+    def __init__(
+        self,
+        interval: float,
+        timeout: float,
+        embed_degraded_ms: float,
+        lock_path: Optional[str] = None,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.embed_degraded_ms = embed_degraded_ms
+        # lock_path None: không có L2 dùng chung, worker tự kiểm tra
+        self.lock_path = lock_path
+        self.leader = lock_path is None
+        self._lock_file = None
+        # Kết quả kiểm tra phụ thuộc gần nhất (của worker này hoặc đọc từ L2)
+        self.dependencies: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+            self.leader = False
+
+    def _try_lead(self) -> bool:
+        """Giành khoá kiểm tra (không chờ); giữ tới khi process dừng"""
+        if self.leader:
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.leader = True
+        print("[HEALTH] this worker runs the dependency probes")
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._try_lead():
+                    await self.probe()
+                else:
+                    await self._load_shared()
+            except Exception as e:
+                print(f"[HEALTH] probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def probe(self) -> Dict:
+        started_at = time.perf_counter()
+        ollama, qdrant, embed = await asyncio.gather(
+            check_ollama_connection(timeout=self.timeout),
+            check_qdrant_connection(timeout=self.timeout),
+            self._probe_embed(),
+        )
+        collections = await self._probe_collections() if qdrant else {}
+        self.dependencies = {
+            "ollama_connection": ollama,
+            "qdrant_connection": qdrant,
+            "embed": embed,
+            "collections": collections,
+            "checked_at": time.time(),
+            "probe_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        }
+        if self.lock_path is not None:
+            await asyncio.to_thread(
+                get_shared_cache().l2.set,
+                HEALTH_NAMESPACE,
+                "dependencies",
+                self.dependencies,
+                self._stale_after(),
+            )
+        return self.readiness()
+
+    async def _load_shared(self) -> None:
+        dependencies = await asyncio.to_thread(get_shared_cache().l2.get, HEALTH_NAMESPACE, "dependencies")
+        if dependencies is not MISSING:
+            self.dependencies = dependencies
+
+    def _evaluate(self, dependencies: Dict) -> Dict:
+        queues = get_ollama_scheduler().metrics()
+        # max_queue chỉ giới hạn request interactive (ingest luôn được xếp hàng)
+        saturated = [
+            lane for lane, lane_metrics in queues.items()
+            if lane_metrics["queued_interactive"]
+            >= QUEUE_DEGRADED_RATIO * max(lane_metrics["max_queue"], 1)
+        ]
+
+        embed = dependencies["embed"]
+        reasons = []
+        if not embed["ok"]:
+            reasons.append(f"embed: {embed['error']}")
+        elif embed["latency_ms"] > self.embed_degraded_ms:
+            reasons.append(f"embed latency {embed['latency_ms']} ms")
+        if saturated:
+            reasons.append(f"ollama queue near full: {', '.join(saturated)}")
+
+        if not (dependencies["ollama_connection"] and dependencies["qdrant_connection"]):
+            status = STATUS_UNAVAILABLE
+        elif reasons:
+            status = STATUS_DEGRADED
+        else:
+            status = STATUS_READY
+        return {
+            "status": status,
+            "ollama_connection": dependencies["ollama_connection"],
+            "qdrant_connection": dependencies["qdrant_connection"],
+            "embed": embed,
+            "collections": dependencies["collections"],
+            "ollama_queue": {lane: queues[lane] for lane in saturated},
+            "degraded_reasons": reasons,
+            "checked_at": dependencies["checked_at"],
+            "probe_ms": dependencies["probe_ms"],
+        }
+
+    async def _probe_embed(self) -> Dict:
+        embedding = get_collection_embedding(str(DocsCollection.RAG))
+        started_at = time.perf_counter()
+        try:
+            provider = get_embedding_provider(embedding["model"], embedding["size"])
+            # Ưu tiên ingest: probe không chen trước request của người dùng; hàng đợi embed
+            # bị ingest chiếm quá timeout thì báo degraded
+            await asyncio.wait_for(
+                provider.aembed([HEALTH_PROBE_TEXT], RequestPriority.INGEST), self.timeout
+            )
+        except Exception as e:
+            return {"ok": False, "model": embedding["model"], "error": str(e) or type(e).__name__}
+        return {
+            "ok": True,
+            "model": embedding["model"],
+            "latency_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        }
+
+    async def _probe_collections(self) -> Dict[str, Optional[int]]:
+        counts = {}
+        for collection in DocsCollection:
+            name = str(collection)
+            try:
+                # Client của probe tự giới hạn thời gian mỗi request: thread không bị bỏ lại
+                counts[name] = await asyncio.to_thread(self._point_count, name)
+            except Exception as e:
+                print(f"[HEALTH] {name}: {e}")
+                counts[name] = None
+        return counts
+
+    def _point_count(self, collection_name: str) -> int:
+        """Số point (ước lượng) của collection vật lý hiện tại; không tạo collection"""
+        client = get_qdrant_probe_client(self.timeout)
+        physical = get_collection_embedding(collection_name)["physical"]
+        if not client.collection_exists(physical):
+            return 0
+        return client.count(physical, exact=False, timeout=max(1, math.ceil(self.timeout))).count
+
+    def _stale_after(self) -> float:
+        return 3 * self.interval + self.timeout
+
+    def is_stale(self) -> bool:
+        if self.dependencies is None:
+            return True
+        # Thời gian thực (không phải monotonic): kết quả có thể do worker khác ghi
+        return time.time() - self.dependencies["checked_at"] > self._stale_after()
+
+    def readiness(self) -> Dict:
+        if self.dependencies is None:
+            return {"status": STATUS_STARTING}
+        state = self._evaluate(self.dependencies)
+        if self.is_stale():
+            return {**state, "status": STATUS_UNAVAILABLE, "degraded_reasons": ["health probe is stale"]}
+        return state
+
+
+@lru_cache()
+def get_health_prober() -> HealthProber:
+    settings = get_settings()
+    shared = settings.shared_cache_enabled and settings.shared_cache_path
+    return HealthProber(
+        interval=settings.health_probe_interval,
+        timeout=settings.health_probe_timeout,
+        embed_degraded_ms=settings.health_embed_degraded_ms,
+        lock_path=f"{settings.shared_cache_path}.health.lock" if shared else None,
+    )
@@ -1,16 +1,26 @@
 import httpx
 import json
 import asyncio
+import logging
+import time
 from fastapi import Depends, HTTPException
 from typing import List, AsyncGenerator, Optional, Dict, Any
 from datetime import datetime
 import os
 
 from app.models.ollama import OllamaRequest
+from app.rag.ollama_scheduler import OllamaOverloadedError, get_ollama_scheduler
 # from app.service.message_service import MessageService, get_message_service
-from app.service.rag_service import RAGService, get_rag_service
+from app.service.rag_service import RAGService, get_rag_service, RAG_SYSTEM_PROMPT
+from app.service.shared_cache import MISSING, get_shared_cache
 from app.setting.config import settings, get_settings
-from app.setting.enum import DocsCollection
+from app.setting.enum import DocsCollection, OllamaLane, RequestPriority
+
+logger = logging.getLogger(__name__)
+
+MODELS_CACHE_NAMESPACE = "ollama:models"
+# Model mới pull về xuất hiện sau tối đa chừng này giây
+MODELS_CACHE_TTL = 60
 
 
 class OllamaService:
@@ -22,6 +32,11 @@ class OllamaService:
         self.base_url = settings.ollama_url
         self.timeout = settings.ollama_timeout
         self.rag_service = rag_service
+        self.scheduler = get_ollama_scheduler()
+        self.chat_model = settings.ollama_chat_model
+        self.keep_alive = settings.ollama_keep_alive
+        self.num_ctx = settings.ollama_num_ctx
+        self.shared_cache = get_shared_cache() if settings.shared_cache_enabled else None
 
     def count_tokens(self, text: str) -> int:
         # """Đếm số token trong văn bản sử dụng tokenizer"""
@@ -39,6 +54,8 @@ class OllamaService:
                     return True
 
             return False
+        except OllamaOverloadedError:
+            raise
         except Exception as e:
             print(f"[ERROR] Không thể kiểm tra model '{model_name}': {str(e)}")
             # Trả về False để an toàn
@@ -79,43 +96,61 @@ class OllamaService:
             str: JSON string of the response from Ollama API.
         """
         ollama_url = f"{self.base_url}/api/chat"
-        model_to_use = request.model
-        chat_id = 1;
-
-        # Kiểm tra sự tồn tại của model
-        if not await self.check_model_exists(model_to_use):
-            error_message = f"Model '{model_to_use}' không tồn tại hoặc chưa được cài đặt trong Ollama"
-            yield f"data: {json.dumps({'error': error_message})}\n\n"
+        # Luôn chat bằng ollama_chat_model (model được warm-up, prefix đã cache);
+        # request.model khác model đó bị từ chối thay vì lặng lẽ bỏ qua
+        model_to_use = self.chat_model
+        chat_id = request.chat_id
+        if request.model and request.model != model_to_use:
+            logger.warning("Rejected chat model %r (serving %r)", request.model, model_to_use)
+            error_message = f"Model '{request.model}' không được hỗ trợ, server chỉ chat bằng '{model_to_use}'"
+            yield f"data: {json.dumps({'error': error_message, 'model': model_to_use, 'chat_id': chat_id})}\n\n"
             return
 
-        # Combine content messages
-        # text = self.combine_message_content(request.messages)
-        query = self.get_current_query(request.messages)
+        try:
+            # Kiểm tra sự tồn tại của model
+            if not await self.check_model_exists(model_to_use):
+                error_message = f"Model '{model_to_use}' không tồn tại hoặc chưa được cài đặt trong Ollama"
+                yield f"data: {json.dumps({'error': error_message})}\n\n"
+                return
+
+            # Combine content messages
+            # text = self.combine_message_content(request.messages)
+            query = self.get_current_query(request.messages)
 
-        prompt = await self.rag_service.generate_prompt(query, DocsCollection.RAG)
+            prompt = await self.rag_service.generate_prompt(
+                query, DocsCollection.RAG, chat_id=chat_id
+            )
+        except OllamaOverloadedError as e:
+            yield f"data: {json.dumps({'error': str(e), 'retry_after': e.retry_after, 'chat_id': chat_id})}\n\n"
+            return
 
         # load new message to context
         # for msg in messages:
         #     prompt.append({"role": "context", "content": msg.content})
 
         # Options for AI Model
+        # num_ctx phải giống với lúc warm-up, nếu khác Ollama sẽ nạp lại model
         options = {
             "top_k": 64,
             "top_p": 0.95,
+            "num_ctx": self.num_ctx,
         }
 
         payload = {
-            # "model": model_to_use,
-            #TODO: set default
-            "model": 'deepseek-r1:8b',
+            "model": model_to_use,
             "messages": prompt,
             "options": options,
             "stream": True,
+            "keep_alive": self.keep_alive,
         }
 
-        print(f"[DEBUG] Full payload: {json.dumps(payload, ensure_ascii=False)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Full payload: %s", json.dumps(payload, ensure_ascii=False))
+        started_at = time.perf_counter()
+        first_token_at = None
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with self.scheduler.slot(OllamaLane.GENERATE, RequestPriority.INTERACTIVE), \
+                    httpx.AsyncClient(timeout=self.timeout) as client:
                 async with client.stream("POST", ollama_url, json=payload) as response:
                     if response.status_code != 200:
                         error_detail = await response.aread()
@@ -125,9 +160,19 @@ class OllamaService:
                     # Stream response từ Ollama
                     async for chunk in response.aiter_text():
                         if chunk.strip():
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                logger.debug("TTFT %.0f ms", (first_token_at - started_at) * 1000)
                             try:
                                 data = json.loads(chunk)
                                 data["chat_id"] = chat_id
+                                if data.get("done"):
+                                    # prompt_eval_count nhỏ = prefix đã được cache
+                                    logger.debug(
+                                        "prompt_eval_count=%s prompt_eval_ms=%.0f",
+                                        data.get("prompt_eval_count"),
+                                        data.get("prompt_eval_duration", 0) / 1e6,
+                                    )
                                 yield f"data: {json.dumps(data)}\n\n"
 
                             except json.JSONDecodeError:
@@ -135,14 +180,53 @@ class OllamaService:
                                 yield f"data: {json.dumps({'text': chunk, 'chat_id': chat_id})}\n\n"
 
                 yield "data: [DONE]\n\n"
+        except OllamaOverloadedError as e:
+            yield f"data: {json.dumps({'error': str(e), 'retry_after': e.retry_after, 'chat_id': chat_id})}\n\n"
         except Exception as e:
             yield f"data: {json.dumps({'error': str(e), 'chat_id': chat_id})}\n\n"
 
+    async def warm_up(self) -> None:
+        """
+        Nạp sẵn model chat (với đúng num_ctx) và đánh giá trước system prompt
+        để prefix được cache, giúp request đầu tiên không phải chờ load model.
+        """
+        payload = {
+            "model": self.chat_model,
+            "messages": [
+                {"role": "system", "content": RAG_SYSTEM_PROMPT},
+                {"role": "user", "content": "Xin chào"},
+            ],
+            "options": {"num_ctx": self.num_ctx, "num_predict": 1},
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        started_at = time.perf_counter()
+        try:
+            async with self.scheduler.slot(OllamaLane.GENERATE, RequestPriority.INGEST), \
+                    httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.post(f"{self.base_url}/api/chat", json=payload)
+                response.raise_for_status()
+            print(f"[WARM-UP] {self.chat_model} ready in {time.perf_counter() - started_at:.1f}s")
+        except Exception as e:
+            print(f"[WARM-UP] Không thể warm-up model '{self.chat_model}': {str(e)}")
+
     # Get List Ollama's Models
     async def list_models(self) -> List[str]:
+        # Danh sách model ít thay đổi: cache (L1 + L2) để mỗi lượt chat không phải gọi /api/tags
+        if self.shared_cache is not None:
+            models = await self.shared_cache.aget(MODELS_CACHE_NAMESPACE, self.base_url)
+            if models is not MISSING:
+                return models
+        models = await self.fetch_models()
+        if self.shared_cache is not None:
+            await self.shared_cache.aset(MODELS_CACHE_NAMESPACE, self.base_url, models, ttl=MODELS_CACHE_TTL)
+        return models
+
+    async def fetch_models(self) -> List[str]:
         url = f"{self.base_url}/api/tags"
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with self.scheduler.slot(OllamaLane.META), \
+                    httpx.AsyncClient(timeout=self.timeout) as client:
                 response = await client.get(url)
                 if response.status_code != 200:
                     raise HTTPException(
@@ -162,6 +246,8 @@ class OllamaService:
                     }
                     models.append(info)
                 return models
+        except OllamaOverloadedError:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Lỗi khi lấy danh sách model: {str(e)}"
@@ -0,0 +1,263 @@
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from datetime import datetime
+from typing import AsyncGenerator, Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import Request
+
+from app.setting.config import get_settings
+
+# Profile theo yêu cầu cho từng request (header "X-Profile: 1" hoặc query "?profile=1",
+# chỉ khi profiling_enabled). Một thread lấy mẫu stack định kỳ và chỉ ghi các mẫu
+# thuộc request đang được profile:
+# - trên thread event loop: khi task đang chạy là task của request hoặc task con
+# - trên worker thread (asyncio.to_thread, threadpool của Starlette): khi context
+#   của job đang chạy mang session của request
+# Kết quả lưu dạng "folded stacks", mở bằng flamegraph.pl / speedscope / inferno.
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar("profile_session", default=None)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+class ProfileSession:
+    def __init__(self, name: str):
+        self.id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{name}-{uuid4().hex[:8]}"
+        self.name = name
+        self.started_at = time.monotonic()
+        self.samples: Counter = Counter()
+        self.tasks = weakref.WeakSet()
+        # active: còn lấy mẫu (tắt khi quá profiling_max_seconds); finished: đã ghi file
+        self.active = True
+        self.finished = False
+
+    def stop(self) -> Optional[str]:
+        """Dừng lấy mẫu và ghi file .folded; trả về đường dẫn file"""
+        if self.finished:
+            return None
+        self.finished = True
+        self.active = False
+        get_sampler().remove(self)
+        return write_profile(self)
+
+
+class _Sampler:
+    """Một thread lấy mẫu dùng chung cho mọi session đang chạy"""
+
+    def __init__(self):
+        self.sessions: List[ProfileSession] = []
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        # Task factory chỉ được cài khi có session: (factory của profiler, factory trước đó)
+        self._factories: Optional[tuple] = None
+
+    def add(self, session: ProfileSession) -> None:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.loop_thread_id = threading.get_ident()
+            self._factories = None
+        if self._factories is None:
+            self._factories = _install_task_factory(loop)
+        with self.lock:
+            self.sessions.append(session)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self.thread.start()
+
+    def remove(self, session: ProfileSession) -> None:
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            idle = not self.sessions
+        if idle and self._factories is not None:
+            # Session cuối cùng kết thúc: trả lại task factory trước đó
+            # (trừ khi đã có nơi khác thay factory sau profiler)
+            factory, previous = self._factories
+            self._factories = None
+            if self.loop.get_task_factory() is factory:
+                self.loop.set_task_factory(previous)
+
+    def _run(self) -> None:
+        settings = get_settings()
+        interval = settings.profiling_interval_ms / 1000
+        own_id = threading.get_ident()
+        while True:
+            with self.lock:
+                sessions = [s for s in self.sessions if s.active]
+                if not sessions:
+                    self.thread = None
+                    return
+            now = time.monotonic()
+            for session in sessions:
+                if now - session.started_at > settings.profiling_max_seconds:
+                    session.active = False
+                    # Session không ai dừng (vd. stream không bao giờ được đọc): dừng và
+                    # ghi file trên event loop (stop() trả lại task factory của loop)
+                    try:
+                        self.loop.call_soon_threadsafe(session.stop)
+                    except RuntimeError:
+                        pass
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                session = self._owner(thread_id, frame, sessions)
+                if session is not None and session.active:
+                    session.samples[_fold(frame)] += 1
+            time.sleep(interval)
+
+    def _owner(self, thread_id: int, frame, sessions: List[ProfileSession]) -> Optional[ProfileSession]:
+        if thread_id == self.loop_thread_id:
+            task = asyncio.current_task(self.loop)
+            if task is None:
+                return None
+            for session in sessions:
+                if task in session.tasks:
+                    return session
+            return None
+        context = _worker_context(frame)
+        return context.get(_current_session) if context is not None else None
+
+
+def _worker_context(frame) -> Optional[contextvars.Context]:
+    """Context của job đang chạy trên worker thread (to_thread / anyio)"""
+    while frame is not None:
+        if frame.f_code.co_name == "run":
+            local_vars = frame.f_locals
+            # anyio WorkerThread.run: context.run(func, *args)
+            context = local_vars.get("context")
+            if isinstance(context, contextvars.Context):
+                return context
+            # concurrent.futures _WorkItem.run: fn = partial(ctx.run, func) của asyncio.to_thread
+            work_item = local_vars.get("self")
+            fn = getattr(work_item, "fn", None)
+            if isinstance(fn, functools.partial):
+                owner = getattr(fn.func, "__self__", None)
+                if isinstance(owner, contextvars.Context):
+                    return owner
+        frame = frame.f_back
+    return None
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop) -> tuple:
+    """Cài task factory gắn task con vào session; trả về (factory, factory trước đó)"""
+    previous = loop.get_task_factory()
+
+    def factory(loop, coro, **kwargs):
+        if previous is not None:
+            task = previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        # Task con tạo trong lúc profile (single-flight, producer ingest, stream)
+        session = _current_session.get()
+        if session is not None and session.active:
+            session.tasks.add(task)
+        return task
+
+    loop.set_task_factory(factory)
+    return factory, previous
+
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+@functools.lru_cache()
+def get_sampler() -> _Sampler:
+    return _Sampler()
+
+
+def _profile_directory() -> str:
+    return get_settings().profiling_directory
+
+
+def write_profile(session: ProfileSession) -> str:
+    os.makedirs(_profile_directory(), exist_ok=True)
+    path = os.path.join(_profile_directory(), f"{session.id}.folded")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in session.samples.most_common():
+            f.write(f"{stack} {count}\n")
+    print(f"[PROFILE] {session.name}: {sum(session.samples.values())} samples -> {path}")
+    prune_profiles()
+    return path
+
+
+def prune_profiles() -> None:
+    """Chỉ giữ profiling_max_files file mới nhất"""
+    keep = get_settings().profiling_max_files
+    directory = _profile_directory()
+    paths = [
+        os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".folded")
+    ]
+    if keep <= 0 or len(paths) <= keep:
+        return
+    paths.sort(key=lambda path: (os.path.getmtime(path), path))
+    for path in paths[:-keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def profile_requested(request: Request) -> bool:
+    if not get_settings().profiling_enabled:
+        return False
+    flag = request.headers.get(PROFILE_HEADER) or request.query_params.get("profile")
+    return (flag or "").lower() in ("1", "true", "yes")
+
+
+def start_profile(request: Request, name: str) -> Optional[ProfileSession]:
+    """Bắt đầu profile request hiện tại nếu được yêu cầu; None khi tắt"""
+    if not profile_requested(request):
+        return None
+    session = ProfileSession(name)
+    session.tasks.add(asyncio.current_task())
+    _current_session.set(session)
+    get_sampler().add(session)
+    return session
+
+
+async def profiled_stream(generator: AsyncGenerator, session: ProfileSession) -> AsyncGenerator:
+    """Giữ session tới khi stream kết thúc"""
+    session.tasks.add(asyncio.current_task())
+    try:
+        async for chunk in generator:
+            yield chunk
+    finally:
+        session.stop()
+
+
+def resolve_profile(profile_id: str) -> str:
+    if os.path.basename(profile_id) != profile_id:
+        raise FileNotFoundError(profile_id)
+    path = os.path.join(_profile_directory(), f"{profile_id}.folded")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(profile_id)
+    return path
+
+
+def list_profiles() -> List[Dict]:
+    directory = _profile_directory()
+    if not os.path.isdir(directory):
+        return []
+    return [
+        {"id": name[:-len(".folded")], "size": os.path.getsize(os.path.join(directory, name))}
+        for name in sorted(os.listdir(directory), reverse=True)
+        if name.endswith(".folded")
+    ]
@@ -1,43 +1,62 @@
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 import os
+import asyncio
+from uuid import uuid4
+import numpy as np
 from fastapi import Depends, UploadFile
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    UnstructuredPDFLoader,
-    Docx2txtLoader,
-    UnstructuredHTMLLoader,
-    UnstructuredExcelLoader,
-)
+from starlette.concurrency import iterate_in_threadpool
 # from pdf2image import convert_from_path
 
-import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
-import io
-from pdfminer.high_level import extract_text
+# Các thư viện parse (PyMuPDF, pytesseract, pdfminer, unstructured, ...) được
+# import lười trong app.loaders, chỉ khi có file cần parse
+from app.loaders.registry import iter_document, is_chunked
+from app.loaders import pdf as pdf_loader
 
 # from docling.parsers import PdfParser, WordParser, HtmlParser, ExcelParser
 # from docling.document_converter import DocumentConverter
 
-from langchain_text_splitters import (
-    CharacterTextSplitter,
-    RecursiveCharacterTextSplitter,
-)
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.models.document import Document
 # from app.rag.chromadb import ChromaDB
 from app.rag.qdrantdb import QdrantDB
+from app.rag.chunking import get_chunk_options, get_text_splitter, iter_chunks
+from app.rag.embeddings import get_embedding_provider
+from app.rag.embedding_registry import get_collection_embedding
+from app.rag.retrieval import select_adaptive_k, mmr_select
+from app.rag.dedup import NearDuplicateDetector, get_dedup_threshold
+from app.rag import embedding_migration, snapshot
 import re
 import unicodedata
-from app.transformers.rag_file_transformer import transform_documents
+from app.transformers.rag_file_transformer import FIELDS_FULL, PAYLOAD_FIELDS, transform_documents
 from app.transformers.rag_content_transformer import transform_to_content
 from app.setting.enum import DocsCollection
 from app.models.prompt import OllamaPrompt, OllamaMessage
-import platform
+from app.service.single_flight import get_retrieval_single_flight, normalize_query
+from app.service.conversation_cache import get_conversation_cache, rescore
+from app.service.shared_cache import MISSING, collection_namespace, get_shared_cache
+from app.setting.config import get_settings
+
+# Đánh dấu hết chunk trong hàng đợi ingest
+_END_OF_CHUNKS = object()
+
+RAG_SYSTEM_PROMPT = (
+    "Bạn là một trợ lý AI có tên là a.Guide thuộc trường Đại học Bách Khoa Hà Nội.\n"
+    "Nhiệm vụ của bạn là trả lời câu hỏi bằng tiếng việt dựa trên các tài liệu đã được cung cấp.\n"
+    "Hãy trả lời câu hỏi một cách ngắn gọn, súc tích và rõ ràng, trích ra nguồn của tài liệu nếu có thể.\n"
+    "Nếu câu hỏi không liên quan đến tài liệu, bạn có thể dùng kiến thức của mình để trả lời câu hỏi.\n"
+    "Nếu câu hỏi không rõ ràng hoặc không đầy đủ, hãy yêu cầu người dùng cung cấp thêm thông tin."
+)
 
 
 class RAGService:
     def __init__(self):
         self.chatid = 1;
+        self.single_flight = get_retrieval_single_flight()
+        self.conversation_cache = get_conversation_cache()
+        # L1 trong process + L2 dùng chung giữa các worker (None khi tắt)
+        self.shared_cache = get_shared_cache() if get_settings().shared_cache_enabled else None
+        # Thống kê lần ingest gần nhất (số chunk, số chunk trùng)
+        self.last_ingest_report: Optional[Dict] = None
 
     def clean_text(self, text: str) -> str:
         return text.strip()
@@ -66,62 +85,67 @@ class RAGService:
     async def clean_documents(self, documents: List[Document]) -> List[Document]:
         cleaned_docs = []
         for doc in documents:
-            text = doc.page_content
-            # Except for the first document which is the file name
-            if not text.startswith("Tên file"):
-                # 1.Clean page_content
-                text = text.replace("\r\n", " ").replace("\n", " ").replace("\t", " ")
-                text = re.sub(r"[^\x20-\x7EÀ-ỹ\u00A0-\uFFFF]", "", text)
-                text = re.sub(r"\s+", " ", text)
-                text = re.sub(r"[.,!?;:]+", ".", text)
-                text = re.sub(r"^[.,!?;:]+", "", text)
-                text = re.sub(r"[.,!?;:]+$", ".", text)
-                text = text.strip()
-
-                if len(text.strip().split()) < 6:
-                    continue
-                if re.fullmatch(r"[\W\d\s]+", text):
-                    continue
-                # if not self.is_meaningful(text):
-                #     continue
-            doc.page_content = text
-            print(f"Content doc after cleaning: {text}")
-
-            # 2.Clean metadata
-            if doc.metadata is not None:
-                metadata_fields_to_remove = [
-                    "moddate",
-                    "creator",
-                    "producer",
-                    "page_label",
-                ]
-                for field in metadata_fields_to_remove:
-                    if field in doc.metadata:
-                        del doc.metadata[field]
-
-            cleaned_docs.append(doc)
+            cleaned = self.clean_document(doc)
+            if cleaned is not None:
+                cleaned_docs.append(cleaned)
 
         return cleaned_docs
 
-    def add_file_name_to_start(
-        self, metadata, documents: List[Document]
-    ) -> List[Document]:
-        source_path = metadata.get("source", "")
-        file_name = os.path.basename(source_path)
-        if not file_name:
-            file_name = "Untitled"
-
-        file_doc = Document(page_content="Tên file: " + file_name, metadata=metadata)
-        documents.insert(0, file_doc)
-
-        return documents
-    
-    # pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+    def clean_document(self, doc: Document) -> Optional[Document]:
+        """Làm sạch một chunk; trả về None nếu chunk không đủ nội dung"""
+        text = doc.page_content
+        # 1.Clean page_content
+        text = text.replace("\r\n", " ").replace("\n", " ").replace("\t", " ")
+        text = re.sub(r"[^\x20-\x7EÀ-ỹ\u00A0-\uFFFF]", "", text)
+        text = re.sub(r"\s+", " ", text)
+        text = re.sub(r"[.,!?;:]+", ".", text)
+        text = re.sub(r"^[.,!?;:]+", "", text)
+        text = re.sub(r"[.,!?;:]+$", ".", text)
+        text = text.strip()
+
+        if len(text.strip().split()) < 6:
+            return None
+        if re.fullmatch(r"[\W\d\s]+", text):
+            return None
+        # if not self.is_meaningful(text):
+        #     return None
+        doc.page_content = text
+
+        # 2.Clean metadata
+        self._clean_metadata(doc)
+
+        return doc
+
+    def clean_table_document(self, doc: Document) -> Optional[Document]:
+        """
+        Làm sạch chunk bảng tính do loader chia sẵn: chỉ chuẩn hoá khoảng trắng, giữ
+        nguyên xuống dòng giữa các dòng và dấu trong giá trị (3,5 / 10:30).
+        Trả về None nếu chunk rỗng.
+        """
+        lines = []
+        for line in doc.page_content.splitlines():
+            line = re.sub(r"[^\x20-\x7EÀ-ỹ\u00A0-\uFFFF]", " ", line)
+            line = re.sub(r"\s+", " ", line).strip()
+            if line:
+                lines.append(line)
+        if not lines:
+            return None
+        doc.page_content = "\n".join(lines)
+        self._clean_metadata(doc)
+        return doc
 
-    if platform.system() == "Windows":
-        pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-    else:
-        pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
+    @staticmethod
+    def _clean_metadata(doc: Document) -> None:
+        if doc.metadata is not None:
+            metadata_fields_to_remove = [
+                "moddate",
+                "creator",
+                "producer",
+                "page_label",
+            ]
+            for field in metadata_fields_to_remove:
+                if field in doc.metadata:
+                    del doc.metadata[field]
 
     @staticmethod
     def pdf_to_text_ocr_fitz(file_path: str, lang: str = "vie") -> str:
@@ -129,21 +153,7 @@ class RAGService:
         Đọc file PDF scan (image-based) bằng PyMuPDF và Tesseract OCR.
         Không cần Poppler.
         """
-        text_result = ""
-        doc = fitz.open(file_path)
-        print(f"🔍 Found {doc.page_count} pages in {file_path}")
-
-        for page_index in range(doc.page_count):
-            page = doc.load_page(page_index)
-            pix = page.get_pixmap(dpi=300)  # render với độ phân giải cao
-            mode = "RGBA" if pix.alpha else "RGB"
-            img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-
-            # OCR
-            text = pytesseract.image_to_string(img, lang=lang)
-            text_result += f"\n=== Page {page_index + 1} ===\n{text}\n"
-
-        return text_result
+        return pdf_loader.pdf_to_text_ocr_fitz(file_path, lang=lang)
     
     # Load and split document
     async def load_and_split_document(
@@ -151,14 +161,9 @@ class RAGService:
         doc_id: str,
         file_path: str,
         collection_name: DocsCollection,
-        options: Dict[str, any] = {
-            "chunk_size": 120,
-            "chunk_overlap": 0,
-        },
+        options: Optional[Dict[str, any]] = None,
     ) -> str:
         # TODO: Handle file pdf with UnstructuredPDFLoader
-        ext = os.path.splitext(file_path)[1].lower()
-        documents: List[Document] = []
 
         ## --- Using Langchain loaders ---
         # if file_path.endswith(".pdf"):
@@ -179,67 +184,344 @@ class RAGService:
         # text = result.document.export_to_text()
         # documents = [Document(page_content=text, metadata={"source": file_path})]
 
-        ## --- Using UnstructuredPDFLoader with OCR fallback ---
-        if ext == ".pdf":
-            try:
-                text = extract_text(file_path)
-                if text and len(text.strip()) > 20:
-                    print("📄 PDF has text layer — using PyPDFLoader")
-                    loader = PyPDFLoader(file_path)
-                    documents = loader.load()
-                else:
-                    full_text = RAGService.pdf_to_text_ocr_fitz(file_path, lang="vie")
-                    full_text = self.pdf_to_text_ocr_fitz(file_path, lang="vie")
-                    documents = [Document(page_content=full_text, metadata={"source": file_path})]
-            except Exception as e:
-                print(f"⚠️ OCR fallback failed: {e}")
-                raise ValueError(f"OCR fallback failed: {file_path}")
-        elif ext == ".docx":
-            loader = Docx2txtLoader(file_path)
-            documents = loader.load()
-        elif ext in [".xlsx", ".xls"]:
-            loader = UnstructuredExcelLoader(file_path)
-            documents = loader.load()
-        elif ext in [".html", ".htm"]:
-            loader = UnstructuredHTMLLoader(file_path)
-            documents = loader.load()
-        elif ext == ".txt":
-            with open(file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-                documents = [Document(page_content=text, metadata={"source": file_path})]
-        else:
-            raise ValueError(f"Unsupported file type: {file_path}")        
+        ## --- Using lazy loader registry + streaming pipeline ---
+        # page -> chunks -> cleaned chunks -> embed batch -> upsert.
+        # Parse chạy trong threadpool, song song với embed/upsert của batch trước;
+        # bộ nhớ bị chặn bởi ingest_batch_size, chunk đầu tiên tìm kiếm được
+        # ngay khi batch đầu tiên upsert xong.
+        # options: ghi đè tuỳ chọn chia chunk của collection (get_chunk_options)
+        options = {**get_chunk_options(str(collection_name)), **(options or {})}
+        chunks = self.iter_cleaned_chunks(file_path, options)
+        await self.ingest_chunks(doc_id, chunks, collection_name)
 
-        for doc in documents:
-            doc.page_content = self.clean_text(doc.page_content)
+        return file_path
 
+    def iter_cleaned_chunks(
+        self, file_path: str, options: Dict[str, any]
+    ) -> Iterator[Document]:
+        pages = self._iter_clean_pages(file_path)
         # Split documents into smaller chunks
-        if documents:
-            documents = self.split_documents(documents, options)
+        # (loader bảng tính đã tự chia theo nhóm dòng, giữ nguyên tiêu đề và
+        # chỉ làm sạch khoảng trắng để không làm hỏng dòng / số liệu)
+        if is_chunked(file_path):
+            chunks, clean = pages, self.clean_table_document
+        else:
+            chunks, clean = iter_chunks(pages, options), self.clean_document
 
-        documents_add_page_name = self.add_file_name_to_start(documents[0].metadata, documents)
-        documents_cleaned = await self.clean_documents(documents_add_page_name)
-        await self.add_to_vector_db(doc_id, documents_cleaned, collection_name)
+        # Vị trí chunk trong file, dùng để gộp các chunk liền kề khi truy vấn
+        for chunk_index, chunk in enumerate(chunks):
+            chunk.metadata["chunk_index"] = chunk_index
+            cleaned = clean(chunk)
+            if cleaned is not None:
+                yield cleaned
 
-        return file_path
+    def _iter_clean_pages(self, file_path: str) -> Iterator[Document]:
+        for page in iter_document(file_path):
+            page.page_content = self.clean_text(page.page_content)
+            yield page
+
+    async def ingest_chunks(
+        self,
+        doc_id: str,
+        chunks: Iterator[Document],
+        collection_name: DocsCollection,
+    ) -> int:
+        """
+        Đẩy chunk từ generator vào VectorDB theo từng batch.
+        Upsert không chờ Qdrant áp dụng (wait=False) để batch sau embed ngay;
+        barrier ở cuối đảm bảo mọi chunk đã tìm thấy được trước khi trả về.
+        Nếu parse/embed lỗi giữa chừng, các point đã upsert trong lần này bị xoá.
+        """
+        settings = get_settings()
+        batch_size = settings.ingest_batch_size
+        queue: asyncio.Queue = asyncio.Queue(maxsize=batch_size * 2)
+        producer = asyncio.create_task(self._produce_chunks(chunks, queue))
+        vectordb_instance = QdrantDB(collection_name=collection_name)
+        detector = None
+        if settings.dedup_mode != "off":
+            detector = NearDuplicateDetector(
+                vectordb_instance,
+                mode=settings.dedup_mode,
+                threshold=get_dedup_threshold(vectordb_instance.collection_name),
+            )
+        inserted_ids: List[str] = []
+        batch: List[Document] = []
+
+        async def flush(documents: List[Document]) -> List[str]:
+            ids = [str(uuid4()) for _ in documents]
+            signatures = None
+            if detector is not None:
+                documents, ids, signatures = await detector.filter_batch(doc_id, documents, ids)
+                if not documents:
+                    return []
+            return await vectordb_instance.add_documents(
+                doc_id, documents, ids=ids, signatures=signatures, wait=False
+            )
+
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is _END_OF_CHUNKS:
+                    break
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    inserted_ids += await flush(batch)
+                    batch = []
+            if batch:
+                inserted_ids += await flush(batch)
+            # Re-raise lỗi parse (nếu có)
+            await producer
+            await vectordb_instance.flush_writes()
+            if detector is not None:
+                await detector.commit()
+        except BaseException:
+            if not producer.done():
+                producer.cancel()
+            if detector is not None:
+                await detector.rollback(doc_id)
+            if inserted_ids:
+                # Xoá đồng bộ (Qdrant + huỷ cache): chạy ngoài event loop
+                await asyncio.to_thread(vectordb_instance.delete_documents, inserted_ids)
+            raise
+
+        if detector is not None:
+            self.last_ingest_report = {**detector.report(), "indexed": len(inserted_ids)}
+        else:
+            self.last_ingest_report = {"chunks_total": len(inserted_ids), "indexed": len(inserted_ids)}
+        print(f"[INGEST] {doc_id}: {self.last_ingest_report}")
+        return len(inserted_ids)
+
+    @staticmethod
+    async def _produce_chunks(chunks: Iterator[Document], queue: asyncio.Queue):
+        try:
+            async for chunk in iterate_in_threadpool(chunks):
+                await queue.put(chunk)
+        except Exception:
+            await queue.put(_END_OF_CHUNKS)
+            raise
+        await queue.put(_END_OF_CHUNKS)
 
     # Query document from VectorDB
     async def query_document(
-        self, collection_name: DocsCollection, query: str, k: int = 5
+        self,
+        collection_name: DocsCollection,
+        query: str,
+        k: int = 5,
+        score_threshold: float = None,
+        adaptive_k: bool = False,
+        diversity: bool = False,
+        fields: str = FIELDS_FULL,
+        offset: int = 0,
+        limit: int = None,
     ):
-        vectordb_instance = QdrantDB(collection_name=collection_name)
-        documents = vectordb_instance.query(query, k)
+        """
+        Kết quả truy xuất đã nhóm theo source.
+        - fields: full | snippet (page_content cắt còn query_snippet_chars) | ids (id, score)
+        - offset / limit: phân trang trên danh sách đã xếp hạng; các trang sau đọc lại
+          kết quả retrieve đã cache nên không embed / tìm kiếm lại. Khi có limit trả về
+          {"items", "total", "next_offset"} thay vì danh sách
+        """
+        documents = await self.retrieve(
+            collection_name, query, k, score_threshold, adaptive_k, diversity
+        )
+        snippet_chars = get_settings().query_snippet_chars
+        if limit is None and not offset:
+            return transform_documents(documents, fields, snippet_chars)
 
-        return transform_documents(documents)
+        end = offset + limit if limit is not None else len(documents)
+        return {
+            "items": transform_documents(documents[offset:end], fields, snippet_chars),
+            "total": len(documents),
+            "next_offset": end if end < len(documents) else None,
+        }
 
     async def query_rag_content_document(
         self, collection_name: DocsCollection, query: str, k: int = 5
     ):
-        vectordb_instance = QdrantDB(collection_name=collection_name)
-        documents = vectordb_instance.query(query, k)
+        documents = await self.retrieve(collection_name, query, k)
 
         return transform_to_content(documents)
 
+    async def retrieve(
+        self,
+        collection_name: DocsCollection,
+        query: str,
+        k: int = 5,
+        score_threshold: float = None,
+        adaptive_k: bool = False,
+        diversity: bool = False,
+    ):
+        """
+        Embed + tìm kiếm trên VectorDB. Các request đồng thời có cùng câu truy vấn
+        (đã chuẩn hoá), collection và tham số tìm kiếm dùng chung một lần truy xuất;
+        kết quả được cache (L1 + L2) theo collection vật lý tới khi collection thay đổi.
+
+        - score_threshold: mặc định lấy từ retrieval_score_threshold, áp dụng ngay trong Qdrant
+        - adaptive_k: lấy tối đa max(k, retrieval_max_k) kết quả rồi cắt tại
+          score cliff / token budget thay vì trả về đúng k kết quả
+        - diversity: lấy retrieval_mmr_fetch_k ứng viên kèm vector trong một lần
+          tìm kiếm, re-rank MMR cục bộ và gộp các chunk liền kề cùng nguồn
+        """
+        settings = get_settings()
+        if score_threshold is None:
+            score_threshold = settings.retrieval_score_threshold
+        limit = max(k, settings.retrieval_max_k) if adaptive_k else k
+
+        normalized_query = normalize_query(query)
+        key = (
+            str(collection_name),
+            normalized_query,
+            limit,
+            score_threshold,
+            adaptive_k,
+            diversity,
+        )
+        namespace = collection_namespace(get_collection_embedding(str(collection_name))["physical"])
+        if self.shared_cache is not None:
+            documents = await self.shared_cache.aget(namespace, key)
+            if documents is not MISSING:
+                return documents
+
+        async def run():
+            generation = (
+                await self.shared_cache.ageneration(namespace) if self.shared_cache is not None else None
+            )
+            vectordb_instance = QdrantDB(collection_name=collection_name)
+            query_vector = await self.embed_query(vectordb_instance.embeddings, normalized_query)
+            if diversity:
+                candidates, vectors = await vectordb_instance.asearch_by_vector(
+                    query_vector,
+                    max(limit, settings.retrieval_mmr_fetch_k),
+                    score_threshold=score_threshold,
+                    payload_fields=PAYLOAD_FIELDS,
+                    with_vectors=True,
+                )
+                documents = mmr_select(
+                    query_vector,
+                    candidates,
+                    vectors,
+                    limit,
+                    lambda_mult=settings.retrieval_mmr_lambda,
+                )
+                # Giữ thứ tự giảm dần theo score cho transformer / adaptive k
+                documents.sort(key=lambda item: item[1], reverse=True)
+            else:
+                documents, _ = await vectordb_instance.asearch_by_vector(
+                    query_vector,
+                    limit,
+                    score_threshold=score_threshold,
+                    payload_fields=PAYLOAD_FIELDS,
+                )
+            if adaptive_k:
+                documents = select_adaptive_k(
+                    documents,
+                    score_cliff=settings.retrieval_score_cliff,
+                    token_budget=settings.retrieval_token_budget,
+                )
+            if self.shared_cache is not None:
+                await self.shared_cache.aset(namespace, key, documents, generation=generation)
+            return documents
+
+        return await self.single_flight.do(key, run)
+
+    async def embed_query(self, provider, normalized_query: str) -> np.ndarray:
+        """Embed câu truy vấn (ưu tiên interactive), cache theo model embedding"""
+        if self.shared_cache is None:
+            return await provider.aembed_one(normalized_query)
+        namespace = f"embedding:{provider.model}"
+        vector = await self.shared_cache.aget(namespace, normalized_query)
+        if vector is MISSING:
+            vector = await provider.aembed_one(normalized_query)
+            await self.shared_cache.aset(namespace, normalized_query, vector)
+        return vector
+
+    async def retrieve_for_conversation(
+        self,
+        chat_id: int,
+        collection_name: DocsCollection,
+        query: str,
+        k: int = 5,
+        adaptive_k: bool = False,
+        diversity: bool = False,
+    ):
+        """
+        Truy xuất cho một lượt hội thoại.
+        Lượt đầu (hoặc khi đổi chủ đề) lấy conversation_fetch_k ứng viên kèm vector
+        từ Qdrant và cache theo chat_id; các câu hỏi tiếp theo cùng chủ đề được
+        re-score cục bộ trên các ứng viên đó, không gọi Qdrant.
+        """
+        settings = get_settings()
+        cache = self.conversation_cache
+        limit = max(k, settings.retrieval_max_k) if adaptive_k else k
+        embedding = get_collection_embedding(str(collection_name))
+        provider = get_embedding_provider(embedding["model"], embedding["size"])
+        query_vector = await self.embed_query(provider, normalize_query(query))
+
+        # Generation của collection: ingest / xoá ở worker khác làm entry cũ hết hiệu lực
+        generation = (
+            await self.shared_cache.ageneration(collection_namespace(embedding["physical"]))
+            if self.shared_cache is not None else None
+        )
+        documents = []
+        entry = cache.get(chat_id, embedding["physical"], generation)
+        if entry is None:
+            cache.misses += 1
+        elif float(rescore(entry.topic_vector, query_vector[None, :])[0]) >= settings.conversation_topic_threshold:
+            documents = self._select_candidates(
+                query_vector, entry.candidates, entry.vectors, limit, diversity
+            )
+            if documents:
+                cache.hits += 1
+        if entry is not None and not documents:
+            cache.topic_shifts += 1
+
+        if not documents:
+            vectordb_instance = QdrantDB(collection_name=collection_name)
+            # Không lọc theo ngưỡng để giữ đủ ứng viên cho các câu hỏi tiếp theo
+            candidates, vectors = await vectordb_instance.asearch_by_vector(
+                query_vector,
+                max(limit, settings.conversation_fetch_k),
+                payload_fields=PAYLOAD_FIELDS,
+                with_vectors=True,
+            )
+            vectors = np.asarray(vectors, dtype=np.float32)
+            cache.put(chat_id, embedding["physical"], query_vector, candidates, vectors, generation)
+            documents = self._select_candidates(
+                query_vector, candidates, vectors, limit, diversity
+            )
+
+        if adaptive_k:
+            documents = select_adaptive_k(
+                documents,
+                score_cliff=settings.retrieval_score_cliff,
+                token_budget=settings.retrieval_token_budget,
+            )
+        return documents
+
+    @staticmethod
+    def _select_candidates(query_vector, candidates, vectors, limit: int, diversity: bool):
+        """Re-score ứng viên theo câu hỏi hiện tại, lọc theo retrieval_score_threshold"""
+        settings = get_settings()
+        if not candidates:
+            return []
+        scores = rescore(query_vector, vectors)
+        keep = [
+            index for index in np.argsort(-scores)
+            if scores[index] >= settings.retrieval_score_threshold
+        ]
+        rescored = [(candidates[index][0], float(scores[index])) for index in keep]
+        if diversity:
+            documents = mmr_select(
+                query_vector,
+                rescored,
+                vectors[keep],
+                limit,
+                lambda_mult=settings.retrieval_mmr_lambda,
+            )
+            documents.sort(key=lambda item: item[1], reverse=True)
+            return documents
+        return rescored[:limit]
+
     async def add_to_vector_db(
         self, doc_id: str, documents: List[Document], collection_name: DocsCollection
     ) -> List[Document]:
@@ -252,66 +534,100 @@ class RAGService:
             self, doc_id: str, collection_name: DocsCollection
     ):
         vectordb_instance = QdrantDB(collection_name=collection_name)
-        vectordb_instance.delete_documents_by_doc_id(doc_id)
+        # Xoá Qdrant + huỷ cache (transaction SQLite) là I/O đồng bộ: chạy ngoài event loop
+        await asyncio.to_thread(vectordb_instance.delete_documents_by_doc_id, doc_id)
 
         return True
         
 
     async def clear_vectordb(self, collection_name: DocsCollection) -> bool:
         vectordb_instance = QdrantDB(collection_name=collection_name)
-        return vectordb_instance.delete_collection()
+        return await asyncio.to_thread(vectordb_instance.delete_collection)
+
+    async def export_snapshot(self, collection_name: DocsCollection, dtype: str = "float32") -> Dict:
+        return await asyncio.to_thread(snapshot.export_collection, collection_name, dtype)
+
+    async def import_snapshot(self, name: str, collection_name: Optional[DocsCollection] = None) -> Dict:
+        return await snapshot.import_snapshot(name, collection_name)
+
+    def list_snapshots(self) -> List[Dict]:
+        return snapshot.list_snapshots()
+
+    def start_embedding_migration(self, collection_name: DocsCollection, model: str, size: int) -> Dict:
+        return embedding_migration.start_embedding_migration(str(collection_name), model, size)
+
+    def get_embedding_migration(self, collection_name: DocsCollection) -> Dict:
+        return embedding_migration.migration_status(str(collection_name))
 
     def split_documents(
         self,
         documents: List[Document],
-        options: Dict[str, any] = {
-            "chunk_size": 120,
-            "chunk_overlap": 0,
-        },
+        options: Optional[Dict[str, any]] = None,
+        collection_name: DocsCollection = DocsCollection.RAG,
     ) -> List[Document]:
-        # Split document by priority level
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=options.get("chunk_size", 120),
-            chunk_overlap=options.get("chunk_overlap", 0),
-            separators=["\n\n", "\n", ". ", "! ", "? ", "+ ", "- ", " ", ""],
+        options = {**get_chunk_options(str(collection_name)), **(options or {})}
+        return list(iter_chunks(documents, options))
+
+    def get_text_splitter(self, options: Dict[str, any]) -> RecursiveCharacterTextSplitter:
+        # Split document by priority level (splitter được cache theo chunk_size / chunk_overlap)
+        return get_text_splitter(
+            options.get("chunk_size", get_settings().chunk_size),
+            options.get("chunk_overlap", get_settings().chunk_overlap),
         )
 
-        texts = text_splitter.split_documents(documents)
-        return texts
-
     async def generate_prompt(self, 
                               query: str, 
-                              collection: DocsCollection = DocsCollection.SEARCH
+                              collection: DocsCollection = DocsCollection.SEARCH,
+                              diversity: bool = None,
+                              chat_id: Optional[int] = None,
                               ) -> List[Dict[str, str]]:
         """
         Generate a prompt for the RAG model using the query and context documents.
 
         Args:
             query (str): The user's query.
+            diversity (bool): Re-rank context with MMR. Defaults to retrieval_diversity.
+            chat_id (int): Conversation id; reuses the conversation's cached
+                candidates for follow-up questions on the same topic.
 
         Returns:
             OllamaPrompt: The generated prompt.
         """
         # Lấy ngữ cảnh từ cơ sở dữ liệu Vector DB
-        context_documents = await self.query_document(
-            collection, query, k=5
-        )
+        settings = get_settings()
+        if diversity is None:
+            diversity = settings.retrieval_diversity
+        if chat_id is not None and settings.conversation_cache_enabled:
+            documents = await self.retrieve_for_conversation(
+                chat_id,
+                collection,
+                query,
+                k=5,
+                adaptive_k=settings.retrieval_adaptive_k,
+                diversity=diversity,
+            )
+            context_documents = transform_documents(documents)
+        else:
+            context_documents = await self.query_document(
+                collection,
+                query,
+                k=5,
+                adaptive_k=settings.retrieval_adaptive_k,
+                diversity=diversity,
+            )
 
         # Nếu không có tài liệu ngữ cảnh, trả về thông báo không có thông tin
         if not context_documents:
             context_documents = "Không có thông tin nào để trả lời câu hỏi này."
 
+        # System message cố định đứng đầu để prefix giống hệt nhau giữa các request
+        # (Ollama tái sử dụng được KV cache); phần thay đổi (tài liệu, câu hỏi) đặt sau
         prompt_messages = [
+            dict(role="system", content=RAG_SYSTEM_PROMPT),
             dict(
                 role="user",
-                content=f"""Bạn là một trợ lý AI có tên là a.Guide thuộc trường Đại học Bách Khoa Hà Nội. 
-                Nhiệm vụ của bạn là trả lời câu hỏi bằng tiếng việt dựa trên các tài liệu đã được cung cấp. 
-                Hãy trả lời câu hỏi một cách ngắn gọn, súc tích và rõ ràng, trích ra nguồn của tài liệu nếu có thể. 
-                Nếu câu hỏi không liên quan đến tài liệu, bạn có thể dùng kiến thức của mình để trả lời câu hỏi.
-                Nếu câu hỏi không rõ ràng hoặc không đầy đủ, hãy yêu cầu người dùng cung cấp thêm thông tin. 
-                Câu hỏi như sau: \n{query}""",
+                content=f"Tài liệu:\n{context_documents}\n\nCâu hỏi: {query}",
             ),
-            dict(role="user", content=f"Tài liệu:\n{context_documents}"),
         ]
 
         return prompt_messages
@@ -0,0 +1,458 @@
+# Cache hai tầng cho triển khai nhiều worker uvicorn trên cùng một node:
+# - L1: LRU trong process, mỗi worker một bản, đọc không tốn I/O
+# - L2: SQLite (WAL) dùng chung giữa các worker; mỗi lần ghi là một transaction
+#   nên worker khác không đọc phải giá trị ghi dở, worker mới khởi động dùng lại
+#   được dữ liệu các worker khác đã warm
+# Cả hai tầng cùng giao diện get / set / invalidate theo (namespace, key).
+#
+# Huỷ theo namespace (vd. collection vật lý khi ingest / xoá): tăng generation của
+# namespace trong L2. Dòng L2 ghi với generation cũ không còn được đọc; L1 của các
+# worker khác bị xoá khi chúng đồng bộ generation (tối đa shared_cache_sync_interval giây).
+#
+# Code async dùng aget / aset / ageneration / ainvalidate: L1 trả về ngay, đọc L2 chạy
+# trên thread pool, ghi L2 tuần tự trên một thread riêng.
+import asyncio
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+import orjson
+
+from app.models.document import Document
+from app.service.conversation_cache import get_conversation_cache
+from app.setting.config import get_settings
+
+MISSING = object()
+
+# Số lần ghi L2 giữa hai lần dọn dòng hết hạn / vượt giới hạn
+_PURGE_EVERY = 256
+
+# Định dạng giá trị L2 (không dùng pickle: ai ghi được file cache không chạy được code):
+# b"N" + độ dài header (4 byte) + header JSON {dtype, shape} + bytes thô của mảng numpy,
+# b"J" + JSON, trong đó Document / tuple được đánh dấu để đọc lại đúng kiểu
+_NDARRAY = b"N"
+_JSON = b"J"
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, Document):
+        return {"__document__": [value.page_content, _to_json(value.metadata)]}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_to_json(item) for item in value]}
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    return value
+
+
+def _from_json(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_from_json(item) for item in value]
+    if isinstance(value, dict):
+        if "__document__" in value:
+            page_content, metadata = value["__document__"]
+            return Document(page_content=page_content, metadata=_from_json(metadata))
+        if "__tuple__" in value:
+            return tuple(_from_json(item) for item in value["__tuple__"])
+        return {key: _from_json(item) for key, item in value.items()}
+    return value
+
+
+def encode_value(value: Any) -> bytes:
+    """Giá trị -> bytes cho L2 (TypeError nếu kiểu không hỗ trợ)"""
+    if isinstance(value, np.ndarray):
+        header = orjson.dumps({"dtype": value.dtype.str, "shape": value.shape})
+        return _NDARRAY + struct.pack(">I", len(header)) + header + np.ascontiguousarray(value).tobytes()
+    return _JSON + orjson.dumps(_to_json(value), option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def decode_value(raw: bytes) -> Any:
+    """Ngược của encode_value; dữ liệu không đúng định dạng: ValueError"""
+    raw = bytes(raw)
+    if raw[:1] == _NDARRAY:
+        (size,) = struct.unpack(">I", raw[1:5])
+        header = orjson.loads(raw[5:5 + size])
+        dtype = np.dtype(header["dtype"])
+        if dtype.hasobject:
+            raise ValueError("object dtype")
+        return np.frombuffer(raw[5 + size:], dtype=dtype).reshape(header["shape"]).copy()
+    if raw[:1] == _JSON:
+        return _from_json(orjson.loads(raw[1:]))
+    raise ValueError("unknown cache value format")
+
+
+class LRUCache:
+    """LRU + TTL trong process"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[(namespace, key)]
+                return MISSING
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[(namespace, key)] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str) -> None:
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[entry_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Cache dùng chung giữa các process qua một file SQLite.
+    Giá trị mã hoá bằng encode_value (JSON / bytes numpy); file chỉ chủ sở hữu đọc ghi
+    được (0600). Mỗi thread một connection (sqlite3 không chia sẻ connection
+    giữa các thread). Lỗi SQLite (vd. file bị khoá quá lâu) được coi như cache miss.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(path, 0o600)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, generation INTEGER NOT NULL,"
+                " value BLOB NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_generations ("
+                " namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        try:
+            row = self._connection().execute(
+                "SELECT e.value FROM cache_entries e"
+                " LEFT JOIN cache_generations g ON g.namespace = e.namespace"
+                " WHERE e.namespace = ? AND e.key = ? AND e.expires_at > ?"
+                " AND e.generation = COALESCE(g.generation, 0)",
+                (namespace, repr(key), time.time()),
+            ).fetchone()
+            return decode_value(row[0]) if row else MISSING
+        except (sqlite3.Error, ValueError, KeyError, TypeError, struct.error) as e:
+            print(f"[CACHE] L2 read failed: {e}")
+            return MISSING
+
+    def set(
+        self,
+        namespace: str,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        generation: int = 0,
+    ) -> None:
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, generation, value, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    namespace,
+                    repr(key),
+                    generation,
+                    encode_value(value),
+                    time.time() + (ttl or self.ttl),
+                ),
+            )
+            self._writes += 1
+            if self._writes % _PURGE_EVERY == 0:
+                self._purge(conn)
+        except (sqlite3.Error, TypeError) as e:
+            print(f"[CACHE] L2 write failed: {e}")
+
+    def _purge(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        # Vượt giới hạn: bỏ các dòng sắp hết hạn trước
+        conn.execute(
+            "DELETE FROM cache_entries WHERE rowid IN ("
+            " SELECT rowid FROM cache_entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def invalidate(self, namespace: str) -> int:
+        """Tăng generation của namespace và xoá các dòng của nó; trả về generation mới"""
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO cache_generations (namespace, generation) VALUES (?, 1)"
+                    " ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1",
+                    (namespace,),
+                )
+                conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+                generation = conn.execute(
+                    "SELECT generation FROM cache_generations WHERE namespace = ?", (namespace,)
+                ).fetchone()[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return generation
+        except sqlite3.Error as e:
+            print(f"[CACHE] L2 invalidate failed: {e}")
+            return -1
+
+    def generations(self) -> Dict[str, int]:
+        try:
+            return dict(
+                self._connection().execute(
+                    "SELECT namespace, generation FROM cache_generations"
+                ).fetchall()
+            )
+        except sqlite3.Error as e:
+            print(f"[CACHE] L2 read failed: {e}")
+            return {}
+
+    def clear(self) -> None:
+        try:
+            self._connection().execute("DELETE FROM cache_entries")
+        except sqlite3.Error as e:
+            print(f"[CACHE] L2 clear failed: {e}")
+
+
+class TieredCache:
+    """
+    L1 (LRUCache) trước L2 (SQLiteCache). Đọc: L1 -> L2 (chép lên L1) -> miss.
+    Ghi: cả hai tầng, dòng L2 mang generation của namespace mà worker đang biết,
+    nên giá trị tính trước một lần huỷ không sống sót qua lần huỷ đó
+    (truyền generation lấy lúc bắt đầu tính để cả L1 của chính worker cũng bỏ qua).
+    Bản async (aget / aset / ageneration / ainvalidate) không chạy SQLite trên event loop.
+    """
+
+    def __init__(self, l1: LRUCache, l2: Optional[SQLiteCache], sync_interval: float):
+        self.l1 = l1
+        self.l2 = l2
+        self.sync_interval = sync_interval
+        self._generations: Dict[str, int] = l2.generations() if l2 is not None else {}
+        self._synced_at = time.monotonic()
+        self._lock = threading.Lock()
+        # Ghi L2 tuần tự trên một thread riêng: không tranh khoá ghi SQLite trong process
+        self._writer = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-l2-writer")
+            if l2 is not None else None
+        )
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _sync_due(self) -> bool:
+        return self.l2 is not None and time.monotonic() - self._synced_at >= self.sync_interval
+
+    def _apply_generations(self, generations: Dict[str, int]) -> None:
+        """Nhận các lần huỷ do worker khác phát ra: bỏ L1 của namespace đổi generation"""
+        with self._lock:
+            for namespace, generation in generations.items():
+                if self._generations.get(namespace, 0) != generation:
+                    self.l1.invalidate(namespace)
+            self._generations = generations
+
+    def _sync(self) -> None:
+        if self._sync_due():
+            self._synced_at = time.monotonic()
+            self._apply_generations(self.l2.generations())
+
+    async def _async_sync(self) -> None:
+        if self._sync_due():
+            self._synced_at = time.monotonic()
+            self._apply_generations(await asyncio.to_thread(self.l2.generations))
+
+    def _l1_get(self, namespace: str, key: Hashable) -> Any:
+        value = self.l1.get(namespace, key)
+        if value is not MISSING:
+            self.l1_hits += 1
+        elif self.l2 is None:
+            self.misses += 1
+        return value
+
+    def _l2_result(self, namespace: str, key: Hashable, value: Any) -> Any:
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.l2_hits += 1
+            self.l1.set(namespace, key, value)
+        return value
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        self._sync()
+        value = self._l1_get(namespace, key)
+        if value is not MISSING or self.l2 is None:
+            return value
+        return self._l2_result(namespace, key, self.l2.get(namespace, key))
+
+    async def aget(self, namespace: str, key: Hashable) -> Any:
+        await self._async_sync()
+        value = self._l1_get(namespace, key)
+        if value is not MISSING or self.l2 is None:
+            return value
+        return self._l2_result(namespace, key, await asyncio.to_thread(self.l2.get, namespace, key))
+
+    def generation(self, namespace: str) -> int:
+        """Generation hiện tại của namespace; lấy trước khi tính giá trị để truyền cho set()"""
+        self._sync()
+        return self._generations.get(namespace, 0)
+
+    async def ageneration(self, namespace: str) -> int:
+        await self._async_sync()
+        return self._generations.get(namespace, 0)
+
+    def _l1_set(self, namespace, key, value, ttl, generation) -> Optional[int]:
+        """Ghi L1, trả về generation cho dòng L2 (None: namespace đã bị huỷ, bỏ qua)"""
+        current = self._generations.get(namespace, 0)
+        if generation is not None and generation != current:
+            return None
+        self.l1.set(namespace, key, value, ttl)
+        return current
+
+    def set(
+        self,
+        namespace: str,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        """generation: namespace đã bị huỷ kể từ lúc bắt đầu tính giá trị thì bỏ qua"""
+        current = self._l1_set(namespace, key, value, ttl, generation)
+        if current is not None and self.l2 is not None:
+            self.l2.set(namespace, key, value, ttl, generation=current)
+
+    async def aset(
+        self,
+        namespace: str,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        """Như set(); dòng L2 được xếp hàng cho thread ghi, không chờ ghi xong"""
+        current = self._l1_set(namespace, key, value, ttl, generation)
+        if current is not None and self.l2 is not None:
+            self._writer.submit(self.l2.set, namespace, key, value, ttl, current)
+
+    def _set_generation(self, namespace: str, generation: int) -> None:
+        if generation >= 0:
+            with self._lock:
+                self._generations[namespace] = generation
+
+    def invalidate(self, namespace: str) -> None:
+        self.invalidations += 1
+        self.l1.invalidate(namespace)
+        if self.l2 is not None:
+            self._set_generation(namespace, self.l2.invalidate(namespace))
+
+    async def ainvalidate(self, namespace: str) -> None:
+        self.invalidations += 1
+        self.l1.invalidate(namespace)
+        if self.l2 is not None:
+            # Cùng thread ghi với aset: dòng xếp hàng trước lần huỷ bị xoá theo
+            generation = await asyncio.get_running_loop().run_in_executor(
+                self._writer, self.l2.invalidate, namespace
+            )
+            self._set_generation(namespace, generation)
+
+    def clear(self) -> None:
+        self.l1.clear()
+        if self.l2 is not None:
+            self.l2.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "l1_entries": len(self.l1),
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "shared": self.l2 is not None,
+        }
+
+
+@lru_cache()
+def get_shared_cache() -> TieredCache:
+    settings = get_settings()
+    l2 = None
+    if settings.shared_cache_path:
+        l2 = SQLiteCache(
+            settings.shared_cache_path,
+            ttl=settings.shared_cache_ttl,
+            max_entries=settings.shared_cache_max_entries,
+        )
+    return TieredCache(
+        LRUCache(settings.shared_cache_l1_size, settings.shared_cache_ttl),
+        l2,
+        sync_interval=settings.shared_cache_sync_interval,
+    )
+
+
+def collection_namespace(collection_name: str) -> str:
+    """Namespace của kết quả truy xuất trên một collection vật lý"""
+    return f"collection:{collection_name}"
+
+
+def invalidate_collection(collection_name: str) -> None:
+    """
+    Phát lệnh huỷ kết quả truy xuất đã cache của collection tới mọi worker.
+    Chạy transaction SQLite đồng bộ: từ code async dùng ainvalidate_collection()
+    hoặc gọi hàm đồng bộ bao quanh qua asyncio.to_thread.
+    """
+    get_conversation_cache().invalidate_collection(collection_name)
+    if get_settings().shared_cache_enabled:
+        get_shared_cache().invalidate(collection_namespace(collection_name))
+
+
+async def ainvalidate_collection(collection_name: str) -> None:
+    """Như invalidate_collection(), dùng trong code async"""
+    get_conversation_cache().invalidate_collection(collection_name)
+    if get_settings().shared_cache_enabled:
+        await get_shared_cache().ainvalidate(collection_namespace(collection_name))
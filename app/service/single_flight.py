@@ -0,0 +1,58 @@
+import asyncio
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def normalize_query(query: str) -> str:
+    """Chuẩn hoá câu truy vấn để các câu hỏi giống nhau dùng chung một key"""
+    query = unicodedata.normalize("NFC", query or "")
+    return re.sub(r"\s+", " ", query).strip()
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi đồng thời có cùng key thành một lần thực thi duy nhất.
+    Mọi request chờ cùng key nhận chung kết quả (hoặc chung exception).
+    Công việc chạy trong một task riêng nên việc một client ngắt kết nối
+    không làm huỷ kết quả của các request khác đang chờ.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.executed_total = 0
+        self.coalesced_total = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced_total += 1
+        else:
+            self.executed_total += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Tránh cảnh báo "exception was never retrieved" khi mọi waiter đã huỷ
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "executed_total": self.executed_total,
+            "coalesced_total": self.coalesced_total,
+            "in_flight": self.in_flight(),
+        }
+
+
+@lru_cache()
+def get_retrieval_single_flight() -> SingleFlight:
+    return SingleFlight()
@@ -17,6 +17,74 @@ _DEFAULTS = {
     # "qdrant_url": "http://localhost:6333",
     # "ollama_timeout": 600,
     # "chromadb_persist_directory": "chroma_db"
+    "ollama_embed_concurrency": 4,
+    "ollama_generate_concurrency": 2,
+    "ollama_meta_concurrency": 8,
+    "ollama_max_queue": 32,
+    "ollama_retry_after": 2,
+    "spreadsheet_rows_per_chunk": 50,
+    "spreadsheet_max_chunk_chars": 2000,
+    "ingest_batch_size": 64,
+    "ollama_chat_model": "deepseek-r1:8b",
+    "ollama_keep_alive": "30m",
+    "ollama_num_ctx": 8192,
+    "ollama_warm_up": True,
+    "retrieval_score_threshold": 0.54,
+    "retrieval_adaptive_k": False,
+    "retrieval_max_k": 10,
+    "retrieval_score_cliff": 0.1,
+    "retrieval_token_budget": 1500,
+    "retrieval_diversity": False,
+    "retrieval_mmr_fetch_k": 20,
+    "retrieval_mmr_lambda": 0.5,
+    "dedup_mode": "off",
+    "dedup_threshold": 0.9,
+    "dedup_thresholds": {},
+    "snapshot_directory": "snapshots",
+    "snapshot_batch_size": 1024,
+    "snapshot_parallel": 4,
+    "embedding_model": "nomic-embed-text",
+    "embedding_size": 768,
+    "embedding_models": {},
+    "embedding_registry_path": "embedding_registry.json",
+    "embedding_migration_batch_size": 64,
+    "onnx_max_length": 512,
+    "onnx_threads": 0,
+    "vector_backend": "remote",
+    "qdrant_local_path": "qdrant_local",
+    "qdrant_transport": "rest",
+    "qdrant_grpc_port": 6334,
+    "qdrant_upsert_batch_size": 256,
+    "qdrant_upsert_parallel": 4,
+    "conversation_cache_enabled": True,
+    "conversation_cache_size": 1000,
+    "conversation_cache_ttl": 900,
+    "conversation_fetch_k": 20,
+    "conversation_topic_threshold": 0.6,
+    "profiling_enabled": False,
+    "profiling_interval_ms": 5,
+    "profiling_max_seconds": 300,
+    "profiling_directory": "profiles",
+    "profiling_max_files": 100,
+    "shared_cache_enabled": True,
+    "shared_cache_path": "shared_cache.sqlite3",
+    "shared_cache_l1_size": 1024,
+    "shared_cache_max_entries": 100000,
+    "shared_cache_ttl": 300,
+    "shared_cache_sync_interval": 1.0,
+    "chunk_strategy": "structure",
+    "chunk_size": 2000,
+    "chunk_overlap": 150,
+    "chunk_merge_sections": True,
+    "chunk_options": {},
+    "health_probe_interval": 5,
+    "health_probe_timeout": 2,
+    "health_embed_degraded_ms": 2000,
+    "response_compression": "gzip",
+    "response_compression_min_size": 1024,
+    "response_gzip_level": 6,
+    "response_brotli_quality": 4,
+    "query_snippet_chars": 300,
 }
 
 def _load_json_settings(path: str) -> dict:
@@ -28,6 +96,11 @@ def _load_json_settings(path: str) -> dict:
     except Exception:
         return {}
 
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
 class Settings:
     def __init__(self, data: dict):
         # Merge: defaults <- file <- environment variables
@@ -42,6 +115,94 @@ class Settings:
         merged["qdrant_url"] = os.getenv("QDRANT_URL", merged.get("qdrant_url"))
         merged["ollama_timeout"] = int(os.getenv("OLLAMA_TIMEOUT", merged.get("ollama_timeout")))
         merged["chromadb_persist_directory"] = os.getenv("CHROMADB_PERSIST_DIRECTORY", merged.get("chromadb_persist_directory"))
+        merged["ollama_embed_concurrency"] = int(os.getenv("OLLAMA_EMBED_CONCURRENCY", merged.get("ollama_embed_concurrency")))
+        merged["ollama_generate_concurrency"] = int(os.getenv("OLLAMA_GENERATE_CONCURRENCY", merged.get("ollama_generate_concurrency")))
+        merged["ollama_meta_concurrency"] = int(os.getenv("OLLAMA_META_CONCURRENCY", merged.get("ollama_meta_concurrency")))
+        merged["ollama_max_queue"] = int(os.getenv("OLLAMA_MAX_QUEUE", merged.get("ollama_max_queue")))
+        merged["ollama_retry_after"] = int(os.getenv("OLLAMA_RETRY_AFTER", merged.get("ollama_retry_after")))
+        merged["spreadsheet_rows_per_chunk"] = int(os.getenv("SPREADSHEET_ROWS_PER_CHUNK", merged.get("spreadsheet_rows_per_chunk")))
+        merged["spreadsheet_max_chunk_chars"] = int(os.getenv("SPREADSHEET_MAX_CHUNK_CHARS", merged.get("spreadsheet_max_chunk_chars")))
+        merged["ingest_batch_size"] = int(os.getenv("INGEST_BATCH_SIZE", merged.get("ingest_batch_size")))
+        merged["ollama_chat_model"] = os.getenv("OLLAMA_CHAT_MODEL", merged.get("ollama_chat_model"))
+        merged["ollama_keep_alive"] = os.getenv("OLLAMA_KEEP_ALIVE", merged.get("ollama_keep_alive"))
+        merged["ollama_num_ctx"] = int(os.getenv("OLLAMA_NUM_CTX", merged.get("ollama_num_ctx")))
+        merged["ollama_warm_up"] = _to_bool(os.getenv("OLLAMA_WARM_UP", merged.get("ollama_warm_up")))
+        merged["retrieval_score_threshold"] = float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", merged.get("retrieval_score_threshold")))
+        merged["retrieval_adaptive_k"] = _to_bool(os.getenv("RETRIEVAL_ADAPTIVE_K", merged.get("retrieval_adaptive_k")))
+        merged["retrieval_max_k"] = int(os.getenv("RETRIEVAL_MAX_K", merged.get("retrieval_max_k")))
+        merged["retrieval_score_cliff"] = float(os.getenv("RETRIEVAL_SCORE_CLIFF", merged.get("retrieval_score_cliff")))
+        merged["retrieval_token_budget"] = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", merged.get("retrieval_token_budget")))
+        merged["retrieval_diversity"] = _to_bool(os.getenv("RETRIEVAL_DIVERSITY", merged.get("retrieval_diversity")))
+        merged["retrieval_mmr_fetch_k"] = int(os.getenv("RETRIEVAL_MMR_FETCH_K", merged.get("retrieval_mmr_fetch_k")))
+        merged["retrieval_mmr_lambda"] = float(os.getenv("RETRIEVAL_MMR_LAMBDA", merged.get("retrieval_mmr_lambda")))
+        # dedup_mode: off | skip | link
+        merged["dedup_mode"] = os.getenv("DEDUP_MODE", merged.get("dedup_mode"))
+        merged["dedup_threshold"] = float(os.getenv("DEDUP_THRESHOLD", merged.get("dedup_threshold")))
+        # Ngưỡng riêng theo collection, ví dụ DEDUP_THRESHOLDS='{"rag_collection": 0.8}'
+        if os.getenv("DEDUP_THRESHOLDS"):
+            merged["dedup_thresholds"] = json.loads(os.getenv("DEDUP_THRESHOLDS"))
+        merged["snapshot_directory"] = os.getenv("SNAPSHOT_DIRECTORY", merged.get("snapshot_directory"))
+        merged["snapshot_batch_size"] = int(os.getenv("SNAPSHOT_BATCH_SIZE", merged.get("snapshot_batch_size")))
+        merged["snapshot_parallel"] = int(os.getenv("SNAPSHOT_PARALLEL", merged.get("snapshot_parallel")))
+        merged["embedding_model"] = os.getenv("EMBEDDING_MODEL", merged.get("embedding_model"))
+        merged["embedding_size"] = int(os.getenv("EMBEDDING_SIZE", merged.get("embedding_size")))
+        # Model riêng theo collection, ví dụ EMBEDDING_MODELS='{"search_collection": {"model": "all-minilm", "size": 384}}'
+        if os.getenv("EMBEDDING_MODELS"):
+            merged["embedding_models"] = json.loads(os.getenv("EMBEDDING_MODELS"))
+        merged["embedding_registry_path"] = os.getenv("EMBEDDING_REGISTRY_PATH", merged.get("embedding_registry_path"))
+        merged["embedding_migration_batch_size"] = int(os.getenv("EMBEDDING_MIGRATION_BATCH_SIZE", merged.get("embedding_migration_batch_size")))
+        merged["onnx_max_length"] = int(os.getenv("ONNX_MAX_LENGTH", merged.get("onnx_max_length")))
+        # 0: để ONNX Runtime tự chọn số thread
+        merged["onnx_threads"] = int(os.getenv("ONNX_THREADS", merged.get("onnx_threads")))
+        # vector_backend: remote (Qdrant server) | local (Qdrant nhúng, lưu ở qdrant_local_path)
+        merged["vector_backend"] = os.getenv("VECTOR_BACKEND", merged.get("vector_backend"))
+        merged["qdrant_local_path"] = os.getenv("QDRANT_LOCAL_PATH", merged.get("qdrant_local_path"))
+        # qdrant_transport: rest | grpc (search / upsert qua cổng gRPC, REST vẫn dùng cho health check)
+        merged["qdrant_transport"] = os.getenv("QDRANT_TRANSPORT", merged.get("qdrant_transport"))
+        merged["qdrant_grpc_port"] = int(os.getenv("QDRANT_GRPC_PORT", merged.get("qdrant_grpc_port")))
+        merged["qdrant_upsert_batch_size"] = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", merged.get("qdrant_upsert_batch_size")))
+        merged["qdrant_upsert_parallel"] = int(os.getenv("QDRANT_UPSERT_PARALLEL", merged.get("qdrant_upsert_parallel")))
+        merged["conversation_cache_enabled"] = _to_bool(os.getenv("CONVERSATION_CACHE_ENABLED", merged.get("conversation_cache_enabled")))
+        merged["conversation_cache_size"] = int(os.getenv("CONVERSATION_CACHE_SIZE", merged.get("conversation_cache_size")))
+        merged["conversation_cache_ttl"] = int(os.getenv("CONVERSATION_CACHE_TTL", merged.get("conversation_cache_ttl")))
+        merged["conversation_fetch_k"] = int(os.getenv("CONVERSATION_FETCH_K", merged.get("conversation_fetch_k")))
+        # Cosine giữa câu hỏi mới và câu hỏi đã lấy ứng viên; thấp hơn ngưỡng là đổi chủ đề
+        merged["conversation_topic_threshold"] = float(os.getenv("CONVERSATION_TOPIC_THRESHOLD", merged.get("conversation_topic_threshold")))
+        # Cho phép profile theo request (header X-Profile / query ?profile=1)
+        merged["profiling_enabled"] = _to_bool(os.getenv("PROFILING_ENABLED", merged.get("profiling_enabled")))
+        merged["profiling_interval_ms"] = float(os.getenv("PROFILING_INTERVAL_MS", merged.get("profiling_interval_ms")))
+        merged["profiling_max_seconds"] = int(os.getenv("PROFILING_MAX_SECONDS", merged.get("profiling_max_seconds")))
+        merged["profiling_directory"] = os.getenv("PROFILING_DIRECTORY", merged.get("profiling_directory"))
+        # Giữ tối đa chừng này file profile, xoá file cũ nhất khi ghi file mới
+        merged["profiling_max_files"] = int(os.getenv("PROFILING_MAX_FILES", merged.get("profiling_max_files")))
+        # Cache embedding câu truy vấn / kết quả truy xuất / danh sách model:
+        # L1 trong process + L2 SQLite dùng chung giữa các worker (shared_cache_path rỗng: chỉ L1)
+        merged["shared_cache_enabled"] = _to_bool(os.getenv("SHARED_CACHE_ENABLED", merged.get("shared_cache_enabled")))
+        merged["shared_cache_path"] = os.getenv("SHARED_CACHE_PATH", merged.get("shared_cache_path"))
+        merged["shared_cache_l1_size"] = int(os.getenv("SHARED_CACHE_L1_SIZE", merged.get("shared_cache_l1_size")))
+        merged["shared_cache_max_entries"] = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", merged.get("shared_cache_max_entries")))
+        merged["shared_cache_ttl"] = int(os.getenv("SHARED_CACHE_TTL", merged.get("shared_cache_ttl")))
+        # Độ trễ tối đa để một worker nhận lệnh huỷ cache do worker khác phát ra
+        merged["shared_cache_sync_interval"] = float(os.getenv("SHARED_CACHE_SYNC_INTERVAL", merged.get("shared_cache_sync_interval")))
+        # chunk_strategy: structure (theo Chương / Điều / Khoản, heading) | recursive (theo số ký tự)
+        merged["chunk_strategy"] = os.getenv("CHUNK_STRATEGY", merged.get("chunk_strategy"))
+        merged["chunk_size"] = int(os.getenv("CHUNK_SIZE", merged.get("chunk_size")))
+        merged["chunk_overlap"] = int(os.getenv("CHUNK_OVERLAP", merged.get("chunk_overlap")))
+        # Gộp các Điều liền nhau trong cùng Chương tới chunk_size (chỉ với strategy structure)
+        merged["chunk_merge_sections"] = _to_bool(os.getenv("CHUNK_MERGE_SECTIONS", merged.get("chunk_merge_sections")))
+        # Tuỳ chọn riêng theo collection, ví dụ CHUNK_OPTIONS='{"search_collection": {"chunk_size": 800}}'
+        if os.getenv("CHUNK_OPTIONS"):
+            merged["chunk_options"] = json.loads(os.getenv("CHUNK_OPTIONS"))
+        # Task nền kiểm tra Ollama / Qdrant / embed cho /api/health/ready
+        merged["health_probe_interval"] = float(os.getenv("HEALTH_PROBE_INTERVAL", merged.get("health_probe_interval")))
+        merged["health_probe_timeout"] = float(os.getenv("HEALTH_PROBE_TIMEOUT", merged.get("health_probe_timeout")))
+        merged["health_embed_degraded_ms"] = float(os.getenv("HEALTH_EMBED_DEGRADED_MS", merged.get("health_embed_degraded_ms")))
+        # Nén response: gzip | br (cần brotli-asgi, client không hỗ trợ br vẫn nhận gzip) | none
+        merged["response_compression"] = os.getenv("RESPONSE_COMPRESSION", merged.get("response_compression"))
+        merged["response_compression_min_size"] = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", merged.get("response_compression_min_size")))
+        merged["response_gzip_level"] = int(os.getenv("RESPONSE_GZIP_LEVEL", merged.get("response_gzip_level")))
+        merged["response_brotli_quality"] = int(os.getenv("RESPONSE_BROTLI_QUALITY", merged.get("response_brotli_quality")))
+        merged["query_snippet_chars"] = int(os.getenv("QUERY_SNIPPET_CHARS", merged.get("query_snippet_chars")))
 
         self.app_name: str = merged["app_name"]
         self.author: str = merged["author"]
@@ -51,6 +212,74 @@ class Settings:
         self.qdrant_url: str = merged["qdrant_url"]
         self.ollama_timeout: int = merged["ollama_timeout"]
         self.chromadb_persist_directory: str = merged["chromadb_persist_directory"]
+        self.ollama_embed_concurrency: int = merged["ollama_embed_concurrency"]
+        self.ollama_generate_concurrency: int = merged["ollama_generate_concurrency"]
+        self.ollama_meta_concurrency: int = merged["ollama_meta_concurrency"]
+        self.ollama_max_queue: int = merged["ollama_max_queue"]
+        self.ollama_retry_after: int = merged["ollama_retry_after"]
+        self.spreadsheet_rows_per_chunk: int = merged["spreadsheet_rows_per_chunk"]
+        self.spreadsheet_max_chunk_chars: int = merged["spreadsheet_max_chunk_chars"]
+        self.ingest_batch_size: int = merged["ingest_batch_size"]
+        self.ollama_chat_model: str = merged["ollama_chat_model"]
+        self.ollama_keep_alive: str = merged["ollama_keep_alive"]
+        self.ollama_num_ctx: int = merged["ollama_num_ctx"]
+        self.ollama_warm_up: bool = merged["ollama_warm_up"]
+        self.retrieval_score_threshold: float = merged["retrieval_score_threshold"]
+        self.retrieval_adaptive_k: bool = merged["retrieval_adaptive_k"]
+        self.retrieval_max_k: int = merged["retrieval_max_k"]
+        self.retrieval_score_cliff: float = merged["retrieval_score_cliff"]
+        self.retrieval_token_budget: int = merged["retrieval_token_budget"]
+        self.retrieval_diversity: bool = merged["retrieval_diversity"]
+        self.retrieval_mmr_fetch_k: int = merged["retrieval_mmr_fetch_k"]
+        self.retrieval_mmr_lambda: float = merged["retrieval_mmr_lambda"]
+        self.dedup_mode: str = merged["dedup_mode"]
+        self.dedup_threshold: float = merged["dedup_threshold"]
+        self.dedup_thresholds: dict = merged["dedup_thresholds"] or {}
+        self.snapshot_directory: str = merged["snapshot_directory"]
+        self.snapshot_batch_size: int = merged["snapshot_batch_size"]
+        self.snapshot_parallel: int = merged["snapshot_parallel"]
+        self.embedding_model: str = merged["embedding_model"]
+        self.embedding_size: int = merged["embedding_size"]
+        self.embedding_models: dict = merged["embedding_models"] or {}
+        self.embedding_registry_path: str = merged["embedding_registry_path"]
+        self.embedding_migration_batch_size: int = merged["embedding_migration_batch_size"]
+        self.onnx_max_length: int = merged["onnx_max_length"]
+        self.onnx_threads: int = merged["onnx_threads"]
+        self.vector_backend: str = merged["vector_backend"]
+        self.qdrant_local_path: str = merged["qdrant_local_path"]
+        self.qdrant_transport: str = merged["qdrant_transport"]
+        self.qdrant_grpc_port: int = merged["qdrant_grpc_port"]
+        self.qdrant_upsert_batch_size: int = merged["qdrant_upsert_batch_size"]
+        self.qdrant_upsert_parallel: int = merged["qdrant_upsert_parallel"]
+        self.conversation_cache_enabled: bool = merged["conversation_cache_enabled"]
+        self.conversation_cache_size: int = merged["conversation_cache_size"]
+        self.conversation_cache_ttl: int = merged["conversation_cache_ttl"]
+        self.conversation_fetch_k: int = merged["conversation_fetch_k"]
+        self.conversation_topic_threshold: float = merged["conversation_topic_threshold"]
+        self.profiling_enabled: bool = merged["profiling_enabled"]
+        self.profiling_interval_ms: float = merged["profiling_interval_ms"]
+        self.profiling_max_seconds: int = merged["profiling_max_seconds"]
+        self.profiling_directory: str = merged["profiling_directory"]
+        self.profiling_max_files: int = merged["profiling_max_files"]
+        self.shared_cache_enabled: bool = merged["shared_cache_enabled"]
+        self.shared_cache_path: str = merged["shared_cache_path"]
+        self.shared_cache_l1_size: int = merged["shared_cache_l1_size"]
+        self.shared_cache_max_entries: int = merged["shared_cache_max_entries"]
+        self.shared_cache_ttl: int = merged["shared_cache_ttl"]
+        self.shared_cache_sync_interval: float = merged["shared_cache_sync_interval"]
+        self.chunk_strategy: str = merged["chunk_strategy"]
+        self.chunk_size: int = merged["chunk_size"]
+        self.chunk_overlap: int = merged["chunk_overlap"]
+        self.chunk_merge_sections: bool = merged["chunk_merge_sections"]
+        self.chunk_options: dict = merged["chunk_options"] or {}
+        self.health_probe_interval: float = merged["health_probe_interval"]
+        self.health_probe_timeout: float = merged["health_probe_timeout"]
+        self.health_embed_degraded_ms: float = merged["health_embed_degraded_ms"]
+        self.response_compression: str = merged["response_compression"]
+        self.response_compression_min_size: int = merged["response_compression_min_size"]
+        self.response_gzip_level: int = merged["response_gzip_level"]
+        self.response_brotli_quality: int = merged["response_brotli_quality"]
+        self.query_snippet_chars: int = merged["query_snippet_chars"]
 
 @lru_cache()
 def get_settings():
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 
 class StrEnum(str, Enum):
@@ -15,4 +15,14 @@ class Method(StrEnum):
 
 class DocsCollection(StrEnum):
     RAG = "rag_collection"
-    SEARCH = "search_collection"
\ No newline at end of file
+    SEARCH = "search_collection"
+
+class OllamaLane(StrEnum):
+    EMBED = "embed"
+    GENERATE = "generate"
+    META = "meta"
+
+class RequestPriority(IntEnum):
+    # Giá trị nhỏ hơn được phục vụ trước
+    INTERACTIVE = 0
+    INGEST = 1
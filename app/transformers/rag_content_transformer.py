@@ -3,12 +3,14 @@ from typing import List, Dict, Any
 from app.transformers.rag_file_transformer import transform_documents
 
 
-def transform_to_content(documents: List[Any]) -> str:
+def transform_to_content(documents: List[Any], min_score: float = None) -> str:
     """
     Transform the context documents into a string format suitable for model input.
 
     Args:
         documents (List[Any]): List of documents to transform.
+        min_score (float): Optional score filter. Retrieval already applies
+            the score threshold in Qdrant, so this is normally left unset.
 
     Returns:
         str: Transformed string representation of the documents.
@@ -19,13 +21,16 @@ def transform_to_content(documents: List[Any]) -> str:
     for doc in transformed_docs:
         write_source = False
         for idx, match in enumerate(doc["matches"]):
-            if match.get("score", 0) < 0.54:
+            if min_score is not None and match.get("score", 0) < min_score:
                 continue
             if write_source == False:
                 context_string += f"Nguồn tài liệu: {doc['source']}\n"
                 context_string += f"Tiêu đề: {doc['metadata']['title']}\n"
                 context_string += "Nội dung tài liệu:\n"
                 write_source = True
+            # Đường dẫn Chương / Điều của chunk (chunker theo cấu trúc)
+            if match.get("section"):
+                context_string += f"[{match['section']}] "
             context_string += f"{match['page_content']} \n"
 
         context_string += "\n"
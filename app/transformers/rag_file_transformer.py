@@ -15,13 +15,47 @@ class Document(BaseModel):
     page_content: str
     type: str
 
+# Các trường payload mà transformer sử dụng, dùng để giới hạn dữ liệu lấy từ Qdrant
+PAYLOAD_FIELDS = [
+    "page_content",
+    "metadata.source",
+    "metadata.total_pages",
+    "metadata.creationdate",
+    "metadata.title",
+    "metadata.author",
+    "metadata.page",
+    "metadata.chunk_index",
+    "metadata.section",
+]
+
 class TransformedDocument(BaseModel):
     source: str
     metadata: Metadata
     matches: List[Dict[str, Any]]
 
-def transform_documents(documents: List[Any]) -> List[TransformedDocument]:
+# Trường trả về của /rag/query (tham số fields)
+FIELDS_FULL = "full"        # nhóm theo source, page_content đầy đủ
+FIELDS_SNIPPET = "snippet"  # như full nhưng page_content cắt còn snippet_chars ký tự
+FIELDS_IDS = "ids"          # danh sách phẳng (id, score) theo thứ hạng
+
+def make_snippet(text: str, snippet_chars: int) -> str:
+    if len(text) <= snippet_chars:
+        return text
+    return text[:snippet_chars].rstrip() + "…"
+
+def transform_documents(
+    documents: List[Any],
+    fields: str = FIELDS_FULL,
+    snippet_chars: int = 300,
+) -> List[TransformedDocument]:
+    if fields == FIELDS_IDS:
+        return [
+            {"id": doc.metadata.get("_id"), "score": score}
+            for doc, score in documents
+        ]
+
     response_documents = []
+    index_by_source = {}
     # Duyệt qua danh sách tài liệu và nhóm theo source
     for raw_doc in documents:
         doc = raw_doc[0]
@@ -29,37 +63,31 @@ def transform_documents(documents: List[Any]) -> List[TransformedDocument]:
 
         metadata = doc.metadata
         source = metadata.get("source", "unknown_source")
+        page_content = doc.page_content
+        if fields == FIELDS_SNIPPET:
+            page_content = make_snippet(page_content, snippet_chars)
 
-        new_metadata = {
-            "source": source,
-            "total_pages": metadata.get("total_pages", 0),
-            "creationdate": metadata.get("creationdate", ""),
-            "title": metadata.get("title", "Untitled"),
-            "author": metadata.get("author", "Unknown Author"),
+        match = {
+            "page_content": page_content,
+            "score": score,
+            "page": metadata.get("page", 0),
+            "section": metadata.get("section"),
         }
 
-        existing_match_index = None
-        for index, match in enumerate(response_documents):
-            match_metadata = match.get('metadata', {})
-            if match_metadata.get('source') == source:
-                existing_match_index = index
-                break
-
-        if existing_match_index is not None:
-            response_documents[existing_match_index]['matches'].append({
-                "page_content": doc.page_content,
-                "score": score,
-                "page": metadata.get("page", 0),
-            })
+        if source in index_by_source:
+            response_documents[index_by_source[source]]['matches'].append(match)
         else:
+            index_by_source[source] = len(response_documents)
             response_documents.append({
                 "source": source,
-                "metadata": new_metadata,
-                "matches": [{
-                    "page_content": doc.page_content,
-                    "score": score,
-                    "page": metadata.get("page", 0),
-                }]
+                "metadata": {
+                    "source": source,
+                    "total_pages": metadata.get("total_pages", 0),
+                    "creationdate": metadata.get("creationdate", ""),
+                    "title": metadata.get("title", "Untitled"),
+                    "author": metadata.get("author", "Unknown Author"),
+                },
+                "matches": [match]
             })
         
     return response_documents
@@ -0,0 +1,204 @@
+# So sánh chunker cũ (RecursiveCharacterTextSplitter 2000/150 theo từng trang + chunk tên file)
+# với chunker theo cấu trúc (Chương / Điều / Khoản) trên bộ tài liệu thật hoặc văn bản mẫu.
+#
+#   python benchmarks/bench_chunking.py --corpus ./docs/quy-che ./docs/thong-bao.pdf
+#   python benchmarks/bench_chunking.py --articles 200 --chunk-size 1500
+#
+# Số liệu: số chunk (= số lần embed / số point), tổng ký tự và token ước lượng được embed
+# (chi phí embed, kích thước payload), độ dài chunk trung bình, thời gian chia và thời gian
+# embed bằng HashingEmbeddingProvider (768 chiều) để không phụ thuộc Ollama, và tỉ lệ mục
+# (Điều / heading) nằm trọn trong một chunk - cái giá của việc không cắt ngang mục là
+# chunk kém đầy hơn khi chunk_size nhỏ hơn độ dài một Điều cộng Điều kế tiếp.
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SHARED_CACHE_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.loaders.registry import iter_document, supported_extensions  # noqa: E402
+from app.models.document import Document  # noqa: E402
+from app.rag.chunking import STRATEGY_STRUCTURE, get_text_splitter, heading_level, iter_chunks  # noqa: E402
+from app.rag.embeddings import HashingEmbeddingProvider  # noqa: E402
+from app.rag.retrieval import estimate_tokens  # noqa: E402
+from app.service.rag_service import RAGService  # noqa: E402
+
+CLAUSES = [
+    "Sinh viên phải đăng ký học phần trong thời hạn do Phòng Đào tạo thông báo trên hệ thống.",
+    "Học phí được tính theo số tín chỉ đăng ký và nộp trước ngày bắt đầu học kỳ theo quy định.",
+    "Sinh viên không hoàn thành nghĩa vụ học phí sẽ bị tạm dừng đăng ký học phần của học kỳ sau.",
+    "Điểm rèn luyện được đánh giá vào cuối mỗi học kỳ và được sử dụng để xét học bổng khuyến khích.",
+]
+
+
+def sample_corpus(articles: int, page_chars: int):
+    """Văn bản quy chế mẫu: Chương / Điều / Khoản, cắt trang theo số ký tự (Điều tràn sang trang sau)"""
+    lines = ["QUY CHẾ ĐÀO TẠO", "Ban hành kèm theo Quyết định của Hiệu trưởng"]
+    for article in range(1, articles + 1):
+        if article % 10 == 1:
+            lines += [f"Chương {article // 10 + 1}", "QUY ĐỊNH VỀ ĐÀO TẠO VÀ HỌC PHÍ"]
+        lines.append(f"Điều {article}. Quy định số {article} về tổ chức đào tạo")
+        for clause in range(1, 2 + article % 5):
+            lines.append(f"{clause}. " + " ".join(CLAUSES[(article + clause + i) % len(CLAUSES)] for i in range(2)))
+        if article % 7 == 0:
+            lines += ["Mức | Số tín chỉ | Học phí", "1 | 15 | 7.500.000", "2 | 18 | 9.000.000"]
+
+    pages, buffer = [], []
+    for line in lines:
+        buffer.append(line)
+        if sum(len(text) + 1 for text in buffer) >= page_chars:
+            pages.append(buffer)
+            buffer = []
+    if buffer:
+        pages.append(buffer)
+    return [
+        Document(page_content="\n".join(page), metadata={"source": "quy_che_mau.pdf", "page": index})
+        for index, page in enumerate(pages)
+    ]
+
+
+def corpus_files(paths):
+    extensions = set(supported_extensions())
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if os.path.splitext(name)[1].lower() in extensions:
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def legacy_chunks(pages, chunk_size: int, chunk_overlap: int):
+    """Hành vi cũ: chia từng trang độc lập + một chunk chỉ chứa tên file"""
+    splitter = get_text_splitter(chunk_size, chunk_overlap)
+    first = True
+    for page in pages:
+        for chunk in splitter.split_documents([page]):
+            if first:
+                first = False
+                name = os.path.basename(page.metadata.get("source", "")) or "Untitled"
+                yield Document(page_content="Tên file: " + name, metadata=dict(page.metadata))
+            yield chunk
+
+
+def sections(pages):
+    """Nội dung từng mục (từ dòng tiêu đề tới tiêu đề kế tiếp), mục có thể trải nhiều trang"""
+    current = []
+    for page in pages:
+        for line in page.page_content.splitlines():
+            line = line.strip()
+            if line and heading_level(line) is not None:
+                if len(current) > 1:
+                    yield "\n".join(current)
+                current = []
+            if line:
+                current.append(line)
+    if len(current) > 1:
+        yield "\n".join(current)
+
+
+def intact_ratio(pages, raw_chunks) -> float:
+    """Tỉ lệ mục nằm trọn trong một chunk (so trên chunk trước khi làm sạch)"""
+    flattened = ["\n".join(line.strip() for line in chunk.splitlines() if line.strip()) for chunk in raw_chunks]
+    found = [any(section in chunk for chunk in flattened) for section in sections(pages)]
+    return round(sum(found) / len(found), 3) if found else 1.0
+
+
+def run(name, documents_by_file, make_chunks, service, provider) -> dict:
+    texts = []
+    intact = []
+    split_seconds = 0.0
+    for pages in documents_by_file:
+        raw_chunks = []
+        started_at = time.perf_counter()
+        for chunk in make_chunks(pages):
+            raw_chunks.append(chunk.page_content)
+            if chunk.page_content.startswith("Tên file"):
+                # Chunk tên file trước đây được giữ nguyên, không qua bộ lọc
+                texts.append(chunk.page_content)
+                continue
+            cleaned = service.clean_document(chunk)
+            if cleaned is not None:
+                texts.append(cleaned.page_content)
+        split_seconds += time.perf_counter() - started_at
+        intact.append(intact_ratio(pages, raw_chunks))
+
+    started_at = time.perf_counter()
+    provider.embed(texts)
+    embed_seconds = time.perf_counter() - started_at
+    lengths = [len(text) for text in texts] or [0]
+    return {
+        "strategy": name,
+        "chunks": len(texts),
+        "chars": sum(lengths),
+        "tokens_est": sum(estimate_tokens(text) for text in texts),
+        "avg_chars": round(statistics.mean(lengths)),
+        "min_chars": min(lengths),
+        "sections_intact": round(statistics.mean(intact), 3) if intact else 1.0,
+        "split_ms": round(split_seconds * 1000, 1),
+        "embed_ms": round(embed_seconds * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", nargs="*", default=[], help="thư mục / file tài liệu")
+    parser.add_argument("--articles", type=int, default=120, help="số Điều của văn bản mẫu")
+    parser.add_argument("--page-chars", type=int, default=3000, help="số ký tự mỗi trang của văn bản mẫu")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--no-merge-sections", action="store_true", help="mỗi Điều một chunk")
+    args = parser.parse_args()
+
+    if args.corpus:
+        documents_by_file = [
+            [Document(page_content=page.page_content.strip(), metadata=dict(page.metadata)) for page in iter_document(path)]
+            for path in corpus_files(args.corpus)
+        ]
+    else:
+        documents_by_file = [sample_corpus(args.articles, args.page_chars)]
+
+    service = RAGService()
+    provider = HashingEmbeddingProvider(768)
+    options = {
+        "strategy": STRATEGY_STRUCTURE,
+        "chunk_size": args.chunk_size,
+        "chunk_overlap": args.chunk_overlap,
+        "merge_sections": not args.no_merge_sections,
+    }
+
+    def copies(pages):
+        # clean_document sửa chunk tại chỗ: mỗi lần chạy dùng bản sao của trang
+        return [Document(page_content=p.page_content, metadata=dict(p.metadata)) for p in pages]
+
+    results = [
+        run(
+            "legacy",
+            documents_by_file,
+            lambda pages: legacy_chunks(copies(pages), args.chunk_size, args.chunk_overlap),
+            service,
+            provider,
+        ),
+        run(
+            "structure",
+            documents_by_file,
+            lambda pages: iter_chunks(copies(pages), options),
+            service,
+            provider,
+        ),
+    ]
+    legacy, structure = results
+    print(json.dumps({
+        "files": len(documents_by_file),
+        "results": results,
+        "chunk_reduction": round(1 - structure["chunks"] / max(legacy["chunks"], 1), 3),
+        "token_reduction": round(1 - structure["tokens_est"] / max(legacy["tokens_est"], 1), 3),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
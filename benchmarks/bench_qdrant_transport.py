@@ -0,0 +1,158 @@
+# So sánh REST và gRPC của Qdrant server: độ trễ truy vấn và thông lượng upsert.
+#
+#   python benchmarks/bench_qdrant_transport.py --qdrant-url http://localhost:6333 --grpc-port 6334
+#   python benchmarks/bench_qdrant_transport.py --dims 768 384 --points 20000 --parallel 4
+#
+# Upsert đo hai chế độ:
+# - sync: từng batch wait=True nối tiếp (cách ghi cũ)
+# - bulk: các batch wait=False song song, barrier wait=True ở cuối (như QdrantDB.upsert_points
+#   + flush_writes); thời gian tính tới khi barrier trả về
+# Vector sinh bằng HashingEmbeddingProvider theo số chiều của model đang dùng
+# (nomic-embed-text 768, all-minilm 384) để không phụ thuộc Ollama.
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    Distance,
+    Filter,
+    HasIdCondition,
+    PointStruct,
+    VectorParams,
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.rag.embeddings import HashingEmbeddingProvider  # noqa: E402
+from app.transformers.rag_file_transformer import PAYLOAD_FIELDS  # noqa: E402
+
+COLLECTION = "bench_qdrant_transport"
+WORDS = (
+    "sinh viên học phí học bổng điểm rèn luyện tốt nghiệp đăng ký học phần lịch thi "
+    "quy chế đào tạo tín chỉ ký túc xá thư viện phòng đào tạo thông báo hạn nộp"
+).split()
+
+
+def make_text(index: int) -> str:
+    return " ".join(WORDS[(index * 7 + step * 3) % len(WORDS)] for step in range(60))
+
+
+def make_points(provider: HashingEmbeddingProvider, size: int):
+    texts = [make_text(i) for i in range(size)]
+    vectors = provider.embed(texts)
+    return [
+        PointStruct(
+            id=str(uuid4()),
+            vector=vector.tolist(),
+            payload={
+                "page_content": text,
+                "metadata": {"source": f"doc_{i // 100}.pdf", "page": 0, "chunk_index": i},
+            },
+        )
+        for i, (text, vector) in enumerate(zip(texts, vectors))
+    ]
+
+
+def reset(client: QdrantClient, dim: int):
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(
+        COLLECTION, vectors_config=VectorParams(size=dim, distance=Distance.COSINE)
+    )
+
+
+def upsert_sync(client: QdrantClient, points, batch_size: int) -> float:
+    started_at = time.perf_counter()
+    for start in range(0, len(points), batch_size):
+        client.upsert(COLLECTION, points=points[start:start + batch_size], wait=True)
+    return time.perf_counter() - started_at
+
+
+def upsert_bulk(client: QdrantClient, points, batch_size: int, parallel: int) -> float:
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        list(executor.map(
+            lambda start: client.upsert(
+                COLLECTION, points=points[start:start + batch_size], wait=False
+            ),
+            range(0, len(points), batch_size),
+        ))
+    client.set_payload(
+        COLLECTION,
+        payload={},
+        points=Filter(must=[HasIdCondition(has_id=[points[-1].id])]),
+        wait=True,
+    )
+    return time.perf_counter() - started_at
+
+
+def measure_search(client: QdrantClient, provider: HashingEmbeddingProvider, queries: int, top_k: int) -> dict:
+    latencies = []
+    for index in range(queries):
+        vector = provider.embed([make_text(index * 13 + 5)])[0].tolist()
+        started_at = time.perf_counter()
+        client.query_points(
+            collection_name=COLLECTION,
+            query=vector,
+            limit=top_k,
+            score_threshold=0.3,
+            with_payload=PAYLOAD_FIELDS,
+        )
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    latencies.sort()
+    return {
+        "search_p50_ms": round(statistics.median(latencies), 2),
+        "search_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--qdrant-url", default="http://localhost:6333")
+    parser.add_argument("--grpc-port", type=int, default=6334)
+    parser.add_argument("--dims", type=int, nargs="+", default=[768, 384])
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    transports = {
+        "rest": QdrantClient(url=args.qdrant_url),
+        "grpc": QdrantClient(url=args.qdrant_url, prefer_grpc=True, grpc_port=args.grpc_port),
+    }
+
+    results = {}
+    try:
+        for dim in args.dims:
+            provider = HashingEmbeddingProvider(dim)
+            points = make_points(provider, args.points)
+            results[dim] = {}
+            for name, client in transports.items():
+                reset(client, dim)
+                sync_seconds = upsert_sync(client, points, args.batch_size)
+                reset(client, dim)
+                bulk_seconds = upsert_bulk(client, points, args.batch_size, args.parallel)
+                results[dim][name] = {
+                    "upsert_sync_points_per_s": round(len(points) / sync_seconds),
+                    "upsert_bulk_points_per_s": round(len(points) / bulk_seconds),
+                    **measure_search(client, provider, args.queries, args.top_k),
+                }
+                client.delete_collection(COLLECTION)
+            print(json.dumps({dim: results[dim]}), flush=True)
+    finally:
+        for client in transports.values():
+            client.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
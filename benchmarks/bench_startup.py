@@ -0,0 +1,82 @@
+# Đo thời gian import và bộ nhớ khi khởi động worker.
+#
+#   python benchmarks/bench_startup.py [--runs 5]
+#
+# So sánh:
+#   - lazy : import app.main như hiện tại (loader chỉ nạp khi có upload)
+#   - eager: import app.main rồi nạp toàn bộ thư viện parse, tương đương
+#            hành vi cũ khi rag_service import chúng ở đầu module
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PARSER_MODULES = [
+    "fitz",
+    "PIL.Image",
+    "pytesseract",
+    "pdfminer.high_level",
+    "langchain_community.document_loaders.pdf",
+    "langchain_community.document_loaders.word_document",
+    "langchain_community.document_loaders.excel",
+    "langchain_community.document_loaders.html",
+]
+
+_PROBE = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+import app.main
+if {eager}:
+    for name in {modules!r}:
+        importlib.import_module(name)
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+loaded = [m for m in {modules!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": rss_kb, "parser_modules_loaded": loaded}}))
+"""
+
+
+def run_probe(eager: bool) -> dict:
+    code = _PROBE.format(eager=eager, modules=PARSER_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    # Dòng cuối là kết quả, các dòng trước là log khi load settings
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples: list) -> dict:
+    seconds = [s["seconds"] for s in samples]
+    rss = [s["max_rss_kb"] for s in samples]
+    return {
+        "import_seconds_median": round(statistics.median(seconds), 3),
+        "max_rss_mb_median": round(statistics.median(rss) / 1024, 1),
+        "parser_modules_loaded": samples[-1]["parser_modules_loaded"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for mode, eager in (("lazy", False), ("eager", True)):
+        results[mode] = summarize([run_probe(eager) for _ in range(args.runs)])
+
+    print(json.dumps(results, indent=2))
+    saved = results["eager"]["import_seconds_median"] - results["lazy"]["import_seconds_median"]
+    saved_mb = results["eager"]["max_rss_mb_median"] - results["lazy"]["max_rss_mb_median"]
+    print(f"Startup saving: {saved:.3f}s, {saved_mb:.1f} MB RSS per worker")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Đo time-to-first-token của Ollama với bố cục prompt cũ và mới.
+#
+#   python benchmarks/bench_ttft.py --ollama-url http://localhost:11434 --model deepseek-r1:8b
+#
+# - legacy: hướng dẫn a.Guide và câu hỏi nằm chung một message user,
+#           tài liệu ở message user thứ hai, không gửi keep_alive / num_ctx
+# - stable: system message cố định + message user (tài liệu, câu hỏi),
+#           gửi keep_alive và num_ctx giống nhau giữa các request
+# Ngữ cảnh dùng chung một đoạn tài liệu giả để chỉ khác nhau ở bố cục prompt.
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.service.rag_service import RAG_SYSTEM_PROMPT  # noqa: E402
+
+QUERIES = [
+    "Học phí kỳ này đóng khi nào?",
+    "Điều kiện xét tốt nghiệp là gì?",
+    "Làm sao để đăng ký học phần?",
+    "Quy định về điểm rèn luyện như thế nào?",
+    "Khi nào có lịch thi cuối kỳ?",
+]
+
+CONTEXT = "Nguồn tài liệu: quy_che_dao_tao.pdf\n" + (
+    "Sinh viên phải hoàn thành học phí theo thông báo của phòng Tài chính. " * 40
+)
+
+
+def legacy_messages(query: str):
+    return [
+        {
+            "role": "user",
+            "content": (
+                "Bạn là một trợ lý AI có tên là a.Guide thuộc trường Đại học Bách Khoa Hà Nội. \n"
+                "Nhiệm vụ của bạn là trả lời câu hỏi bằng tiếng việt dựa trên các tài liệu đã được cung cấp. \n"
+                "Hãy trả lời câu hỏi một cách ngắn gọn, súc tích và rõ ràng, trích ra nguồn của tài liệu nếu có thể. \n"
+                "Nếu câu hỏi không liên quan đến tài liệu, bạn có thể dùng kiến thức của mình để trả lời câu hỏi.\n"
+                "Nếu câu hỏi không rõ ràng hoặc không đầy đủ, hãy yêu cầu người dùng cung cấp thêm thông tin. \n"
+                f"Câu hỏi như sau: \n{query}"
+            ),
+        },
+        {"role": "user", "content": f"Tài liệu:\n{CONTEXT}"},
+    ]
+
+
+def stable_messages(query: str):
+    return [
+        {"role": "system", "content": RAG_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Tài liệu:\n{CONTEXT}\n\nCâu hỏi: {query}"},
+    ]
+
+
+async def measure(client: httpx.AsyncClient, url: str, payload: dict) -> dict:
+    started_at = time.perf_counter()
+    ttft = None
+    prompt_eval_count = None
+    async with client.stream("POST", url, json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - started_at
+            data = json.loads(line)
+            if data.get("done"):
+                prompt_eval_count = data.get("prompt_eval_count")
+                break
+    return {"ttft": ttft, "prompt_eval_count": prompt_eval_count}
+
+
+async def run(args):
+    url = f"{args.ollama_url}/api/chat"
+    results = {}
+    async with httpx.AsyncClient(timeout=600) as client:
+        for layout in ("legacy", "stable"):
+            samples = []
+            for round_index in range(args.rounds):
+                for query in QUERIES:
+                    payload = {
+                        "model": args.model,
+                        "stream": True,
+                        "options": {"num_predict": 8},
+                    }
+                    if layout == "legacy":
+                        payload["messages"] = legacy_messages(query)
+                    else:
+                        payload["messages"] = stable_messages(query)
+                        payload["options"]["num_ctx"] = args.num_ctx
+                        payload["keep_alive"] = args.keep_alive
+                    samples.append(await measure(client, url, payload))
+            ttfts = [s["ttft"] * 1000 for s in samples]
+            results[layout] = {
+                "requests": len(samples),
+                "ttft_ms_median": round(statistics.median(ttfts), 1),
+                "ttft_ms_p90": round(sorted(ttfts)[int(len(ttfts) * 0.9) - 1], 1),
+                "prompt_eval_count_median": statistics.median(
+                    s["prompt_eval_count"] or 0 for s in samples
+                ),
+            }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ollama-url", default="http://localhost:11434")
+    parser.add_argument("--model", default="deepseek-r1:8b")
+    parser.add_argument("--num-ctx", type=int, default=8192)
+    parser.add_argument("--keep-alive", default="30m")
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# So sánh độ trễ truy vấn giữa Qdrant server (REST) và Qdrant nhúng (local path).
+#
+#   python benchmarks/bench_vector_backend.py --qdrant-url http://localhost:6333 --sizes 1000 5000 20000
+#   python benchmarks/bench_vector_backend.py --skip-remote
+#
+# Vector sinh bằng HashingEmbeddingProvider (768 chiều) để không phụ thuộc Ollama;
+# truy vấn giống QdrantDB.asearch_by_vector (top_k, score_threshold, payload projection).
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.rag.embeddings import HashingEmbeddingProvider  # noqa: E402
+from app.transformers.rag_file_transformer import PAYLOAD_FIELDS  # noqa: E402
+
+COLLECTION = "bench_vector_backend"
+WORDS = (
+    "sinh viên học phí học bổng điểm rèn luyện tốt nghiệp đăng ký học phần lịch thi "
+    "quy chế đào tạo tín chỉ ký túc xá thư viện phòng đào tạo thông báo hạn nộp"
+).split()
+
+
+def make_text(index: int) -> str:
+    return " ".join(WORDS[(index * 7 + step * 3) % len(WORDS)] for step in range(60))
+
+
+def load(client: QdrantClient, provider: HashingEmbeddingProvider, size: int, batch_size: int):
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(
+        COLLECTION, vectors_config=VectorParams(size=provider.dim, distance=Distance.COSINE)
+    )
+    for start in range(0, size, batch_size):
+        texts = [make_text(i) for i in range(start, min(start + batch_size, size))]
+        vectors = provider.embed(texts)
+        client.upsert(
+            COLLECTION,
+            points=[
+                PointStruct(
+                    id=str(uuid4()),
+                    vector=vector.tolist(),
+                    payload={
+                        "page_content": text,
+                        "metadata": {"source": f"doc_{start}.pdf", "page": 0, "chunk_index": i},
+                    },
+                )
+                for i, (text, vector) in enumerate(zip(texts, vectors))
+            ],
+        )
+
+
+def measure(client: QdrantClient, provider: HashingEmbeddingProvider, queries: int, top_k: int) -> dict:
+    latencies = []
+    for index in range(queries):
+        vector = provider.embed([make_text(index * 13 + 5)])[0].tolist()
+        started_at = time.perf_counter()
+        client.query_points(
+            collection_name=COLLECTION,
+            query=vector,
+            limit=top_k,
+            score_threshold=0.3,
+            with_payload=PAYLOAD_FIELDS,
+        )
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--qdrant-url", default="http://localhost:6333")
+    parser.add_argument("--skip-remote", action="store_true")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    provider = HashingEmbeddingProvider(768)
+    local_path = tempfile.mkdtemp(prefix="qdrant_local_bench_")
+    backends = {"local": QdrantClient(path=local_path)}
+    if not args.skip_remote:
+        backends["remote"] = QdrantClient(url=args.qdrant_url)
+
+    results = {}
+    try:
+        for size in args.sizes:
+            results[size] = {}
+            for name, client in backends.items():
+                load(client, provider, size, args.batch_size)
+                results[size][name] = measure(client, provider, args.queries, args.top_k)
+                client.delete_collection(COLLECTION)
+            print(json.dumps({size: results[size]}), flush=True)
+    finally:
+        for client in backends.values():
+            client.close()
+        shutil.rmtree(local_path, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
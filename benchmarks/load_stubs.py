@@ -0,0 +1,392 @@
+# Ollama và Qdrant giả cho load test: chạy app thật mà không cần GPU / Qdrant server,
+# độ trễ từng thao tác cấu hình được để mô phỏng phần cứng production.
+#
+#   python benchmarks/load_stubs.py --ollama-port 18434 --qdrant-port 18333 \
+#       --embed-ms 15 --chat-ttft-ms 300 --chat-tokens 64 --chat-token-ms 20 --search-ms 5
+#
+# - Ollama: GET / , GET /api/tags, POST /api/embed (feature hashing như HashingEmbeddingProvider),
+#   POST /api/chat (stream NDJSON: chờ chat_ttft_ms rồi chat_tokens token cách nhau chat_token_ms)
+# - Qdrant (REST, đủ cho các thao tác app dùng): collections, upsert, query, scroll,
+#   retrieve, set_payload, delete, count. Dữ liệu giữ trong RAM; query xếp hạng bằng
+#   tích vô hướng nhưng trả score giả giảm dần từ 0.95 để luôn vượt score_threshold
+#   (câu hỏi tải không liên quan ngữ nghĩa tới tài liệu đã upload)
+# Độ trễ dùng asyncio.sleep: stub không chiếm CPU, không thành nút thắt của phép đo.
+# Không import app: stub chạy được ở thư mục không có appsettings.json.
+import argparse
+import asyncio
+import json
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_MODELS = ["nomic-embed-text", "deepseek-r1:8b"]
+
+
+def hash_embedding(text: str, dim: int) -> List[float]:
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        hashed = zlib.crc32(word.encode("utf-8"))
+        vector[hashed % dim] += 1.0 if (hashed >> 31) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+async def _delay(ms: float) -> None:
+    if ms > 0:
+        await asyncio.sleep(ms / 1000)
+
+
+def create_ollama_stub(args) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    async def root():
+        return "Ollama is running"
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [
+            {"name": name, "model": name, "size": 0, "modified_at": "2024-01-01T00:00:00Z"}
+            for name in args.models
+        ]}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        texts = body.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        await _delay(args.embed_ms + args.embed_per_text_ms * len(texts))
+        return {
+            "model": body.get("model"),
+            "embeddings": [hash_embedding(text, args.embedding_size) for text in texts],
+        }
+
+    def chat_message(model: str, content: str, done: bool) -> Dict[str, Any]:
+        message = {
+            "model": model,
+            "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+        if done:
+            message.update(done_reason="stop", prompt_eval_count=256, eval_count=args.chat_tokens)
+        return message
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        if not body.get("stream", True):
+            await _delay(args.chat_ttft_ms + args.chat_token_ms * args.chat_tokens)
+            return chat_message(model, "token " * args.chat_tokens, True)
+
+        async def stream():
+            await _delay(args.chat_ttft_ms)
+            for _ in range(args.chat_tokens):
+                yield json.dumps(chat_message(model, "token ", False)) + "\n"
+                await _delay(args.chat_token_ms)
+            yield json.dumps(chat_message(model, "", True)) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+def _ok(result: Any) -> Dict[str, Any]:
+    return {"result": result, "status": "ok", "time": 0.0}
+
+
+def _updated(operation_id: int) -> Dict[str, Any]:
+    return _ok({"operation_id": operation_id, "status": "completed"})
+
+
+def _get_path(payload: Dict, key: str) -> Any:
+    value: Any = payload
+    for part in key.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _project(payload: Dict, with_payload: Any) -> Optional[Dict]:
+    """with_payload: bool | ["metadata.source", ...] | {"include": [...]}"""
+    if with_payload in (None, False):
+        return None
+    if with_payload is True:
+        return payload
+    keys = with_payload.get("include", []) if isinstance(with_payload, dict) else with_payload
+    projected: Dict = {}
+    for key in keys:
+        value = _get_path(payload, key)
+        if value is None:
+            continue
+        target = projected
+        parts = key.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return projected
+
+
+def _matches(point: Dict, condition: Dict) -> bool:
+    if "has_id" in condition:
+        return str(point["id"]) in {str(value) for value in condition["has_id"]}
+    if "must" in condition or "should" in condition or "must_not" in condition:
+        return _match_filter(point, condition)
+    value = _get_path(point["payload"], condition.get("key", ""))
+    match = condition.get("match") or {}
+    if "value" in match:
+        return value == match["value"] or (isinstance(value, list) and match["value"] in value)
+    if "any" in match:
+        return value in match["any"]
+    return value is not None
+
+
+def _match_filter(point: Dict, query_filter: Optional[Dict]) -> bool:
+    if not query_filter:
+        return True
+    must = query_filter.get("must") or []
+    should = query_filter.get("should") or []
+    must_not = query_filter.get("must_not") or []
+    return (
+        all(_matches(point, c) for c in must)
+        and (not should or any(_matches(point, c) for c in should))
+        and not any(_matches(point, c) for c in must_not)
+    )
+
+
+def _selector(points: Dict[str, Dict], body: Dict) -> List[str]:
+    """Id của các point được chọn theo {"points": [...]} hoặc {"filter": {...}}"""
+    if body.get("points") is not None:
+        return [str(point_id) for point_id in body["points"] if str(point_id) in points]
+    return [key for key, point in points.items() if _match_filter(point, body.get("filter"))]
+
+
+def create_qdrant_stub(args) -> FastAPI:
+    app = FastAPI()
+    # collection -> {"size", "distance", "points": {id: {"id", "vector", "payload"}}}
+    collections: Dict[str, Dict] = {}
+    operations = {"id": 0}
+
+    def next_operation() -> int:
+        operations["id"] += 1
+        return operations["id"]
+
+    def collection_info(name: str) -> Dict:
+        collection = collections[name]
+        return {
+            "status": "green",
+            "optimizer_status": "ok",
+            "segments_count": 1,
+            "points_count": len(collection["points"]),
+            "indexed_vectors_count": 0,
+            "config": {
+                "params": {"vectors": {"size": collection["size"], "distance": collection["distance"]}},
+                "hnsw_config": {"m": 16, "ef_construct": 100, "full_scan_threshold": 10000},
+                "optimizer_config": {"default_segment_number": 0, "flush_interval_sec": 5},
+            },
+            "payload_schema": {},
+        }
+
+    def not_found(name: str) -> JSONResponse:
+        return JSONResponse(
+            status_code=404,
+            content={"status": {"error": f"Not found: Collection `{name}` doesn't exist!"}, "time": 0.0},
+        )
+
+    @app.get("/")
+    async def root():
+        return {"title": "qdrant - vector search engine", "version": args.qdrant_version}
+
+    @app.get("/collections")
+    async def list_collections():
+        return _ok({"collections": [{"name": name} for name in collections]})
+
+    @app.get("/collections/{name}/exists")
+    async def collection_exists(name: str):
+        return _ok({"exists": name in collections})
+
+    @app.get("/collections/{name}")
+    async def get_collection(name: str):
+        if name not in collections:
+            return not_found(name)
+        return _ok(collection_info(name))
+
+    @app.put("/collections/{name}")
+    async def create_collection(name: str, request: Request):
+        vectors = (await request.json()).get("vectors") or {}
+        collections.setdefault(name, {
+            "size": vectors.get("size", args.embedding_size),
+            "distance": vectors.get("distance", "Cosine"),
+            "points": {},
+        })
+        return _ok(True)
+
+    @app.delete("/collections/{name}")
+    async def delete_collection(name: str):
+        return _ok(collections.pop(name, None) is not None)
+
+    @app.put("/collections/{name}/index")
+    async def create_index(name: str):
+        return _updated(next_operation())
+
+    @app.put("/collections/{name}/points")
+    async def upsert(name: str, request: Request):
+        if name not in collections:
+            return not_found(name)
+        body = await request.json()
+        await _delay(args.upsert_ms)
+        points = collections[name]["points"]
+        if "batch" in body:
+            batch = body["batch"]
+            rows = zip(batch["ids"], batch["vectors"], batch.get("payloads") or [{}] * len(batch["ids"]))
+            body = {"points": [{"id": i, "vector": v, "payload": p} for i, v, p in rows]}
+        for point in body.get("points", []):
+            points[str(point["id"])] = {
+                "id": point["id"],
+                "vector": np.asarray(point.get("vector"), dtype=np.float32),
+                "payload": point.get("payload") or {},
+            }
+        return _updated(next_operation())
+
+    @app.post("/collections/{name}/points/query")
+    async def query(name: str, request: Request):
+        if name not in collections:
+            return not_found(name)
+        body = await request.json()
+        await _delay(args.search_ms)
+        points = [p for p in collections[name]["points"].values() if _match_filter(p, body.get("filter"))]
+        limit = int(body.get("limit") or 10)
+        vector = body.get("query")
+        if points and isinstance(vector, list):
+            matrix = np.vstack([p["vector"] for p in points])
+            order = np.argsort(-(matrix @ np.asarray(vector, dtype=np.float32)))[:limit]
+            points = [points[i] for i in order]
+        points = points[:limit]
+        with_payload = body.get("with_payload", True)
+        return _ok({"points": [
+            {
+                "id": point["id"],
+                "version": 0,
+                "score": round(0.95 - 0.02 * rank, 4),
+                "payload": _project(point["payload"], with_payload),
+                "vector": point["vector"].tolist() if body.get("with_vector") or body.get("with_vectors") else None,
+            }
+            for rank, point in enumerate(points)
+        ]})
+
+    @app.post("/collections/{name}/points/scroll")
+    async def scroll(name: str, request: Request):
+        if name not in collections:
+            return not_found(name)
+        body = await request.json()
+        ids = [key for key, p in collections[name]["points"].items() if _match_filter(p, body.get("filter"))]
+        start = ids.index(str(body["offset"])) if body.get("offset") is not None and str(body["offset"]) in ids else 0
+        limit = int(body.get("limit") or 10)
+        page = ids[start:start + limit]
+        points = collections[name]["points"]
+        return _ok({
+            "points": [
+                {
+                    "id": points[key]["id"],
+                    "payload": _project(points[key]["payload"], body.get("with_payload", True)),
+                    "vector": points[key]["vector"].tolist() if body.get("with_vector") else None,
+                }
+                for key in page
+            ],
+            "next_page_offset": points[ids[start + limit]]["id"] if start + limit < len(ids) else None,
+        })
+
+    @app.post("/collections/{name}/points")
+    async def retrieve(name: str, request: Request):
+        if name not in collections:
+            return not_found(name)
+        body = await request.json()
+        points = collections[name]["points"]
+        return _ok([
+            {"id": points[key]["id"], "payload": _project(points[key]["payload"], body.get("with_payload", True))}
+            for key in _selector(points, {"points": body.get("ids", [])})
+        ])
+
+    @app.post("/collections/{name}/points/payload")
+    async def set_payload(name: str, request: Request):
+        if name not in collections:
+            return not_found(name)
+        body = await request.json()
+        points = collections[name]["points"]
+        for key in _selector(points, body):
+            target = points[key]["payload"]
+            if body.get("key"):
+                target = target.setdefault(body["key"], {})
+            target.update(body.get("payload") or {})
+        return _updated(next_operation())
+
+    @app.post("/collections/{name}/points/delete")
+    async def delete_points(name: str, request: Request):
+        if name not in collections:
+            return not_found(name)
+        body = await request.json()
+        points = collections[name]["points"]
+        for key in _selector(points, body):
+            del points[key]
+        return _updated(next_operation())
+
+    @app.post("/collections/{name}/points/count")
+    async def count(name: str, request: Request):
+        if name not in collections:
+            return not_found(name)
+        body = await request.json()
+        points = collections[name]["points"].values()
+        return _ok({"count": sum(1 for p in points if _match_filter(p, body.get("filter")))})
+
+    return app
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--ollama-port", type=int, default=18434)
+    parser.add_argument("--qdrant-port", type=int, default=18333)
+    parser.add_argument("--models", nargs="*", default=DEFAULT_MODELS)
+    parser.add_argument("--embedding-size", type=int, default=768)
+    parser.add_argument("--embed-ms", type=float, default=15.0, help="độ trễ mỗi request embed")
+    parser.add_argument("--embed-per-text-ms", type=float, default=2.0, help="độ trễ thêm mỗi đoạn văn bản")
+    parser.add_argument("--chat-ttft-ms", type=float, default=300.0, help="thời gian tới token đầu")
+    parser.add_argument("--chat-tokens", type=int, default=64)
+    parser.add_argument("--chat-token-ms", type=float, default=20.0)
+    parser.add_argument("--search-ms", type=float, default=5.0)
+    parser.add_argument("--upsert-ms", type=float, default=10.0)
+    parser.add_argument("--qdrant-version", default="1.15.0")
+
+
+async def serve(args) -> None:
+    servers = [
+        uvicorn.Server(uvicorn.Config(
+            create_ollama_stub(args), host="127.0.0.1", port=args.ollama_port, log_level="warning",
+        )),
+        uvicorn.Server(uvicorn.Config(
+            create_qdrant_stub(args), host="127.0.0.1", port=args.qdrant_port, log_level="warning",
+        )),
+    ]
+    print(f"[STUB] ollama :{args.ollama_port} qdrant :{args.qdrant_port}", flush=True)
+    started_at = time.perf_counter()
+    try:
+        await asyncio.gather(*(server.serve() for server in servers))
+    finally:
+        print(f"[STUB] stopped after {time.perf_counter() - started_at:.0f}s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_stub_arguments(parser)
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
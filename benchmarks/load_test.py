@@ -0,0 +1,463 @@
+# Load test end-to-end qua HTTP cho app.main:app: chạy app thật (uvicorn, process riêng)
+# với Ollama / Qdrant giả (benchmarks/load_stubs.py) có độ trễ cấu hình được, tăng dần
+# concurrency (hoặc tốc độ request) và đo theo từng endpoint.
+#
+#   python benchmarks/load_test.py --concurrency 1 4 16 64 --duration 20
+#   python benchmarks/load_test.py --rate 5 20 50 --duration 30 --workers 2
+#   python benchmarks/load_test.py --mix query=60,prompt=20,chat=15,upload=5 --chat-ttft-ms 800
+#   python benchmarks/load_test.py --base-url http://staging:8081 --concurrency 8 32   # app có sẵn
+#
+# - Closed loop (--concurrency): N client gửi liên tục, request sau gửi ngay khi request trước xong
+# - Open loop (--rate): request đến theo phân phối Poisson với tốc độ cho trước, không chờ
+#   request trước (giống lưu lượng thật); vượt --max-in-flight thì ghi nhận lỗi client_overload
+# Số liệu mỗi giai đoạn: thông lượng, p50 / p90 / p99 độ trễ, tỉ lệ lỗi theo endpoint,
+# time-to-first-byte của SSE /api/ollama/chat/stream, và độ trễ của GET /api/health/live
+# (không I/O nên độ trễ của nó ~ độ trễ event loop của app). Giai đoạn đầu tiên mà p99 của
+# live vượt --lag-threshold-ms là nơi event loop bắt đầu bị chặn.
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.load_stubs import add_stub_arguments  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ("query", "prompt", "chat", "upload")
+DEFAULT_MIX = "query=50,prompt=20,chat=25,upload=5"
+
+TOPICS = [
+    "học phí", "đăng ký học phần", "điểm rèn luyện", "xét tốt nghiệp", "lịch thi cuối kỳ",
+    "học bổng khuyến khích", "bảo lưu kết quả", "chuyển ngành", "thực tập doanh nghiệp", "ký túc xá",
+]
+QUESTIONS = [
+    "Quy định về {topic} như thế nào?",
+    "Khi nào hết hạn {topic}?",
+    "Điều kiện {topic} là gì?",
+    "Sinh viên cần làm gì để {topic}?",
+]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 1)
+
+
+def latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": round(max(values), 1) if values else None,
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"Endpoint không hợp lệ trong --mix: {name} (chọn trong {', '.join(ENDPOINTS)})")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def make_questions(pool: int) -> List[str]:
+    """pool câu hỏi khác nhau; pool nhỏ = tỉ lệ trúng cache truy xuất cao"""
+    questions = []
+    for index in range(pool):
+        topic = TOPICS[index % len(TOPICS)]
+        question = QUESTIONS[(index // len(TOPICS)) % len(QUESTIONS)].format(topic=topic)
+        if index >= len(TOPICS) * len(QUESTIONS):
+            question += f" (mã {index})"
+        questions.append(question)
+    return questions
+
+
+def make_document(index: int, articles: int) -> str:
+    """Văn bản quy chế Chương / Điều / Khoản cho upload"""
+    lines = [f"QUY CHẾ SỐ {index}"]
+    for article in range(1, articles + 1):
+        if article % 5 == 1:
+            lines.append(f"Chương {article // 5 + 1}")
+        topic = TOPICS[(index + article) % len(TOPICS)]
+        lines.append(f"Điều {article}. Quy định về {topic}")
+        for clause in range(1, 4):
+            lines.append(
+                f"{clause}. Sinh viên thực hiện {topic} theo thông báo số {index}-{article}-{clause} "
+                "của Phòng Đào tạo trong thời hạn quy định của học kỳ."
+            )
+    return "\n".join(lines)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.ttfb: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.requests: Dict[str, int] = defaultdict(int)
+
+    def ok(self, endpoint: str, latency_ms: float, ttfb_ms: Optional[float] = None):
+        self.requests[endpoint] += 1
+        self.latencies[endpoint].append(latency_ms)
+        if ttfb_ms is not None:
+            self.ttfb[endpoint].append(ttfb_ms)
+
+    def error(self, endpoint: str, kind: str):
+        self.requests[endpoint] += 1
+        self.errors[endpoint][kind] += 1
+
+    def summary(self, seconds: float) -> Dict:
+        endpoints = {}
+        for endpoint in sorted(self.requests):
+            errors = sum(self.errors[endpoint].values())
+            endpoints[endpoint] = {
+                "requests": self.requests[endpoint],
+                "rps": round(len(self.latencies[endpoint]) / seconds, 2),
+                "error_rate": round(errors / self.requests[endpoint], 4),
+                "errors": dict(self.errors[endpoint]),
+                "latency_ms": latency_summary(self.latencies[endpoint]),
+            }
+            if self.ttfb[endpoint]:
+                endpoints[endpoint]["ttfb_ms"] = latency_summary(self.ttfb[endpoint])
+        return endpoints
+
+
+class LoadClient:
+    def __init__(self, client: httpx.AsyncClient, args, recorder: Recorder):
+        self.client = client
+        self.args = args
+        self.recorder = recorder
+        self.questions = make_questions(args.query_pool)
+        self.uploads = 0
+
+    def question(self) -> str:
+        return random.choice(self.questions)
+
+    async def call(self, endpoint: str) -> None:
+        started_at = time.perf_counter()
+        try:
+            ttfb = await getattr(self, endpoint)()
+        except httpx.TimeoutException:
+            self.recorder.error(endpoint, "timeout")
+            return
+        except httpx.HTTPStatusError as e:
+            self.recorder.error(endpoint, str(e.response.status_code))
+            return
+        except StreamError as e:
+            self.recorder.error(endpoint, e.kind)
+            return
+        except httpx.HTTPError as e:
+            self.recorder.error(endpoint, type(e).__name__)
+            return
+        latency = (time.perf_counter() - started_at) * 1000
+        self.recorder.ok(endpoint, latency, None if ttfb is None else (ttfb - started_at) * 1000)
+
+    async def query(self):
+        response = await self.client.get(
+            "/api/rag/query", params={"query": self.question(), "k": self.args.k}
+        )
+        response.raise_for_status()
+
+    async def prompt(self):
+        response = await self.client.get("/api/rag/generate-prompt", params={"query": self.question()})
+        response.raise_for_status()
+
+    async def upload(self):
+        self.uploads += 1
+        index = random.randrange(1_000_000)
+        files = {"file": (f"quy_che_{index}.txt", make_document(index, self.args.upload_articles).encode("utf-8"))}
+        response = await self.client.post(
+            "/api/rag/upload-for-rag", data={"doc_id": f"load-{index}"}, files=files
+        )
+        response.raise_for_status()
+
+    async def chat(self):
+        payload = {
+            "model": self.args.chat_model,
+            "messages": [{"role": "user", "content": self.question()}],
+            "chat_id": random.randrange(self.args.chat_ids) if self.args.chat_ids else None,
+        }
+        first_byte_at = None
+        async with self.client.stream("POST", "/api/ollama/chat/stream", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                if first_byte_at is None:
+                    first_byte_at = time.perf_counter()
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                if '"error"' in data:
+                    event = json.loads(data)
+                    raise StreamError("overloaded" if event.get("retry_after") else "stream_error")
+        if first_byte_at is None:
+            raise StreamError("empty_stream")
+        return first_byte_at
+
+
+class StreamError(Exception):
+    def __init__(self, kind: str):
+        super().__init__(kind)
+        self.kind = kind
+
+
+async def probe_liveness(base_url: str, stop: asyncio.Event, samples: List[float], interval: float):
+    """GET /api/health/live trên một kết nối riêng: độ trễ ~ độ trễ event loop của app"""
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        while not stop.is_set():
+            started_at = time.perf_counter()
+            try:
+                (await client.get("/api/health/live")).raise_for_status()
+                samples.append((time.perf_counter() - started_at) * 1000)
+            except httpx.HTTPError:
+                samples.append(30_000.0)
+            await asyncio.sleep(interval)
+
+
+async def monitor_client_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.05):
+    """Độ trễ event loop của chính load generator: lớn thì số liệu không đáng tin"""
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started_at - interval) * 1000)
+
+
+async def run_stage(args, client: httpx.AsyncClient, mix: Dict[str, float], concurrency: int = None, rate: float = None) -> Dict:
+    recorder = Recorder()
+    load = LoadClient(client, args, recorder)
+    names, weights = list(mix), list(mix.values())
+    stop = asyncio.Event()
+    live_samples: List[float] = []
+    client_lag: List[float] = []
+    monitors = [
+        asyncio.create_task(probe_liveness(args.base_url, stop, live_samples, args.live_interval)),
+        asyncio.create_task(monitor_client_lag(stop, client_lag)),
+    ]
+    deadline = time.perf_counter() + args.duration
+    started_at = time.perf_counter()
+
+    if concurrency is not None:
+        async def worker():
+            while time.perf_counter() < deadline:
+                await load.call(random.choices(names, weights)[0])
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    else:
+        in_flight = set()
+        while time.perf_counter() < deadline:
+            endpoint = random.choices(names, weights)[0]
+            if len(in_flight) >= args.max_in_flight:
+                recorder.error(endpoint, "client_overload")
+            else:
+                task = asyncio.create_task(load.call(endpoint))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            await asyncio.sleep(random.expovariate(rate))
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+    seconds = time.perf_counter() - started_at
+    stop.set()
+    await asyncio.gather(*monitors)
+    endpoints = recorder.summary(seconds)
+    completed = sum(len(values) for values in recorder.latencies.values())
+    total = sum(recorder.requests.values())
+    return {
+        "concurrency": concurrency,
+        "rate": rate,
+        "seconds": round(seconds, 1),
+        "rps": round(completed / seconds, 2),
+        "error_rate": round((total - completed) / total, 4) if total else 0.0,
+        "endpoints": endpoints,
+        "app_loop_lag_ms": latency_summary(live_samples),
+        "client_loop_lag_ms_max": round(max(client_lag), 1) if client_lag else None,
+    }
+
+
+def analyze(stages: List[Dict], lag_threshold_ms: float) -> Dict:
+    label = "concurrency" if stages and stages[0]["concurrency"] is not None else "rate"
+    blocking_from = next(
+        (stage[label] for stage in stages if (stage["app_loop_lag_ms"]["p99"] or 0) > lag_threshold_ms),
+        None,
+    )
+    # Thông lượng tăng < 10% khi tăng tải: app (hoặc phụ thuộc giả) đã bão hoà
+    plateau_at = next(
+        (
+            current[label]
+            for previous, current in zip(stages, stages[1:])
+            if current["rps"] < previous["rps"] * 1.1
+        ),
+        None,
+    )
+    return {
+        f"event_loop_blocking_from_{label}": blocking_from,
+        f"throughput_plateau_at_{label}": plateau_at,
+        "peak_rps": max((stage["rps"] for stage in stages), default=0),
+        "client_lag_warning": any((stage["client_loop_lag_ms_max"] or 0) > 50 for stage in stages),
+    }
+
+
+def wait_until_up(url: str, timeout: float, process: subprocess.Popen = None) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Process thoát sớm (exit {process.returncode}) khi chờ {url}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"Hết thời gian chờ {url}")
+
+
+def start_stack(args, workdir: str) -> List[subprocess.Popen]:
+    """Chạy stub Ollama / Qdrant và app (uvicorn) trong workdir tạm để không ghi vào repo"""
+    stub_args = [
+        "--ollama-port", str(args.ollama_port), "--qdrant-port", str(args.qdrant_port),
+        "--embedding-size", str(args.embedding_size),
+        "--embed-ms", str(args.embed_ms), "--embed-per-text-ms", str(args.embed_per_text_ms),
+        "--chat-ttft-ms", str(args.chat_ttft_ms), "--chat-tokens", str(args.chat_tokens),
+        "--chat-token-ms", str(args.chat_token_ms),
+        "--search-ms", str(args.search_ms), "--upsert-ms", str(args.upsert_ms),
+        "--models", *args.models,
+    ]
+    stub_log = open(os.path.join(workdir, "stubs.log"), "w")
+    stubs = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "load_stubs.py"), *stub_args],
+        stdout=stub_log, stderr=subprocess.STDOUT,
+    )
+    wait_until_up(f"http://127.0.0.1:{args.ollama_port}/", 30, stubs)
+    wait_until_up(f"http://127.0.0.1:{args.qdrant_port}/", 30, stubs)
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "OLLAMA_URL": f"http://127.0.0.1:{args.ollama_port}",
+        "QDRANT_URL": f"http://127.0.0.1:{args.qdrant_port}",
+        "VECTOR_BACKEND": "remote",
+        "QDRANT_TRANSPORT": "rest",
+        "OLLAMA_WARM_UP": "false",
+        "OLLAMA_CHAT_MODEL": args.chat_model,
+        "EMBEDDING_SIZE": str(args.embedding_size),
+    }
+    # Cấu hình thật của repo, ghi đè bằng biến môi trường ở trên / --app-env
+    shutil.copy(os.path.join(ROOT, "appsettings.json"), workdir)
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    app_log = open(os.path.join(workdir, "app.log"), "w")
+    app = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(args.app_port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        cwd=workdir, env=env, stdout=app_log, stderr=subprocess.STDOUT,
+    )
+    wait_until_up(f"{args.base_url}/api/health/live", 60, app)
+    return [app, stubs]
+
+
+async def run(args) -> Dict:
+    mix = parse_mix(args.mix)
+    stages = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        # Nạp sẵn tài liệu để query / prompt / chat có kết quả
+        seeder = LoadClient(client, args, Recorder())
+        for _ in range(args.seed_docs):
+            await seeder.call("upload")
+        if args.seed_docs and seeder.recorder.errors:
+            print(f"[LOAD] seed upload lỗi: {dict(seeder.recorder.errors['upload'])}", file=sys.stderr)
+
+        for level in args.concurrency or args.rate:
+            if args.warmup:
+                saved, args.duration = args.duration, args.warmup
+                await run_stage(args, client, mix, **({"concurrency": level} if args.concurrency else {"rate": level}))
+                args.duration = saved
+            stage = await run_stage(
+                args, client, mix, **({"concurrency": level} if args.concurrency else {"rate": level})
+            )
+            stages.append(stage)
+            print(
+                f"[LOAD] {'c' if args.concurrency else 'rate'}={level}: {stage['rps']} req/s, "
+                f"errors {stage['error_rate']:.1%}, live p99 {stage['app_loop_lag_ms']['p99']} ms",
+                file=sys.stderr,
+            )
+    return {
+        "mix": mix,
+        "workers": args.workers,
+        "stages": stages,
+        "analysis": analyze(stages, args.lag_threshold_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, nargs="+", help="closed loop: số client đồng thời mỗi giai đoạn")
+    load.add_argument("--rate", type=float, nargs="+", help="open loop: request / giây mỗi giai đoạn")
+    parser.add_argument("--duration", type=float, default=20.0, help="giây mỗi giai đoạn")
+    parser.add_argument("--warmup", type=float, default=3.0, help="giây chạy trước mỗi giai đoạn, không tính")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="tỉ trọng endpoint: query, prompt, chat, upload")
+    parser.add_argument("--max-in-flight", type=int, default=512, help="giới hạn request đang chờ (open loop)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--query-pool", type=int, default=200, help="số câu hỏi khác nhau")
+    parser.add_argument("--chat-ids", type=int, default=0, help="số hội thoại (chat_id) dùng lại; 0 = không gửi chat_id")
+    parser.add_argument("--chat-model", default="deepseek-r1:8b")
+    parser.add_argument("--seed-docs", type=int, default=5)
+    parser.add_argument("--upload-articles", type=int, default=20, help="số Điều mỗi tài liệu upload")
+    parser.add_argument("--live-interval", type=float, default=0.1)
+    parser.add_argument("--lag-threshold-ms", type=float, default=50.0)
+    parser.add_argument("--base-url", help="app đang chạy sẵn; bỏ trống để tự chạy app + stub")
+    parser.add_argument("--app-port", type=int, default=18081)
+    parser.add_argument("--workers", type=int, default=1, help="số worker uvicorn của app")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="biến môi trường cho app")
+    parser.add_argument("--output", help="ghi kết quả JSON ra file")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    if not args.concurrency and not args.rate:
+        args.concurrency = [1, 4, 16, 64]
+
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    if not args.base_url:
+        args.base_url = f"http://127.0.0.1:{args.app_port}"
+        processes = start_stack(args, workdir)
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    result["logs"] = workdir if processes else None
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
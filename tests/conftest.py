@@ -0,0 +1,65 @@
+# Test chạy không cần Ollama / Qdrant server: Qdrant nhúng (vector_backend = local)
+# và embedding băm (hashing:64), mọi file dữ liệu nằm trong một thư mục tạm.
+# Biến môi trường phải được đặt trước khi import app (settings đọc lúc import).
+import atexit
+import os
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix="retriever-tests-")
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+
+os.environ.setdefault("APP_SETTINGS_FILE", os.path.join(ROOT, "appsettings.json"))
+os.environ.update({
+    "VECTOR_BACKEND": "local",
+    "QDRANT_LOCAL_PATH": os.path.join(DATA_DIR, "qdrant"),
+    "EMBEDDING_MODEL": "hashing:64",
+    "EMBEDDING_SIZE": "64",
+    "EMBEDDING_MODELS": "{}",
+    "EMBEDDING_REGISTRY_PATH": os.path.join(DATA_DIR, "embedding_registry.json"),
+    "SHARED_CACHE_ENABLED": "false",
+    "SHARED_CACHE_PATH": os.path.join(DATA_DIR, "shared_cache.sqlite3"),
+    "SNAPSHOT_DIRECTORY": os.path.join(DATA_DIR, "snapshots"),
+    "PROFILING_DIRECTORY": os.path.join(DATA_DIR, "profiles"),
+    "DEDUP_MODE": "off",
+})
+
+import pytest  # noqa: E402
+
+from app.rag import embedding_registry  # noqa: E402
+from app.rag.dedup import invalidate_signature_index  # noqa: E402
+from app.rag.qdrantdb import get_qdrant_client  # noqa: E402
+from app.setting.config import get_settings  # noqa: E402
+from app.setting.enum import DocsCollection  # noqa: E402
+
+
+@pytest.fixture()
+def app_settings():
+    """Settings dùng chung (lru_cache): sửa thuộc tính qua monkeypatch.setattr(app_settings, ...)"""
+    return get_settings()
+
+
+@pytest.fixture()
+def registry_path(tmp_path, monkeypatch, app_settings):
+    """Registry embedding riêng cho từng test"""
+    path = str(tmp_path / "embedding_registry.json")
+    monkeypatch.setattr(app_settings, "embedding_registry_path", path)
+    monkeypatch.setitem(embedding_registry._cache, "mtime", None)
+    monkeypatch.setitem(embedding_registry._cache, "state", {})
+    return path
+
+
+@pytest.fixture()
+def clean_collections(registry_path):
+    """Xoá các collection (cả collection đích của migration) trước và sau mỗi test"""
+
+    def drop():
+        client = get_qdrant_client()
+        for collection in client.get_collections().collections:
+            client.delete_collection(collection.name)
+            invalidate_signature_index(collection.name)
+
+    drop()
+    yield DocsCollection.RAG
+    drop()
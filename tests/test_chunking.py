@@ -0,0 +1,141 @@
+from app.models.document import Document
+from app.rag.chunking import (
+    STRATEGY_RECURSIVE,
+    StructureAwareSplitter,
+    heading_level,
+    iter_chunks,
+    section_context,
+    short_label,
+)
+
+CLAUSE = "Sinh viên phải đăng ký học phần trong thời hạn do Phòng Đào tạo thông báo trên hệ thống."
+
+
+def pages(*texts):
+    return [
+        Document(page_content=text, metadata={"source": "quy_che.pdf", "page": index})
+        for index, text in enumerate(texts)
+    ]
+
+
+def split(texts, chunk_size=2000, merge_sections=True):
+    splitter = StructureAwareSplitter(chunk_size, 0, merge_sections)
+    return list(splitter.split_pages(pages(*texts)))
+
+
+def test_heading_levels():
+    assert heading_level("Chương II") == 1
+    assert heading_level("Điều 5. Học phí") == 3
+    assert heading_level("Mục 2 QUY ĐỊNH CHUNG") == 2
+    assert heading_level("## Tổng quan") == 2
+    assert heading_level("Điều kiện xét tốt nghiệp là gì?") is None
+    assert heading_level("1. " + CLAUSE) is None
+
+
+def test_labels_and_context():
+    assert short_label("Điều 5. Học phí và lệ phí") == "Điều 5"
+    assert section_context([(1, "Chương II"), (3, "Điều 5. Học phí")]) == "Chương II > Điều 5. Học phí"
+    long_path = [(1, "Chương " + "X" * 80), (3, "Điều 1. " + "Y" * 80)]
+    assert len(section_context(long_path)) <= 160
+
+
+def test_article_spanning_pages_stays_in_one_chunk():
+    [chunk] = split(["Chương I\nĐiều 1. Phạm vi\n1. " + CLAUSE, "2. " + CLAUSE])
+
+    assert chunk.metadata["section"] == "Chương I > Điều 1. Phạm vi"
+    assert chunk.metadata["page"] == 0
+    assert chunk.page_content.endswith("2. " + CLAUSE)
+
+
+def test_consecutive_articles_are_merged_across_chapters():
+    chunks = split([
+        "Chương I\nĐiều 1. Phạm vi\n1. " + CLAUSE
+        + "\nĐiều 2. Đối tượng\n1. " + CLAUSE
+        + "\nChương II\nĐiều 3. Học phí\n1. " + CLAUSE
+    ])
+
+    assert [chunk.metadata["section"] for chunk in chunks] == [
+        "Chương I > Điều 1, Điều 2; Chương II > Điều 3. Học phí",
+    ]
+
+
+def test_chapter_starts_new_chunk_when_budget_is_full():
+    chunks = split([
+        "Chương I\nĐiều 1. Phạm vi\n1. " + CLAUSE
+        + "\nĐiều 2. Đối tượng\n1. " + CLAUSE
+        + "\nChương II\nĐiều 3. Học phí\n1. " + CLAUSE
+    ], chunk_size=250)
+
+    assert [chunk.metadata["section"] for chunk in chunks] == [
+        "Chương I > Điều 1, Điều 2",
+        "Chương II > Điều 3. Học phí",
+    ]
+
+
+def test_no_merge_keeps_one_article_per_chunk():
+    chunks = split(
+        ["Chương I\nĐiều 1. Phạm vi\n1. " + CLAUSE + "\nĐiều 2. Đối tượng\n1. " + CLAUSE],
+        merge_sections=False,
+    )
+
+    # Dòng tiêu đề Chương vẫn đi cùng Điều đầu tiên
+    assert [chunk.metadata["section"] for chunk in chunks] == [
+        "Chương I > Điều 1. Phạm vi",
+        "Chương I > Điều 2. Đối tượng",
+    ]
+    assert chunks[0].page_content.startswith("Chương I\nĐiều 1")
+
+
+def test_long_article_is_split_by_clause():
+    clauses = "\n".join(f"{number}. {CLAUSE}" for number in range(1, 9))
+    chunks = split(["Điều 7. Đăng ký học phần\n" + clauses], chunk_size=300)
+
+    assert len(chunks) > 1
+    assert all(len(chunk.page_content) <= 300 for chunk in chunks)
+    assert all(chunk.metadata["section"] == "Điều 7. Đăng ký học phần" for chunk in chunks)
+    # Không cắt ngang một khoản
+    for chunk in chunks:
+        assert all(
+            line.startswith("Điều 7") or line.endswith(CLAUSE)
+            for line in chunk.page_content.splitlines()
+        )
+
+
+def test_long_table_repeats_header_row():
+    rows = "\n".join(f"{number} | {number * 3} | {number * 500000}" for number in range(1, 60))
+    chunks = split(["Điều 9. Mức học phí\nMức | Số tín chỉ | Học phí\n" + rows], chunk_size=300)
+
+    table_chunks = [chunk for chunk in chunks if "|" in chunk.page_content]
+    assert len(table_chunks) > 1
+    for chunk in table_chunks:
+        lines = [line for line in chunk.page_content.splitlines() if "|" in line]
+        assert lines[0] == "Mức | Số tín chỉ | Học phí"
+
+
+def words(chunks):
+    return " ".join(chunk.page_content for chunk in chunks).split()
+
+
+def test_single_long_tab_line_section_is_not_lost():
+    text = "Nội dung\t" + "chữ " * 700
+    chunks = split([text])
+
+    assert len(chunks) == 2
+    assert words(chunks) == text.split()
+
+
+def test_long_tab_line_inside_section_is_kept():
+    text = "Điều 3. Biểu mẫu\n" + CLAUSE + "\nNội dung\t" + "chữ " * 160
+    chunks = split([text], chunk_size=300)
+
+    assert all(len(chunk.page_content) <= 300 for chunk in chunks)
+    assert words(chunks) == text.split()
+
+
+def test_recursive_strategy_splits_each_page():
+    options = {"strategy": STRATEGY_RECURSIVE, "chunk_size": 200, "chunk_overlap": 0}
+    chunks = list(iter_chunks(pages("Điều 1. Phạm vi\n" + CLAUSE * 3, CLAUSE), options))
+
+    assert len(chunks) >= 3
+    assert all("section" not in chunk.metadata for chunk in chunks)
+    assert chunks[-1].metadata["page"] == 1
@@ -0,0 +1,91 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.models.document import Document
+from app.service.conversation_cache import ConversationCache
+from app.service.rag_service import RAGService
+from app.service.shared_cache import LRUCache, SQLiteCache, TieredCache, collection_namespace
+
+TEXT = "Sinh viên phải đăng ký học phần trong thời hạn do Phòng Đào tạo thông báo."
+NEW_TEXT = "Sinh viên đăng ký học phần bổ sung trong tuần đầu của học kỳ phụ."
+
+
+def put(cache, chat_id, collection, generation=None):
+    vectors = np.ones((1, 4), dtype=np.float32)
+    cache.put(chat_id, collection, vectors[0], [("doc", 1.0)], vectors, generation)
+
+
+def test_entry_expires_when_generation_changes():
+    cache = ConversationCache(max_entries=10, ttl=60)
+    put(cache, 1, "rag", generation=3)
+
+    assert cache.get(1, "rag", 3) is not None
+    assert cache.get(1, "rag", 4) is None
+    assert cache.get(1, "rag", 3) is None
+
+
+def test_invalidate_collection_drops_only_its_conversations():
+    cache = ConversationCache(max_entries=10, ttl=60)
+    put(cache, 1, "rag")
+    put(cache, 2, "search")
+
+    cache.invalidate_collection("rag")
+
+    assert cache.get(1, "rag") is None
+    assert cache.get(2, "search") is not None
+
+
+@pytest.fixture()
+def service(monkeypatch, app_settings, clean_collections):
+    monkeypatch.setattr(app_settings, "retrieval_score_threshold", 0.0)
+    monkeypatch.setattr(app_settings, "conversation_topic_threshold", 0.0)
+    service = RAGService()
+    service.conversation_cache.clear()
+    return service
+
+
+def ingest(service, doc_id, text, collection):
+    document = Document(page_content=text, metadata={"source": f"{doc_id}.pdf", "doc_id": doc_id, "chunk_index": 0})
+    asyncio.run(service.ingest_chunks(doc_id, iter([document]), collection))
+
+
+def sources(documents):
+    return {document.metadata["source"] for document, _ in documents}
+
+
+def test_follow_up_question_is_rescored_from_cache(service, clean_collections):
+    ingest(service, "a", TEXT, clean_collections)
+    cache = service.conversation_cache
+    hits = cache.hits
+
+    asyncio.run(service.retrieve_for_conversation(7, clean_collections, "đăng ký học phần"))
+    documents = asyncio.run(service.retrieve_for_conversation(7, clean_collections, "thời hạn đăng ký"))
+
+    assert cache.hits == hits + 1
+    assert sources(documents) == {"a.pdf"}
+
+
+def test_ingest_invalidates_cached_conversation(service, clean_collections):
+    ingest(service, "a", TEXT, clean_collections)
+    asyncio.run(service.retrieve_for_conversation(7, clean_collections, "đăng ký học phần"))
+
+    ingest(service, "b", NEW_TEXT, clean_collections)
+    documents = asyncio.run(service.retrieve_for_conversation(7, clean_collections, "đăng ký học phần"))
+
+    assert sources(documents) == {"a.pdf", "b.pdf"}
+
+
+def test_invalidation_from_another_worker_expires_conversation(service, clean_collections, tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    service.shared_cache = TieredCache(LRUCache(16, 60), SQLiteCache(path, 60, 100), sync_interval=0)
+    other_worker = TieredCache(LRUCache(16, 60), SQLiteCache(path, 60, 100), sync_interval=0)
+    ingest(service, "a", TEXT, clean_collections)
+    asyncio.run(service.retrieve_for_conversation(7, clean_collections, "đăng ký học phần"))
+    misses = service.conversation_cache.misses
+
+    other_worker.invalidate(collection_namespace(str(clean_collections)))
+    asyncio.run(service.retrieve_for_conversation(7, clean_collections, "đăng ký học phần"))
+
+    assert service.conversation_cache.misses == misses + 1
@@ -0,0 +1,177 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.models.document import Document
+from app.rag import dedup as dedup_module
+from app.rag.dedup import SignatureIndex, minhash_signature, signature_similarity
+from app.rag.qdrantdb import QdrantDB, get_qdrant_client
+from app.service.rag_service import RAGService
+from app.service.shared_cache import LRUCache, SQLiteCache, TieredCache
+
+TEXT = (
+    "Sinh viên phải đăng ký học phần trong thời hạn do Phòng Đào tạo thông báo. "
+    "Học phí được tính theo số tín chỉ đăng ký và nộp trước ngày bắt đầu học kỳ."
+)
+OTHER = "Điểm rèn luyện được đánh giá vào cuối mỗi học kỳ để xét học bổng khuyến khích."
+
+
+def chunk(text, source, title):
+    return Document(page_content=text, metadata={"source": source, "title": title, "chunk_index": 0})
+
+
+def ingest(service, doc_id, documents, collection):
+    for document in documents:
+        document.metadata["doc_id"] = doc_id
+    asyncio.run(service.ingest_chunks(doc_id, iter(documents), collection))
+    return service.last_ingest_report
+
+
+def points(collection):
+    result, _ = get_qdrant_client().scroll(str(collection), limit=100, with_payload=True)
+    return [point.payload["metadata"] for point in result]
+
+
+@pytest.fixture()
+def dedup(monkeypatch, app_settings, clean_collections):
+    def configure(mode, batch_size=64):
+        monkeypatch.setattr(app_settings, "dedup_mode", mode)
+        monkeypatch.setattr(app_settings, "ingest_batch_size", batch_size)
+        return RAGService()
+
+    return configure
+
+
+def test_minhash_similarity():
+    signature = minhash_signature(TEXT)
+    assert signature.dtype == np.uint32
+    assert signature_similarity(signature, minhash_signature(TEXT.upper())) == 1.0
+    assert signature_similarity(signature, minhash_signature(OTHER)) < 0.3
+
+
+def test_signature_index_finds_near_duplicates():
+    index = SignatureIndex()
+    index.add("a", minhash_signature(TEXT))
+    assert index.find(minhash_signature(TEXT + " Thêm"), 0.8)[0] == "a"
+    assert index.find(minhash_signature(OTHER), 0.8) is None
+    index.remove("a")
+    assert index.find(minhash_signature(TEXT), 0.8) is None
+
+
+def test_skip_drops_duplicate_chunks(dedup, clean_collections):
+    service = dedup("skip")
+    ingest(service, "d1", [chunk(TEXT, "a.pdf", "A")], clean_collections)
+    report = ingest(service, "d2", [chunk(TEXT, "b.pdf", "B"), chunk(OTHER, "b.pdf", "B")], clean_collections)
+
+    assert report["duplicates"] == 1
+    assert report["indexed"] == 1
+    assert sorted(meta["doc_id"] for meta in points(clean_collections)) == ["d1", "d2"]
+
+
+def test_duplicates_across_batches_of_one_upload(dedup, clean_collections):
+    service = dedup("skip", batch_size=1)
+    report = ingest(service, "d1", [chunk(TEXT, "a.pdf", "A"), chunk(TEXT, "a.pdf", "A")], clean_collections)
+
+    assert report["duplicates"] == 1
+    assert len(points(clean_collections)) == 1
+
+
+def test_link_hands_chunk_over_to_linking_document(dedup, clean_collections):
+    service = dedup("link")
+    ingest(service, "d1", [chunk(TEXT, "a.pdf", "A")], clean_collections)
+    ingest(service, "d2", [chunk(TEXT, "b.pdf", "B")], clean_collections)
+
+    [linked] = points(clean_collections)
+    assert linked["doc_id"] == "d1"
+    assert linked["linked_doc_ids"] == ["d2"]
+    assert linked["linked_metadata"]["d2"]["source"] == "b.pdf"
+
+    asyncio.run(service.delete_documents_by_doc_id("d1", clean_collections))
+    [owned] = points(clean_collections)
+    assert owned["doc_id"] == "d2"
+    assert (owned["source"], owned["title"]) == ("b.pdf", "B")
+    assert owned["linked_doc_ids"] == []
+
+    asyncio.run(service.delete_documents_by_doc_id("d2", clean_collections))
+    assert points(clean_collections) == []
+
+
+def test_unlink_when_linking_document_is_deleted(dedup, clean_collections):
+    service = dedup("link")
+    ingest(service, "d1", [chunk(TEXT, "a.pdf", "A")], clean_collections)
+    ingest(service, "d2", [chunk(TEXT, "b.pdf", "B")], clean_collections)
+
+    asyncio.run(service.delete_documents_by_doc_id("d2", clean_collections))
+    [point] = points(clean_collections)
+    assert point["doc_id"] == "d1"
+    assert point["source"] == "a.pdf"
+    assert point["linked_doc_ids"] == []
+    assert "d2" not in point["linked_metadata"]
+
+
+def test_point_deleted_elsewhere_is_reinserted(dedup, clean_collections):
+    service = dedup("skip")
+    ingest(service, "d1", [chunk(TEXT, "a.pdf", "A")], clean_collections)
+    # Xoá trực tiếp trong Qdrant: chỉ mục signature trong process vẫn còn point cũ
+    get_qdrant_client().delete_collection(str(clean_collections))
+    report = ingest(service, "d2", [chunk(TEXT, "b.pdf", "B")], clean_collections)
+
+    assert report["duplicates"] == 0
+    assert [meta["doc_id"] for meta in points(clean_collections)] == ["d2"]
+
+
+@pytest.fixture()
+def shared_cache(monkeypatch, app_settings, tmp_path):
+    """Shared cache bật, L2 riêng cho test (kênh báo chỉ mục cũ giữa các worker)"""
+    cache = TieredCache(LRUCache(64, 60), SQLiteCache(str(tmp_path / "cache.sqlite3"), 60, 1000), sync_interval=0)
+    monkeypatch.setattr(app_settings, "shared_cache_enabled", True)
+    monkeypatch.setattr(dedup_module, "get_shared_cache", lambda: cache)
+    return cache
+
+
+def test_index_is_reloaded_after_another_worker_ingests(dedup, shared_cache, clean_collections):
+    service = dedup("skip")
+    name = str(clean_collections)
+    ingest(service, "d1", [chunk(OTHER, "a.pdf", "A")], clean_collections)
+
+    # Worker khác (chỉ mục riêng) ingest một chunk mà chỉ mục của worker này chưa có
+    this_worker = dedup_module._indexes.pop(name)
+    ingest(service, "d2", [chunk(TEXT, "b.pdf", "B")], clean_collections)
+    dedup_module._indexes[name] = this_worker
+
+    report = ingest(service, "d3", [chunk(TEXT, "c.pdf", "C")], clean_collections)
+    assert report["duplicates"] == 1
+
+
+def test_own_ingest_does_not_force_reload(dedup, shared_cache, clean_collections, monkeypatch):
+    service = dedup("skip")
+    scans = []
+    scroll_signatures = QdrantDB.scroll_signatures
+    monkeypatch.setattr(QdrantDB, "scroll_signatures", lambda self: scans.append(1) or scroll_signatures(self))
+
+    ingest(service, "d1", [chunk(OTHER, "a.pdf", "A")], clean_collections)
+    report = ingest(service, "d2", [chunk(TEXT, "b.pdf", "B")], clean_collections)
+
+    assert len(scans) == 1
+    assert report["duplicates"] == 0
+
+
+def test_failed_ingest_removes_its_links(dedup, clean_collections):
+    service = dedup("link", batch_size=1)
+    ingest(service, "d1", [chunk(TEXT, "a.pdf", "A")], clean_collections)
+
+    def failing_chunks():
+        for text in (TEXT, OTHER):
+            document = chunk(text, "b.pdf", "B")
+            document.metadata["doc_id"] = "d2"
+            yield document
+        raise ValueError("parse failed")
+
+    with pytest.raises(ValueError):
+        asyncio.run(service.ingest_chunks("d2", failing_chunks(), clean_collections))
+
+    [point] = points(clean_collections)
+    assert point["doc_id"] == "d1"
+    assert point["linked_doc_ids"] == []
+    assert "d2" not in point["linked_metadata"]
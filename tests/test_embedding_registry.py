@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import pytest
+
+from app.models.document import Document
+from app.rag import embedding_migration, embedding_registry
+from app.rag.embedding_registry import (
+    MIGRATION_BACKFILLING,
+    active_migration,
+    cancel_migration,
+    complete_migration,
+    get_collection_embedding,
+    physical_name,
+    start_migration,
+    update_migration,
+)
+from app.rag.qdrantdb import QdrantDB, get_qdrant_client
+
+RAG = "rag_collection"
+
+
+def test_default_entry_comes_from_settings(registry_path, app_settings, monkeypatch):
+    assert get_collection_embedding(RAG) == {
+        "model": "hashing:64", "size": 64, "physical": RAG, "migration": None,
+    }
+    monkeypatch.setattr(app_settings, "embedding_models", {RAG: {"model": "hashing:32", "size": 32}})
+    assert get_collection_embedding(RAG)["size"] == 32
+
+
+def test_migration_state_transitions(registry_path):
+    entry = start_migration(RAG, "hashing:32", 32)
+    migration = active_migration(entry)
+    assert migration["status"] == MIGRATION_BACKFILLING
+    assert migration["physical"] == physical_name(RAG, "hashing:32") == "rag_collection__hashing-32"
+
+    with pytest.raises(ValueError, match="already migrating"):
+        start_migration(RAG, "hashing:16", 16)
+
+    update_migration(RAG, done=10, total=20)
+    assert get_collection_embedding(RAG)["migration"]["done"] == 10
+
+    previous = complete_migration(RAG)
+    assert previous["physical"] == RAG
+    assert get_collection_embedding(RAG) == {
+        "model": "hashing:32", "size": 32, "physical": "rag_collection__hashing-32", "migration": None,
+    }
+    with pytest.raises(ValueError, match="already uses"):
+        start_migration(RAG, "hashing:32", 32)
+
+
+def test_cancel_and_failed_migrations_are_inactive(registry_path):
+    start_migration(RAG, "hashing:32", 32)
+    update_migration(RAG, status=embedding_registry.MIGRATION_FAILED, error="boom")
+    assert active_migration(get_collection_embedding(RAG)) is None
+
+    cancel_migration(RAG)
+    assert get_collection_embedding(RAG)["migration"] is None
+    # Collection chưa có trong registry: không ghi file
+    cancel_migration("search_collection")
+    with open(registry_path, encoding="utf-8") as f:
+        assert list(json.load(f)) == [RAG]
+
+
+def test_update_rereads_changes_from_other_workers(registry_path):
+    start_migration(RAG, "hashing:32", 32)
+    # Worker khác ghi file (mtime có thể trùng với lần ghi trước)
+    with open(registry_path, encoding="utf-8") as f:
+        state = json.load(f)
+    state[RAG]["migration"]["total"] = 99
+    with open(registry_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+    update_migration(RAG, done=5)
+    migration = get_collection_embedding(RAG)["migration"]
+    assert (migration["done"], migration["total"]) == (5, 99)
+
+
+def test_backfill_switches_collection_to_new_model(clean_collections):
+    vectordb = QdrantDB(collection_name=clean_collections)
+    documents = [
+        Document(page_content=f"Quy định số {index} về đăng ký học phần", metadata={"doc_id": "d1"})
+        for index in range(5)
+    ]
+    asyncio.run(vectordb.add_documents("d1", documents))
+    start_migration(RAG, "hashing:32", 32)
+
+    # Ghi trong lúc migrate: QdrantDB mới ghi vào cả hai collection
+    dual = QdrantDB(collection_name=clean_collections)
+    asyncio.run(dual.add_documents("d2", [Document(page_content="Tài liệu thêm trong lúc migrate", metadata={"doc_id": "d2"})]))
+    asyncio.run(embedding_migration.run_migration(RAG, batch_size=2))
+
+    entry = get_collection_embedding(RAG)
+    assert entry["model"] == "hashing:32"
+    assert entry["migration"] is None
+    client = get_qdrant_client()
+    assert not client.collection_exists(RAG)
+    assert client.count(entry["physical"], exact=True).count == 6
+    point = client.scroll(entry["physical"], limit=1, with_vectors=True)[0][0]
+    assert len(point.vector) == 32
+    assert QdrantDB(collection_name=clean_collections).collection_name == entry["physical"]
+
+
+def test_backfill_runs_in_one_worker_only(clean_collections):
+    # Khoá giữ bởi "worker khác" (flock theo từng lần mở file nên xung đột cả trong process)
+    other_worker = embedding_registry.acquire_backfill_lock(RAG)
+
+    with pytest.raises(ValueError, match="already being backfilled"):
+        embedding_migration.start_embedding_migration(RAG, "hashing:32", 32)
+    assert get_collection_embedding(RAG)["migration"] is None
+    assert embedding_migration.migration_status(RAG)["running"]
+
+    other_worker.close()
+
+    async def start_and_wait():
+        status = embedding_migration.start_embedding_migration(RAG, "hashing:32", 32)
+        await embedding_migration._tasks[RAG]
+        return status
+
+    assert asyncio.run(start_and_wait())["running"]
+    assert get_collection_embedding(RAG)["model"] == "hashing:32"
+    assert not embedding_registry.backfill_running(RAG)
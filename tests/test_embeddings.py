@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+
+from app.rag import embeddings
+from app.rag.embeddings import (
+    HashingEmbeddingProvider,
+    OllamaEmbeddingProvider,
+    get_embedding_provider,
+)
+from app.rag.ollama_scheduler import OllamaScheduler
+from app.setting.enum import OllamaLane, RequestPriority
+
+
+def test_hashing_provider_is_deterministic_and_normalized():
+    provider = HashingEmbeddingProvider(dim=32)
+    vectors = provider.embed(["Quy chế đào tạo", "Quy chế đào tạo", "Học phí"])
+
+    assert vectors.dtype == np.float32
+    assert vectors.shape == (3, 32)
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-6)
+    assert provider.embed([]).shape == (0, 32)
+    # Bản list theo chuẩn LangChain cho cùng kết quả
+    assert provider.embed_query("Học phí") == vectors[2].tolist()
+
+
+def test_provider_is_chosen_by_model_prefix():
+    assert get_embedding_provider("hashing:16").dim == 16
+    assert get_embedding_provider("hashing", 24).dim == 24
+    assert get_embedding_provider("hashing:16") is get_embedding_provider("hashing:16")
+    assert isinstance(get_embedding_provider("nomic-embed-text"), OllamaEmbeddingProvider)
+
+
+class FakeOllamaEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    async def aembed_documents(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(text)), 0.0] for text in texts]
+
+
+class RecordingScheduler(OllamaScheduler):
+    def __init__(self):
+        super().__init__({OllamaLane.EMBED: 1}, max_queue=10)
+        self.priorities = []
+
+    async def acquire(self, lane, priority):
+        self.priorities.append(priority)
+        await super().acquire(lane, priority)
+
+
+def test_ollama_provider_embeds_in_scheduled_batches(monkeypatch):
+    monkeypatch.setattr(embeddings, "INGEST_EMBED_BATCH_SIZE", 2)
+    scheduler = RecordingScheduler()
+    provider = OllamaEmbeddingProvider(model="nomic-embed-text", scheduler=scheduler)
+    provider.inner = FakeOllamaEmbeddings()
+
+    vectors = asyncio.run(provider.aembed(["a", "bb", "ccc", "dddd", "e"]))
+    query = asyncio.run(provider.aembed_one("hỏi"))
+
+    assert vectors.dtype == np.float32
+    assert vectors[:, 0].tolist() == [1, 2, 3, 4, 1]
+    assert provider.inner.batches == [2, 2, 1, 1]
+    # Mỗi batch giữ slot riêng để truy vấn interactive chen vào được
+    assert scheduler.priorities == [RequestPriority.INGEST] * 3 + [RequestPriority.INTERACTIVE]
+    assert query.tolist() == [3.0, 0.0]
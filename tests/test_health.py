@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+
+from app.service import health
+from app.service.health import STATUS_READY, STATUS_STARTING, STATUS_UNAVAILABLE, HealthProber
+from app.service.shared_cache import LRUCache, SQLiteCache, TieredCache
+from app.setting.enum import RequestPriority
+
+
+@pytest.fixture()
+def shared(monkeypatch, tmp_path):
+    cache = TieredCache(LRUCache(16, 60), SQLiteCache(str(tmp_path / "cache.sqlite3"), 60, 100), sync_interval=0)
+    monkeypatch.setattr(health, "get_shared_cache", lambda: cache)
+
+    async def connected(timeout):
+        return True
+
+    monkeypatch.setattr(health, "check_ollama_connection", connected)
+    monkeypatch.setattr(health, "check_qdrant_connection", connected)
+    return str(tmp_path / "cache.sqlite3.health.lock")
+
+
+def make_prober(lock_path):
+    return HealthProber(interval=5, timeout=2, embed_degraded_ms=2000, lock_path=lock_path)
+
+
+def test_only_one_worker_holds_the_probe_lock(shared):
+    first, second = make_prober(shared), make_prober(shared)
+
+    assert first._try_lead()
+    assert not second._try_lead()
+    asyncio.run(first.stop())
+    assert second._try_lead()
+    asyncio.run(second.stop())
+
+
+def test_follower_reports_the_leaders_probe(shared, clean_collections):
+    leader, follower = make_prober(shared), make_prober(shared)
+    assert leader._try_lead()
+
+    assert follower.readiness() == {"status": STATUS_STARTING}
+    asyncio.run(leader.probe())
+    asyncio.run(follower._load_shared())
+
+    state = follower.readiness()
+    assert state["status"] == STATUS_READY
+    assert state["checked_at"] == leader.readiness()["checked_at"]
+    assert str(clean_collections) in state["collections"]
+    asyncio.run(leader.stop())
+
+
+def test_old_probe_result_is_unavailable(shared, clean_collections):
+    prober = make_prober(None)
+    asyncio.run(prober.probe())
+    prober.dependencies["checked_at"] = time.time() - 60
+
+    state = prober.readiness()
+    assert state["status"] == STATUS_UNAVAILABLE
+    assert state["degraded_reasons"] == ["health probe is stale"]
+
+
+def test_embed_probe_does_not_jump_the_interactive_queue(monkeypatch, registry_path):
+    priorities = []
+
+    class Provider:
+        async def aembed(self, texts, priority):
+            priorities.append(priority)
+
+    monkeypatch.setattr(health, "get_embedding_provider", lambda model, size: Provider())
+    embed = asyncio.run(make_prober(None)._probe_embed())
+
+    assert embed["ok"]
+    assert priorities == [RequestPriority.INGEST]
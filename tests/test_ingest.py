@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.models.document import Document
+from app.rag import qdrantdb
+from app.rag.qdrantdb import get_qdrant_client
+from app.service.rag_service import RAGService
+
+CLAUSE = "Sinh viên phải đăng ký học phần trong thời hạn do Phòng Đào tạo thông báo, chunk số {}."
+
+
+def chunks(count, fail_after=None):
+    for index in range(count):
+        if fail_after is not None and index == fail_after:
+            raise ValueError("parse failed")
+        yield Document(
+            page_content=CLAUSE.format(index),
+            metadata={"source": "a.pdf", "doc_id": "a", "chunk_index": index},
+        )
+
+
+def count(collection):
+    return get_qdrant_client().count(str(collection), exact=True).count
+
+
+@pytest.fixture()
+def service(monkeypatch, app_settings, clean_collections):
+    monkeypatch.setattr(app_settings, "ingest_batch_size", 2)
+    return RAGService()
+
+
+def test_streamed_chunks_are_indexed_in_batches(service, clean_collections):
+    indexed = asyncio.run(service.ingest_chunks("a", chunks(5), clean_collections))
+
+    assert indexed == 5
+    assert count(clean_collections) == 5
+
+
+def test_failed_parse_rolls_back_indexed_batches(service, clean_collections, monkeypatch):
+    delete_threads = []
+    delete_documents = qdrantdb.QdrantDB.delete_documents
+
+    def recording_delete(self, ids):
+        delete_threads.append(threading.current_thread())
+        return delete_documents(self, ids)
+
+    monkeypatch.setattr(qdrantdb.QdrantDB, "delete_documents", recording_delete)
+
+    with pytest.raises(ValueError):
+        asyncio.run(service.ingest_chunks("a", chunks(5, fail_after=4), clean_collections))
+
+    assert count(clean_collections) == 0
+    assert delete_threads and threading.main_thread() not in delete_threads
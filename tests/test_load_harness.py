@@ -0,0 +1,85 @@
+import argparse
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.load_stubs import add_stub_arguments, create_ollama_stub, create_qdrant_stub
+from benchmarks.load_test import Recorder, analyze, make_questions, parse_mix, percentile
+
+
+def stub_args(**overrides):
+    parser = argparse.ArgumentParser()
+    add_stub_arguments(parser)
+    args = parser.parse_args([
+        "--embedding-size", "8", "--embed-ms", "0", "--embed-per-text-ms", "0", "--chat-ttft-ms", "0",
+        "--chat-token-ms", "0", "--chat-tokens", "3", "--search-ms", "0", "--upsert-ms", "0",
+    ])
+    vars(args).update(overrides)
+    return args
+
+
+def test_ollama_stub_embeds_and_streams_chat():
+    client = TestClient(create_ollama_stub(stub_args()))
+
+    embeddings = client.post("/api/embed", json={"model": "nomic-embed-text", "input": ["a b", "c"]}).json()
+    assert [len(vector) for vector in embeddings["embeddings"]] == [8, 8]
+
+    lines = client.post("/api/chat", json={"model": "deepseek-r1:8b", "stream": True}).text.splitlines()
+    messages = [json.loads(line) for line in lines]
+    assert len(messages) == 4
+    assert messages[-1]["done"] and messages[-1]["eval_count"] == 3
+
+
+def test_qdrant_stub_round_trip():
+    client = TestClient(create_qdrant_stub(stub_args()))
+    client.put("/collections/rag", json={"vectors": {"size": 2, "distance": "Cosine"}})
+    client.put("/collections/rag/points", json={"points": [
+        {"id": 1, "vector": [1.0, 0.0], "payload": {"page_content": "a", "metadata": {"doc_id": "d1", "page": 1}}},
+        {"id": 2, "vector": [0.0, 1.0], "payload": {"page_content": "b", "metadata": {"doc_id": "d2", "page": 2}}},
+    ]})
+
+    result = client.post("/collections/rag/points/query", json={
+        "query": [0.0, 1.0], "limit": 2, "with_payload": ["page_content", "metadata.page"],
+    }).json()["result"]["points"]
+    assert [point["id"] for point in result] == [2, 1]
+    # Score giả giảm dần để luôn vượt score_threshold
+    assert result[0]["score"] > result[1]["score"] >= 0.9
+    assert result[0]["payload"] == {"page_content": "b", "metadata": {"page": 2}}
+
+    doc_filter = {"must": [{"key": "metadata.doc_id", "match": {"value": "d1"}}]}
+    assert client.post("/collections/rag/points/count", json={"filter": doc_filter}).json()["result"]["count"] == 1
+    client.post("/collections/rag/points/delete", json={"filter": doc_filter})
+    assert client.post("/collections/rag/points/count", json={}).json()["result"]["count"] == 1
+    assert client.get("/collections/missing").status_code == 404
+
+
+def test_mix_questions_and_percentiles():
+    assert parse_mix("query=3,chat") == {"query": 3.0, "chat": 1.0}
+    with pytest.raises(SystemExit):
+        parse_mix("query=1,search=2")
+    assert len(set(make_questions(60))) == 60
+    assert percentile([], 0.5) is None
+    assert percentile([float(value) for value in range(1, 101)], 0.99) == 99.0
+
+
+def test_recorder_and_blocking_analysis():
+    recorder = Recorder()
+    recorder.ok("chat", 120.0, ttfb_ms=40.0)
+    recorder.ok("chat", 80.0, ttfb_ms=20.0)
+    recorder.error("chat", "http_503")
+    summary = recorder.summary(seconds=2.0)["chat"]
+    assert summary["requests"] == 3
+    assert summary["rps"] == 1.0
+    assert summary["error_rate"] == pytest.approx(1 / 3, abs=1e-4)
+    assert summary["ttfb_ms"]["p50"] in (20.0, 40.0)
+
+    def stage(concurrency, rps, lag_p99):
+        return {"concurrency": concurrency, "rate": None, "rps": rps,
+                "app_loop_lag_ms": {"p99": lag_p99}, "client_loop_lag_ms_max": 5.0}
+
+    report = analyze([stage(1, 10, 2), stage(4, 38, 8), stage(16, 40, 120), stage(64, 39, 400)], 50)
+    assert report["event_loop_blocking_from_concurrency"] == 16
+    assert report["throughput_plateau_at_concurrency"] == 16
+    assert report["peak_rps"] == 40
+    assert not report["client_lag_warning"]
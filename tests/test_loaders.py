@@ -0,0 +1,26 @@
+import sys
+
+import pytest
+
+from app.loaders import registry
+
+
+def test_registry_maps_extensions_case_insensitively():
+    assert registry.get_loader("a/B.XLSX") is registry.get_loader("b.xls")
+    assert registry.is_chunked("bang.xlsx")
+    assert not registry.is_chunked("quy_che.pdf")
+    assert {".pdf", ".docx", ".xlsx", ".xls", ".html", ".htm", ".txt"} <= set(registry.supported_extensions())
+    with pytest.raises(ValueError):
+        registry.get_loader("anh.png")
+
+
+def test_parser_is_imported_lazily(tmp_path, monkeypatch):
+    monkeypatch.delitem(sys.modules, "app.loaders.pdf", raising=False)
+    path = tmp_path / "ghi_chu.txt"
+    path.write_text("Điều 1. Phạm vi điều chỉnh", encoding="utf-8")
+
+    documents = registry.iter_document(str(path))
+    # Loader là generator: chưa đọc file trước khi được lặp
+    assert not isinstance(documents, list)
+    assert [document.page_content for document in documents] == ["Điều 1. Phạm vi điều chỉnh"]
+    assert "app.loaders.pdf" not in sys.modules
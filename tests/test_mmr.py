@@ -0,0 +1,83 @@
+import asyncio
+
+import numpy as np
+
+from app.models.document import Document
+from app.rag.qdrantdb import QdrantDB
+from app.rag.retrieval import mmr_select
+from app.service.rag_service import RAGService
+
+
+def candidate(source, chunk_index, score, page=None):
+    metadata = {"source": source, "chunk_index": chunk_index}
+    if chunk_index is None:
+        metadata = {"source": source, "page": page}
+    return Document(page_content=f"{source}#{chunk_index}", metadata=metadata), score
+
+
+def test_mmr_prefers_diverse_candidates():
+    query = np.array([1.0, 0.0, 0.0])
+    vectors = [[1.0, 0.05, 0.0], [1.0, 0.06, 0.0], [0.7, 0.0, 0.7]]
+    results = [candidate("a.pdf", 0, 0.99), candidate("b.pdf", 5, 0.98), candidate("c.pdf", 9, 0.7)]
+
+    picked = mmr_select(query, results, vectors, k=2, lambda_mult=0.5, collapse_adjacent=False)
+
+    # Ứng viên thứ hai gần như trùng ứng viên đầu nên nhường chỗ cho c.pdf
+    assert [doc.metadata["source"] for doc, _ in picked] == ["a.pdf", "c.pdf"]
+    # lambda = 1: chỉ xét độ liên quan
+    relevance_only = mmr_select(query, results, vectors, k=2, lambda_mult=1.0, collapse_adjacent=False)
+    assert [doc.metadata["source"] for doc, _ in relevance_only] == ["a.pdf", "b.pdf"]
+
+
+def test_mmr_collapses_adjacent_chunks_of_same_source():
+    query = np.array([1.0, 0.0])
+    vectors = [[1.0, 0.0], [0.9, 0.1], [0.8, 0.2], [0.7, 0.3]]
+    results = [
+        candidate("a.pdf", 3, 0.9),
+        candidate("a.pdf", 4, 0.89),
+        candidate("a.pdf", None, 0.8, page=2),
+        candidate("b.pdf", 4, 0.7),
+    ]
+
+    picked = mmr_select(query, results, vectors, k=4, lambda_mult=1.0)
+
+    assert [doc.page_content for doc, _ in picked] == ["a.pdf#3", "a.pdf#None", "b.pdf#4"]
+
+
+def test_mmr_does_not_modify_caller_vectors():
+    query = np.array([3.0, 4.0], dtype=np.float32)
+    vectors = np.array([[3.0, 4.0], [6.0, 0.0]], dtype=np.float32)
+    results = [candidate("a.pdf", 0, 1.0), candidate("b.pdf", 0, 0.6)]
+
+    mmr_select(query, results, vectors, k=2)
+
+    np.testing.assert_array_equal(query, [3.0, 4.0])
+    np.testing.assert_array_equal(vectors, [[3.0, 4.0], [6.0, 0.0]])
+    assert mmr_select(query, [], [], k=3) == []
+
+
+def test_retrieve_with_diversity_skips_overlapping_chunks(app_settings, monkeypatch, clean_collections):
+    monkeypatch.setattr(app_settings, "retrieval_mmr_fetch_k", 10)
+    monkeypatch.setattr(app_settings, "retrieval_mmr_lambda", 0.7)
+    documents = [
+        Document(
+            page_content=f"thời hạn đăng ký học phần học kỳ phần {index}",
+            metadata={"doc_id": "d1", "source": "quy_che.pdf", "chunk_index": index},
+        )
+        for index in range(4)
+    ]
+    asyncio.run(QdrantDB(collection_name=clean_collections).add_documents("d1", documents))
+
+    plain = asyncio.run(
+        RAGService().retrieve(clean_collections, "thời hạn đăng ký học phần", k=3, score_threshold=0.0)
+    )
+    diverse = asyncio.run(
+        RAGService().retrieve(clean_collections, "thời hạn đăng ký học phần", k=3, score_threshold=0.0, diversity=True)
+    )
+
+    assert len(plain) == 3
+    indexes = sorted(doc.metadata["chunk_index"] for doc, _ in diverse)
+    assert all(b - a > 1 for a, b in zip(indexes, indexes[1:]))
+    # Vẫn sắp xếp giảm dần theo score
+    scores = [score for _, score in diverse]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from app.rag.ollama_scheduler import OllamaOverloadedError, OllamaScheduler
+from app.setting.enum import OllamaLane, RequestPriority
+
+INTERACTIVE = RequestPriority.INTERACTIVE
+INGEST = RequestPriority.INGEST
+
+
+def make_scheduler(limit=1, max_queue=2):
+    return OllamaScheduler({OllamaLane.EMBED: limit}, max_queue=max_queue, retry_after=3)
+
+
+def test_interactive_waiters_are_admitted_before_ingest():
+    async def main():
+        scheduler = make_scheduler()
+        await scheduler.acquire(OllamaLane.EMBED, INGEST)
+        order = []
+
+        async def worker(name, priority):
+            await scheduler.acquire(OllamaLane.EMBED, priority)
+            order.append(name)
+            scheduler.release(OllamaLane.EMBED)
+
+        tasks = [
+            asyncio.create_task(worker("ingest-1", INGEST)),
+            asyncio.create_task(worker("ingest-2", INGEST)),
+            asyncio.create_task(worker("chat", INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        scheduler.release(OllamaLane.EMBED)
+        await asyncio.gather(*tasks)
+        return order, scheduler.metrics()["embed"]
+
+    order, metrics = asyncio.run(main())
+    assert order == ["chat", "ingest-1", "ingest-2"]
+    assert metrics["active"] == 0
+    assert metrics["admitted_total"] == 4
+
+
+def test_interactive_rejected_when_queue_full():
+    async def main():
+        scheduler = make_scheduler(max_queue=1)
+        await scheduler.acquire(OllamaLane.EMBED, INTERACTIVE)
+        waiter = asyncio.create_task(scheduler.acquire(OllamaLane.EMBED, INTERACTIVE))
+        await asyncio.sleep(0)
+
+        with pytest.raises(OllamaOverloadedError) as excinfo:
+            await scheduler.acquire(OllamaLane.EMBED, INTERACTIVE)
+        with pytest.raises(OllamaOverloadedError):
+            scheduler.check_admission(OllamaLane.EMBED, INTERACTIVE)
+
+        scheduler.release(OllamaLane.EMBED)
+        await waiter
+        return excinfo.value, scheduler.metrics()["embed"]
+
+    error, metrics = asyncio.run(main())
+    assert error.retry_after == 3
+    assert metrics["rejected_total"] == 2
+
+
+def test_ingest_waits_instead_of_being_rejected():
+    async def main():
+        scheduler = make_scheduler(max_queue=1)
+        await scheduler.acquire(OllamaLane.EMBED, INGEST)
+        waiters = [asyncio.create_task(scheduler.acquire(OllamaLane.EMBED, INGEST)) for _ in range(5)]
+        await asyncio.sleep(0)
+        scheduler.check_admission(OllamaLane.EMBED, INGEST)
+        queued = scheduler.metrics()["embed"]["queued_ingest"]
+
+        for waiter in waiters:
+            scheduler.release(OllamaLane.EMBED)
+            await waiter
+        scheduler.release(OllamaLane.EMBED)
+        return queued, scheduler.metrics()["embed"]
+
+    queued, metrics = asyncio.run(main())
+    assert queued == 5
+    assert metrics["rejected_total"] == 0
+    assert metrics["active"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def main():
+        scheduler = make_scheduler()
+        await scheduler.acquire(OllamaLane.EMBED, INTERACTIVE)
+        waiter = asyncio.create_task(scheduler.acquire(OllamaLane.EMBED, INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release(OllamaLane.EMBED)
+
+        async with scheduler.slot(OllamaLane.EMBED):
+            pass
+        return scheduler.metrics()["embed"]
+
+    metrics = asyncio.run(main())
+    assert metrics["active"] == 0
+    assert metrics["queued_interactive"] == 0
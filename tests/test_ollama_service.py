@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+import pytest
+
+from app.models.ollama import OllamaRequest
+from app.service.ollama_service import OllamaService
+from app.service.rag_service import RAG_SYSTEM_PROMPT, RAGService
+
+
+@pytest.fixture()
+def service(app_settings, clean_collections):
+    return OllamaService(settings=app_settings, rag_service=RAGService())
+
+
+def events(generator):
+    async def collect():
+        return [chunk async for chunk in generator]
+
+    return [json.loads(event[len("data: "):]) for event in asyncio.run(collect())]
+
+
+def test_mismatched_model_is_rejected(service, monkeypatch):
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("không được gọi Ollama")
+
+    monkeypatch.setattr(service, "list_models", unexpected)
+    request = OllamaRequest(model="other:7b", messages=[{"role": "user", "content": "Học phí?"}], chat_id=3)
+
+    [event] = events(service.chat_stream(request))
+
+    assert "other:7b" in event["error"]
+    assert event["model"] == service.chat_model
+    assert event["chat_id"] == 3
+
+
+def test_prompt_prefix_is_identical_across_queries(service, clean_collections):
+    first = asyncio.run(service.rag_service.generate_prompt("Học phí đóng khi nào?", clean_collections))
+    second = asyncio.run(service.rag_service.generate_prompt("Điều kiện tốt nghiệp?", clean_collections))
+
+    assert first[0] == second[0] == {"role": "system", "content": RAG_SYSTEM_PROMPT}
+    assert [message["role"] for message in first] == ["system", "user"]
+    assert "Học phí đóng khi nào?" in first[-1]["content"]
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from app.models.ollama import OllamaRequest
+from app.routers import ollama as ollama_router
+from app.service.profiler import ProfileSession, get_sampler, list_profiles, start_profile, write_profile
+
+
+@pytest.fixture()
+def profiling(monkeypatch, app_settings, tmp_path):
+    monkeypatch.setattr(app_settings, "profiling_enabled", True)
+    monkeypatch.setattr(app_settings, "profiling_directory", str(tmp_path / "profiles"))
+    return app_settings
+
+
+def profile_request():
+    return Request({"type": "http", "method": "POST", "headers": [(b"x-profile", b"1")], "query_string": b""})
+
+
+def test_router_is_not_mounted_when_profiling_is_disabled(app_settings):
+    from app.main import app
+
+    assert not app_settings.profiling_enabled
+    assert not any(getattr(route, "path", "").startswith("/api/profiles") for route in app.routes)
+
+
+def test_only_newest_profiles_are_kept(profiling, monkeypatch):
+    monkeypatch.setattr(profiling, "profiling_max_files", 2)
+    sessions = [ProfileSession(f"run{index}") for index in range(3)]
+    for session in sessions:
+        write_profile(session)
+
+    assert sorted(profile["id"] for profile in list_profiles()) == sorted(s.id for s in sessions[1:])
+
+
+def test_session_past_max_seconds_is_stopped_by_sampler(profiling, monkeypatch):
+    monkeypatch.setattr(profiling, "profiling_max_seconds", 0)
+
+    async def forgotten_session():
+        loop = asyncio.get_running_loop()
+        factory = loop.get_task_factory()
+        session = start_profile(profile_request(), "forgotten")
+        for _ in range(100):
+            if session.finished:
+                break
+            await asyncio.sleep(0.01)
+        return session, loop.get_task_factory() is factory
+
+    session, factory_restored = asyncio.run(forgotten_session())
+
+    assert session.finished
+    assert factory_restored
+    assert [profile["id"] for profile in list_profiles()] == [session.id]
+
+
+def test_unread_chat_stream_stops_profile_in_background(profiling, monkeypatch):
+    class FakeOllamaService:
+        async def chat_stream(self, request):
+            yield "data: [DONE]\n\n"
+
+    async def respond_without_reading():
+        response = await ollama_router.chat_stream(
+            OllamaRequest(model="", messages=[{"role": "user", "content": "Xin chào"}]),
+            profile_request(),
+            FakeOllamaService(),
+        )
+        # Stream không được đọc: chỉ còn background task của response dừng session
+        await response.background()
+        return response
+
+    response = asyncio.run(respond_without_reading())
+
+    profile_id = response.headers["x-profile-id"]
+    assert [profile["id"] for profile in list_profiles()] == [profile_id]
+    assert not get_sampler().sessions
@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.document import Document
+from app.rag.qdrantdb import QdrantDB
+from app.routers.responses import FastJSONResponse, decode_cursor, encode_cursor, query_fingerprint
+
+CONTENT = "Sinh viên được xét học bổng khuyến khích học tập theo kết quả học tập và rèn luyện của học kỳ {index}. " * 8
+
+
+def test_cursor_round_trip_and_mismatch():
+    fingerprint = query_fingerprint("rag", "học bổng", 10)
+    cursor = encode_cursor(4, fingerprint)
+
+    assert decode_cursor(cursor, fingerprint) == 4
+    assert decode_cursor(None, fingerprint) == 0
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, query_fingerprint("rag", "học phí", 10))
+    with pytest.raises(ValueError):
+        decode_cursor("không-phải-cursor", fingerprint)
+
+
+def test_fast_json_response_serializes_numpy():
+    body = FastJSONResponse({"score": np.float32(0.5), "vector": np.arange(3, dtype=np.float32)}).body
+    assert orjson.loads(body) == {"score": 0.5, "vector": [0.0, 1.0, 2.0]}
+
+
+@pytest.fixture()
+def client(clean_collections):
+    documents = [
+        Document(
+            page_content=CONTENT.format(index=index),
+            metadata={"doc_id": "d1", "source": f"hoc_bong_{index}.pdf", "chunk_index": index},
+        )
+        for index in range(5)
+    ]
+    asyncio.run(QdrantDB(collection_name=clean_collections).add_documents("d1", documents))
+    # Không vào lifespan: không khởi động health prober / warm-up Ollama
+    return TestClient(app)
+
+
+def test_query_pages_with_cursor_and_projects_ids(client, clean_collections):
+    params = {"query": "xét học bổng khuyến khích", "k": 5, "collection": str(clean_collections),
+              "score_threshold": 0.0, "fields": "ids", "limit": 2}
+    seen, cursor = [], None
+    for _ in range(3):
+        response = client.get("/api/rag/query", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.json()
+        assert page["total"] == 5
+        assert all(set(item) == {"id", "score"} for item in page["items"])
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+    assert cursor is None
+    assert len(set(seen)) == 5
+
+    # Cursor của truy vấn khác bị từ chối
+    first = client.get("/api/rag/query", params=params).json()
+    response = client.get("/api/rag/query", params={**params, "query": "học phí", "cursor": first["next_cursor"]})
+    assert response.status_code == 400
+
+
+def test_query_snippets_and_compression(client, clean_collections):
+    params = {"query": "xét học bổng khuyến khích", "k": 5, "collection": str(clean_collections),
+              "score_threshold": 0.0}
+
+    full = client.get("/api/rag/query", params=params, headers={"Accept-Encoding": "gzip"})
+    snippet = client.get("/api/rag/query", params={**params, "fields": "snippet"})
+
+    assert full.headers["content-encoding"] == "gzip"
+    assert len(full.json()) == 5
+    match = snippet.json()[0]["matches"][0]
+    assert len(match["page_content"]) <= 301
+    assert match["page_content"].endswith("…")
@@ -0,0 +1,80 @@
+import asyncio
+
+from app.models.document import Document
+from app.rag.qdrantdb import QdrantDB
+from app.rag.retrieval import select_adaptive_k
+from app.service.rag_service import RAGService
+from app.transformers.rag_file_transformer import PAYLOAD_FIELDS
+
+
+def scored(*scores, words=10):
+    return [
+        (Document(page_content=" ".join(["từ"] * words), metadata={"chunk_index": index}), score)
+        for index, score in enumerate(scores)
+    ]
+
+
+def test_adaptive_k_stops_at_score_cliff():
+    results = scored(0.91, 0.88, 0.85, 0.62, 0.60)
+    assert [score for _, score in select_adaptive_k(results, score_cliff=0.1)] == [0.91, 0.88, 0.85]
+
+
+def test_adaptive_k_respects_min_k_and_token_budget():
+    # min_k giữ kết quả thứ hai dù điểm tụt mạnh
+    assert len(select_adaptive_k(scored(0.9, 0.5, 0.49), min_k=2, score_cliff=0.1)) == 3
+    # Ngân sách token: 3 chunk x 10 từ vừa 30 token, chunk thứ tư bị cắt
+    assert len(select_adaptive_k(scored(0.9, 0.9, 0.9, 0.9), token_budget=30)) == 3
+    # Chunk đầu tiên luôn được giữ dù vượt ngân sách
+    assert len(select_adaptive_k(scored(0.9, words=50), token_budget=30)) == 1
+    assert select_adaptive_k([]) == []
+
+
+def test_threshold_and_payload_fields_are_applied_in_qdrant(clean_collections):
+    vectordb = QdrantDB(collection_name=clean_collections)
+    documents = [
+        Document(
+            page_content=text,
+            metadata={"doc_id": "d1", "source": "quy_che.pdf", "chunk_index": index, "file_hash": "x"},
+        )
+        for index, text in enumerate([
+            "điều kiện xét tốt nghiệp đại học",
+            "điều kiện xét tốt nghiệp",
+            "lịch nghỉ tết nguyên đán của trường",
+        ])
+    ]
+    asyncio.run(vectordb.add_documents("d1", documents))
+    vector = vectordb.embeddings.embed(["điều kiện xét tốt nghiệp"])[0]
+
+    results, vectors = asyncio.run(
+        vectordb.asearch_by_vector(vector, 10, score_threshold=0.5, payload_fields=PAYLOAD_FIELDS)
+    )
+
+    assert vectors is None
+    assert {doc.metadata["chunk_index"] for doc, _ in results} == {0, 1}
+    assert all(score >= 0.5 for _, score in results)
+    # Chỉ các trường transformer dùng được lấy về
+    assert "file_hash" not in results[0][0].metadata
+    assert "doc_id" not in results[0][0].metadata
+
+
+def test_retrieve_adaptive_k_widens_the_search(app_settings, monkeypatch, clean_collections):
+    monkeypatch.setattr(app_settings, "retrieval_max_k", 6)
+    monkeypatch.setattr(app_settings, "retrieval_score_cliff", 1.0)
+    monkeypatch.setattr(app_settings, "retrieval_token_budget", 10_000)
+    documents = [
+        Document(
+            page_content=f"quy định học phí học kỳ {index}",
+            metadata={"doc_id": "d1", "source": "hoc_phi.pdf", "chunk_index": index},
+        )
+        for index in range(8)
+    ]
+    asyncio.run(QdrantDB(collection_name=clean_collections).add_documents("d1", documents))
+    service = RAGService()
+
+    fixed = asyncio.run(service.retrieve(clean_collections, "quy định học phí", k=2, score_threshold=0.0))
+    adaptive = asyncio.run(
+        service.retrieve(clean_collections, "quy định học phí", k=2, score_threshold=0.0, adaptive_k=True)
+    )
+
+    assert len(fixed) == 2
+    assert len(adaptive) == 6
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import stat
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.models.document import Document
+from app.rag import qdrantdb
+from app.service.rag_service import RAGService
+from app.service.shared_cache import MISSING, LRUCache, SQLiteCache, TieredCache
+
+
+@pytest.fixture()
+def cache_path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def make_worker(path, sync_interval=0.0):
+    """Một worker: L1 riêng, L2 dùng chung file SQLite"""
+    return TieredCache(LRUCache(16, 60), SQLiteCache(path, ttl=60, max_entries=100), sync_interval)
+
+
+def test_lru_evicts_oldest_and_expires():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("ns", "a", 1)
+    cache.set("ns", "b", 2)
+    cache.get("ns", "a")
+    cache.set("ns", "c", 3)
+    assert cache.get("ns", "b") is MISSING
+    assert cache.get("ns", "a") == 1
+
+    cache.set("ns", "short", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("ns", "short") is MISSING
+
+
+def test_value_is_shared_through_l2(cache_path):
+    first, second = make_worker(cache_path), make_worker(cache_path)
+    first.set("ns", "key", {"value": 1})
+
+    assert second.get("ns", "key") == {"value": 1}
+    assert second.get("ns", "key") == {"value": 1}
+    assert second.metrics()["l2_hits"] == 1
+    assert second.metrics()["l1_hits"] == 1
+
+
+def test_invalidation_bumps_generation_for_every_worker(cache_path):
+    first, second = make_worker(cache_path), make_worker(cache_path)
+    first.set("ns", "key", 1)
+    first.set("other", "key", 2)
+    assert second.get("ns", "key") == 1
+
+    second.invalidate("ns")
+
+    assert first.generation("ns") == second.generation("ns") == 1
+    assert first.get("ns", "key") is MISSING
+    assert second.get("ns", "key") is MISSING
+    assert first.get("other", "key") == 2
+
+
+def test_value_computed_before_invalidation_is_dropped(cache_path):
+    first, second = make_worker(cache_path), make_worker(cache_path)
+    generation = first.generation("ns")
+    second.invalidate("ns")
+
+    # Giá trị tính từ dữ liệu trước lần huỷ không được ghi vào tầng nào
+    first.set("ns", "key", "stale", generation=generation)
+    assert first.get("ns", "key") is MISSING
+    assert second.get("ns", "key") is MISSING
+
+    first.set("ns", "key", "fresh", generation=first.generation("ns"))
+    assert second.get("ns", "key") == "fresh"
+
+
+def test_other_workers_keep_l1_until_sync_interval(cache_path):
+    first, second = make_worker(cache_path, sync_interval=60), make_worker(cache_path)
+    first.set("ns", "key", 1)
+    second.invalidate("ns")
+    assert first.get("ns", "key") == 1
+
+    first.sync_interval = 0
+    assert first.get("ns", "key") is MISSING
+
+
+def test_async_variants_match_sync_behaviour(cache_path):
+    async def main():
+        first, second = make_worker(cache_path), make_worker(cache_path)
+        generation = await first.ageneration("ns")
+        await first.aset("ns", "key", 1, generation=generation)
+        # Ghi L2 chạy trên thread ghi riêng: chờ hàng đợi ghi trống
+        await asyncio.get_running_loop().run_in_executor(first._writer, lambda: None)
+        shared = await second.aget("ns", "key")
+
+        await second.ainvalidate("ns")
+        await first.aset("ns", "key", 2, generation=generation)
+        return shared, await first.aget("ns", "key"), await second.aget("ns", "key")
+
+    shared, after_first, after_second = asyncio.run(main())
+    assert shared == 1
+    assert after_first is MISSING
+    assert after_second is MISSING
+
+
+def test_l1_only_cache():
+    cache = TieredCache(LRUCache(4, 60), None, sync_interval=0)
+    cache.set("ns", "key", 1)
+    assert cache.get("ns", "key") == 1
+    cache.invalidate("ns")
+    assert cache.get("ns", "key") is MISSING
+    assert cache.metrics()["shared"] is False
+
+
+def test_search_results_and_vectors_round_trip_without_pickle(cache_path):
+    cache = SQLiteCache(cache_path, ttl=60, max_entries=100)
+    results = [(Document(page_content="Điều 1", metadata={"source": "a.pdf", "page": 2}), 0.91)]
+    vector = np.arange(6, dtype=np.float32).reshape(2, 3)
+    cache.set("ns", "results", results)
+    cache.set("ns", "vector", vector)
+    cache.set("ns", "models", ["llama3:8b"])
+
+    assert cache.get("ns", "results") == results
+    assert isinstance(cache.get("ns", "results")[0], tuple)
+    loaded = cache.get("ns", "vector")
+    assert loaded.dtype == np.float32 and np.array_equal(loaded, vector)
+    assert cache.get("ns", "models") == ["llama3:8b"]
+
+
+def test_cache_file_is_private_and_ignores_pickled_rows(cache_path):
+    SQLiteCache(cache_path, ttl=60, max_entries=100)
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+
+    # Dòng do tiến trình khác ghi (vd. định dạng pickle cũ) không bao giờ được unpickle
+    with sqlite3.connect(cache_path) as conn:
+        conn.execute(
+            "INSERT INTO cache_entries VALUES (?, ?, 0, ?, ?)",
+            ("ns", repr("key"), pickle.dumps({"value": 1}), time.time() + 60),
+        )
+    assert SQLiteCache(cache_path, ttl=60, max_entries=100).get("ns", "key") is MISSING
+
+
+def test_delete_paths_invalidate_off_the_event_loop(monkeypatch, clean_collections):
+    threads = []
+    monkeypatch.setattr(qdrantdb, "invalidate_collection", lambda name: threads.append(threading.current_thread()))
+    service = RAGService()
+
+    asyncio.run(service.delete_documents_by_doc_id("a", clean_collections))
+    asyncio.run(service.clear_vectordb(clean_collections))
+
+    assert threads and threading.main_thread() not in threads
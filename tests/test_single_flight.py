@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.service.single_flight import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    async def main():
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*[single_flight.do("key", work) for _ in range(5)])
+        return calls, results, single_flight.metrics()
+
+    calls, results, metrics = asyncio.run(main())
+    assert calls == 1
+    assert results == ["result"] * 5
+    assert metrics == {"executed_total": 1, "coalesced_total": 4, "in_flight": 0}
+
+
+def test_different_keys_and_later_calls_execute_again():
+    async def main():
+        single_flight = SingleFlight()
+
+        async def work(value):
+            await asyncio.sleep(0)
+            return value
+
+        first = await asyncio.gather(
+            single_flight.do("a", lambda: work(1)),
+            single_flight.do("b", lambda: work(2)),
+        )
+        again = await single_flight.do("a", lambda: work(3))
+        return first, again, single_flight.metrics()
+
+    first, again, metrics = asyncio.run(main())
+    assert first == [1, 2]
+    assert again == 3
+    assert metrics["executed_total"] == 3
+
+
+def test_exception_is_shared_by_all_waiters():
+    async def main():
+        single_flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(
+            *[single_flight.do("key", work) for _ in range(3)], return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def main():
+        single_flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(single_flight.do("key", work))
+        second = asyncio.create_task(single_flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        release.set()
+        return await second, single_flight.in_flight()
+
+    result, in_flight = asyncio.run(main())
+    assert result == "done"
+    assert in_flight == 0
@@ -0,0 +1,70 @@
+import asyncio
+import numpy as np
+import pytest
+
+from app.models.document import Document
+from app.rag import snapshot
+from app.rag.qdrantdb import QdrantDB, get_qdrant_client
+
+
+@pytest.fixture(autouse=True)
+def snapshot_directory(tmp_path, monkeypatch, app_settings):
+    monkeypatch.setattr(app_settings, "snapshot_directory", str(tmp_path / "snapshots"))
+
+
+def fill(collection, count=12):
+    vectordb = QdrantDB(collection_name=collection)
+    documents = [
+        Document(
+            page_content=f"Điều {index}. Quy định số {index} về học phí và đăng ký học phần",
+            metadata={"doc_id": "d1", "source": "quy_che.pdf", "chunk_index": index},
+        )
+        for index in range(count)
+    ]
+    asyncio.run(vectordb.add_documents("d1", documents))
+    return vectordb
+
+
+def dump(collection):
+    points, _ = get_qdrant_client().scroll(str(collection), limit=100, with_payload=True, with_vectors=True)
+    return {str(point.id): (np.asarray(point.vector, dtype=np.float32), point.payload) for point in points}
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-6), ("int8", 1e-2)])
+def test_export_import_round_trip(clean_collections, dtype, tolerance):
+    vectordb = fill(clean_collections)
+    before = dump(clean_collections)
+
+    manifest = snapshot.export_collection(clean_collections, dtype, name=f"rag-{dtype}")
+    assert manifest["count"] == len(before)
+    assert manifest["dim"] == 64
+    assert manifest["logical_collection"] == "rag_collection"
+    assert [item["name"] for item in snapshot.list_snapshots()] == [f"rag-{dtype}"]
+
+    vectordb.clear_qdrant_collection()
+    assert dump(clean_collections) == {}
+    result = asyncio.run(snapshot.import_snapshot(f"rag-{dtype}"))
+    after = dump(clean_collections)
+
+    assert result == {"name": f"rag-{dtype}", "collection": "rag_collection", "count": len(before)}
+    assert after.keys() == before.keys()
+    for point_id, (vector, payload) in before.items():
+        assert after[point_id][1] == payload
+        assert np.abs(after[point_id][0] - vector).max() < tolerance
+
+
+def test_import_rejects_embedding_mismatch(clean_collections, app_settings, monkeypatch):
+    fill(clean_collections, count=2)
+    snapshot.export_collection(clean_collections, name="rag-64")
+    monkeypatch.setattr(app_settings, "embedding_models", {"search_collection": {"model": "hashing:32", "size": 32}})
+
+    with pytest.raises(ValueError, match="hashing:32"):
+        asyncio.run(snapshot.import_snapshot("rag-64", "search_collection"))
+    assert not get_qdrant_client().collection_exists("search_collection")
+
+
+def test_resolve_snapshot_rejects_paths(clean_collections):
+    with pytest.raises(ValueError):
+        snapshot.resolve_snapshot("../etc")
+    with pytest.raises(FileNotFoundError):
+        snapshot.resolve_snapshot("missing")
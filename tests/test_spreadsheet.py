@@ -0,0 +1,55 @@
+import pytest
+
+from app.loaders.spreadsheet import chunk_rows, iter_spreadsheet_chunks
+
+HEADER = ("Mã HP", "Tên học phần", "Số tín chỉ")
+
+
+def rows(count):
+    return [HEADER] + [(f"HP{index:03d}", f"Học phần {index}", 3) for index in range(1, count + 1)]
+
+
+def test_every_chunk_repeats_the_header():
+    chunks = list(chunk_rows(rows(7), "bang.xlsx", "Sheet1", rows_per_chunk=3, max_chunk_chars=10_000))
+
+    assert len(chunks) == 3
+    for chunk in chunks:
+        assert chunk.page_content.splitlines()[0] == "Mã HP | Tên học phần | Số tín chỉ"
+    assert [(c.metadata["row_start"], c.metadata["row_end"]) for c in chunks] == [(2, 4), (5, 7), (8, 8)]
+    assert chunks[0].metadata["sheet"] == "Sheet1"
+
+
+def test_char_limit_and_blank_rows():
+    data = [(), HEADER, (None, "", None)] + rows(4)[1:]
+    chunks = list(chunk_rows(data, "bang.xlsx", "Sheet1", rows_per_chunk=100, max_chunk_chars=50))
+
+    # Dòng trống bị bỏ qua, giới hạn ký tự cắt nhóm dù chưa đủ số dòng
+    assert len(chunks) == 2
+    assert chunks[0].metadata["row_start"] == 4
+    assert sum(len(c.page_content.splitlines()) - 1 for c in chunks) == 4
+
+
+def test_header_only_sheet_yields_one_chunk():
+    chunks = list(chunk_rows([HEADER], "bang.xlsx", "Trống", rows_per_chunk=10, max_chunk_chars=1000))
+    assert [c.page_content for c in chunks] == ["Mã HP | Tên học phần | Số tín chỉ"]
+    assert list(chunk_rows([], "bang.xlsx", "Rỗng", 10, 1000)) == []
+
+
+def test_xlsx_is_streamed_per_sheet(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    first = workbook.active
+    first.title = "HK1"
+    for row in rows(5):
+        first.append(row)
+    second = workbook.create_sheet("HK2")
+    for row in rows(2):
+        second.append(row)
+    path = tmp_path / "hoc_phan.xlsx"
+    workbook.save(path)
+
+    chunks = list(iter_spreadsheet_chunks(str(path), rows_per_chunk=2))
+
+    assert [c.metadata["sheet"] for c in chunks] == ["HK1", "HK1", "HK1", "HK2"]
+    assert all(c.page_content.startswith("Mã HP | Tên học phần | Số tín chỉ\n") for c in chunks)
+    assert "HP005 | Học phần 5 | 3" in chunks[2].page_content
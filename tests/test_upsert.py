@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+from qdrant_client.http.models import PointStruct
+
+from app.rag import qdrantdb
+from app.rag.qdrantdb import QdrantDB, get_qdrant_client
+
+
+class RecordingClient:
+    """Bọc client thật, ghi lại các lời gọi upsert / set_payload"""
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    def upsert(self, collection_name, points, wait):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        threading.Event().wait(0.01)
+        try:
+            self.calls.append(("upsert", len(points), wait))
+            return self._client.upsert(collection_name=collection_name, points=points, wait=wait)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def set_payload(self, **kwargs):
+        self.calls.append(("set_payload", kwargs["payload"], kwargs["wait"]))
+        return self._client.set_payload(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def points(vectordb, count):
+    vectors = vectordb.embeddings.embed([f"điều {index} quy chế" for index in range(count)])
+    return [
+        PointStruct(id=index + 1, vector=vector.tolist(), payload={"page_content": f"điều {index}", "metadata": {}})
+        for index, vector in enumerate(vectors)
+    ]
+
+
+def test_bulk_upsert_batches_in_parallel_then_flushes(app_settings, monkeypatch, clean_collections):
+    monkeypatch.setattr(app_settings, "qdrant_upsert_batch_size", 3)
+    monkeypatch.setattr(app_settings, "qdrant_upsert_parallel", 2)
+    invalidated = []
+
+    async def record_invalidate(collection):
+        invalidated.append(collection)
+
+    monkeypatch.setattr(qdrantdb, "ainvalidate_collection", record_invalidate)
+    vectordb = QdrantDB(collection_name=clean_collections)
+    client = vectordb.client = RecordingClient(vectordb.client)
+
+    asyncio.run(vectordb.upsert_points(vectordb.collection_name, points(vectordb, 10), wait=False))
+
+    assert sorted(size for kind, size, wait in client.calls) == [1, 3, 3, 3]
+    assert all(wait is False for _, _, wait in client.calls)
+    assert client.max_active == 2
+    # Chưa huỷ cache trước barrier
+    assert invalidated == []
+
+    asyncio.run(vectordb.flush_writes())
+
+    assert client.calls[-1] == ("set_payload", {}, True)
+    assert invalidated == [vectordb.collection_name]
+    assert get_qdrant_client().count(vectordb.collection_name, exact=True).count == 10
+    # Barrier không ghi đè payload
+    point = get_qdrant_client().retrieve(vectordb.collection_name, [10], with_payload=True)[0]
+    assert point.payload["page_content"] == "điều 9"
+
+    # Không còn gì chờ: flush lần hai không gọi Qdrant
+    calls = len(client.calls)
+    asyncio.run(vectordb.flush_writes())
+    assert len(client.calls) == calls
+
+
+def test_acknowledged_upsert_invalidates_immediately(monkeypatch, clean_collections):
+    invalidated = []
+
+    async def record_invalidate(collection):
+        invalidated.append(collection)
+
+    monkeypatch.setattr(qdrantdb, "ainvalidate_collection", record_invalidate)
+    vectordb = QdrantDB(collection_name=clean_collections)
+
+    asyncio.run(vectordb.upsert_points(vectordb.collection_name, points(vectordb, 2)))
+
+    assert invalidated == [vectordb.collection_name]
+    assert vectordb._pending_writes == {}
@@ -0,0 +1,46 @@
+import threading
+
+from qdrant_client.http.models import Distance, VectorParams
+
+from app.rag.qdrantdb import _SerializedQdrantClient, get_qdrant_client
+
+
+def test_local_backend_persists_on_disk(tmp_path, monkeypatch, app_settings):
+    path = tmp_path / "qdrant"
+    monkeypatch.setattr(app_settings, "qdrant_local_path", str(path))
+
+    # Bỏ qua lru_cache để mở client mới trên thư mục riêng của test
+    client = get_qdrant_client.__wrapped__()
+    assert isinstance(client, _SerializedQdrantClient)
+    client.create_collection("persisted", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    client.close()
+
+    reopened = get_qdrant_client.__wrapped__()
+    try:
+        assert reopened.collection_exists("persisted")
+    finally:
+        reopened.close()
+
+
+def test_serialized_client_runs_one_call_at_a_time():
+    class SlowClient:
+        active = 0
+        overlap = False
+        name = "local"
+
+        def search(self):
+            SlowClient.active += 1
+            SlowClient.overlap |= SlowClient.active > 1
+            threading.Event().wait(0.01)
+            SlowClient.active -= 1
+
+    client = _SerializedQdrantClient(SlowClient())
+    threads = [threading.Thread(target=client.search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not SlowClient.overlap
+    # Thuộc tính không gọi được trả về nguyên vẹn
+    assert client.name == "local"